@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+准入控制：依優先級排隊、依上游延遲自動調整並發上限、過載時快速回 503
+
+gthread 下「排隊等候」本身也佔著 worker 執行緒，所以：
+  - 進行中 + 排隊中的請求總數（capacity）不超過 threads - HEALTH_RESERVE，保留幾個執行緒給健康檢查與內部端點；
+    其中 QUEUE_SHARE 的比例留作排隊位置，並發上限最多只到剩下的部分
+  - health 類（健康檢查）不排隊、不受並發上限限制
+  - interactive（使用者頁面）優先於 batch（API / 批次客戶端）：有空位時先叫 interactive 的號；
+    batch 進行中的數量另有上限（BATCH_SHARE × 上限），批次再多也吃不光全部名額
+  - 每類有排隊期限：預估等候時間已超過期限就立刻拒絕，不白等；等到期限仍沒輪到也拒絕
+    拒絕時附 Retry-After（依目前佇列與平均處理時間估算）
+
+並發上限（limit）依實測的上游延遲調整（gradient 法）：
+  短期 / 長期上游延遲的 EWMA 比值 < 1 表示上游變慢，按比例調降上限；
+  延遲穩定且名額有在用時，每次 +√limit 慢慢調回；上下限為 [MIN_LIMIT, capacity - 排隊位置]。
+
+環境變數：
+  ADMISSION_ENABLED=1                    0 = 全部直接放行
+  ADMISSION_THREADS                      worker 執行緒數（gunicorn.conf.py 會設，否則看 GUNICORN_THREADS）；
+                                         兩者都沒設定（python app.py 的 threaded 開發伺服器，每請求一條執行緒，
+                                         沒有執行緒池要保護）時 app 不做准入控制，免得猜錯的執行緒數把整個服務壓成單線
+  ADMISSION_HEALTH_RESERVE=2             保留給健康檢查 / 內部端點的執行緒數
+  ADMISSION_MIN_LIMIT=1
+  ADMISSION_INTERACTIVE_DEADLINE=10      interactive 排隊期限（秒）
+  ADMISSION_BATCH_DEADLINE=2             batch 排隊期限（秒）
+  ADMISSION_BATCH_SHARE=0.5              batch 最多佔上限的比例
+  ADMISSION_QUEUE_SHARE=0.25             capacity 中留作排隊位置的比例
+"""
+import collections
+import math
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+HEALTH_RESERVE = int(os.environ.get("ADMISSION_HEALTH_RESERVE", 2))
+MIN_LIMIT = int(os.environ.get("ADMISSION_MIN_LIMIT", 1))
+DEADLINES = {
+    "interactive": float(os.environ.get("ADMISSION_INTERACTIVE_DEADLINE", 10)),
+    "batch": float(os.environ.get("ADMISSION_BATCH_DEADLINE", 2)),
+}
+BATCH_SHARE = float(os.environ.get("ADMISSION_BATCH_SHARE", 0.5))
+QUEUE_SHARE = float(os.environ.get("ADMISSION_QUEUE_SHARE", 0.25))
+CLASSES = ("interactive", "batch")          # 依叫號優先順序
+
+FAST_EWMA = 0.3                             # 短期上游延遲的平滑係數
+SLOW_EWMA = 0.02                            # 長期（基準）
+SERVICE_EWMA = 0.1                          # 每請求處理時間（估 Retry-After 與等候時間）
+TOLERANCE = 1.5                             # 短期延遲在基準的 1.5 倍內視為正常
+LIMIT_SMOOTHING = 0.2
+
+class Rejected(Exception):
+    """排隊已滿或等不到名額；retry_after 為建議的重試秒數。"""
+
+    def __init__(self, klass: str, reason: str, retry_after: int):
+        super().__init__(f"系統忙碌（{reason}），請 {retry_after} 秒後再試")
+        self.klass = klass
+        self.reason = reason
+        self.retry_after = retry_after
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+class Ticket:
+    __slots__ = ("klass", "t0", "counted")
+
+    def __init__(self, klass: str, counted: bool):
+        self.klass = klass
+        self.t0 = time.perf_counter()
+        self.counted = counted          # health 類不佔名額
+
+class AdmissionController:
+    def __init__(self, threads: int, enabled: bool = ENABLED):
+        self.lock = threading.Lock()
+        self.enabled = enabled
+        self.queues = {k: collections.deque() for k in CLASSES}
+        self.in_flight = {k: 0 for k in CLASSES}
+        self.health_in_flight = 0
+        self.stats = {k: {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0}
+                      for k in CLASSES + ("health",)}
+        self.fast_upstream = self.slow_upstream = None
+        self.service_s = 0.5
+        self.set_thread_count(threads)
+
+    def set_thread_count(self, threads: int):
+        """依 worker 的執行緒數重設名額與上限（建構時呼叫；gunicorn 的 threads 經 ADMISSION_THREADS 傳進 app）。"""
+        with self.lock:
+            self.threads = max(1, threads)
+            self.capacity = max(MIN_LIMIT, self.threads - HEALTH_RESERVE)
+            self.max_limit = max(MIN_LIMIT, self.capacity - math.ceil(self.capacity * QUEUE_SHARE))
+            self.limit = float(self.max_limit)
+
+    # ======================= 名額 =======================
+    def _busy(self) -> int:
+        return sum(self.in_flight.values())
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def _batch_cap(self) -> int:
+        return max(1, math.floor(self.limit * BATCH_SHARE))
+
+    def _has_slot(self, klass: str) -> bool:
+        if self._busy() >= int(self.limit):
+            return False
+        return klass != "batch" or self.in_flight["batch"] < self._batch_cap()
+
+    def _nobody_ahead(self, klass: str) -> bool:
+        """同級或更高優先級沒有人在排：batch 要排在所有 interactive 之後。"""
+        return not self.queues["interactive"] and (klass == "interactive" or not self.queues["batch"])
+
+    def _retry_after(self) -> int:
+        backlog = self._busy() + self._queued()
+        return int(min(60, max(1, math.ceil(backlog * self.service_s / max(1.0, self.limit)))))
+
+    def _expected_wait(self, klass: str) -> float:
+        """排在前面的人數（含優先級更高的）× 平均處理時間 ÷ 並發上限。"""
+        ahead = len(self.queues["interactive"])
+        if klass == "batch":
+            ahead += len(self.queues["batch"])
+        return (ahead + 1) * self.service_s / max(1.0, self.limit)
+
+    def acquire(self, klass: str) -> Ticket:
+        if klass == "health" or not self.enabled:
+            with self.lock:
+                self.stats["health" if klass == "health" else klass]["admitted"] += 1
+                if klass == "health":
+                    self.health_in_flight += 1
+            return Ticket(klass, counted=False)
+
+        with self.lock:
+            st = self.stats[klass]
+            if self._nobody_ahead(klass) and self._has_slot(klass):
+                self.in_flight[klass] += 1
+                st["admitted"] += 1
+                return Ticket(klass, counted=True)
+            # 排隊也佔執行緒：進行中 + 排隊中不得吃掉保留給健康檢查的執行緒
+            if self._busy() + self._queued() >= self.capacity:
+                st["rejected_full"] += 1
+                raise Rejected(klass, "佇列已滿", self._retry_after())
+            if self._expected_wait(klass) > DEADLINES[klass]:
+                st["rejected_full"] += 1
+                raise Rejected(klass, "預估等候超過期限", self._retry_after())
+            waiter = _Waiter()
+            self.queues[klass].append(waiter)
+            st["queued"] += 1
+            self._dispatch()                    # 例如 batch 已達份額而 interactive 仍有空位：立刻叫號
+
+        waiter.event.wait(DEADLINES[klass])
+        with self.lock:
+            if not waiter.granted:              # 逾時：自己離開佇列（被叫號與逾時同時發生時以叫號為準）
+                self.queues[klass].remove(waiter)
+                st["rejected_timeout"] += 1
+                raise Rejected(klass, "排隊逾時", self._retry_after())
+            st["admitted"] += 1
+        return Ticket(klass, counted=True)
+
+    def _dispatch(self):
+        """有空位就依優先順序叫號；呼叫端持有 lock。"""
+        for klass in CLASSES:
+            q = self.queues[klass]
+            while q and self._has_slot(klass):
+                waiter = q.popleft()
+                waiter.granted = True
+                self.in_flight[klass] += 1
+                waiter.event.set()
+
+    def release(self, ticket: Ticket, upstream_s: float = 0.0):
+        elapsed = time.perf_counter() - ticket.t0
+        with self.lock:
+            if not ticket.counted:
+                if ticket.klass == "health":
+                    self.health_in_flight -= 1
+                return
+            self.in_flight[ticket.klass] -= 1
+            self.service_s += SERVICE_EWMA * (elapsed - self.service_s)
+            if upstream_s > 0:
+                self._update_limit(upstream_s)
+            self._dispatch()
+
+    # ======================= 依上游延遲調整上限 =======================
+    def _update_limit(self, upstream_s: float):
+        if self.fast_upstream is None:
+            self.fast_upstream = self.slow_upstream = upstream_s
+            return
+        self.fast_upstream += FAST_EWMA * (upstream_s - self.fast_upstream)
+        self.slow_upstream += SLOW_EWMA * (upstream_s - self.slow_upstream)
+        gradient = max(0.5, min(1.0, TOLERANCE * self.slow_upstream / self.fast_upstream))
+        new = self.limit * gradient
+        if gradient >= 1.0 and self._busy() + 1 >= self.limit / 2:   # 名額有在用才往上調
+            new += math.sqrt(self.limit)
+        new = (1 - LIMIT_SMOOTHING) * self.limit + LIMIT_SMOOTHING * new
+        self.limit = min(float(self.max_limit), max(float(MIN_LIMIT), new))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "enabled": self.enabled, "threads": self.threads,
+                "capacity": self.capacity, "limit": round(self.limit, 2), "max_limit": self.max_limit,
+                "batch_cap": self._batch_cap(),
+                "in_flight": dict(self.in_flight, health=self.health_in_flight),
+                "queued": {k: len(q) for k, q in self.queues.items()},
+                "upstream_fast_ms": round((self.fast_upstream or 0) * 1000, 1),
+                "upstream_baseline_ms": round((self.slow_upstream or 0) * 1000, 1),
+                "service_ms": round(self.service_s * 1000, 1),
+                "stats": {k: dict(v) for k, v in self.stats.items()},
+            }
@@ -1,22 +1,46 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, render_template, request
+from flask import Flask, Response, g, has_request_context, make_response, redirect, render_template, request, stream_with_context, url_for
 import mingpan_logic as mp
-import requests
-from bs4 import BeautifulSoup
-import re, html, io, os, contextlib
-from typing import Optional, List
+import admission
+import chart_index
+import chart_input
+import chart_store
+import http_cache
+import parse_guard
+import profiling
+import reverse_search
+import shared_cache
+import upstream_probe
+import upstream_replay
+import re, html, os, time, json, hashlib, threading, contextlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, TYPE_CHECKING
+from urllib.parse import urljoin
+
+# requests / bs4 / lxml 匯入要 0.1 秒以上，延到第一次抓命盤才載入（冷啟動先回應首頁）
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 app = Flask(__name__)
-FORM_URL = "https://fate.windada.com/cgi-bin/fate"
+FORM_URL = os.environ.get("UPSTREAM_FORM_URL", "https://fate.windada.com/cgi-bin/fate")
+UPSTREAM_GET_TIMEOUT = float(os.environ.get("UPSTREAM_GET_TIMEOUT", 20))
+UPSTREAM_POST_TIMEOUT = float(os.environ.get("UPSTREAM_POST_TIMEOUT", 25))
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"     # 回應附 Server-Timing（loadtest.py 用）
 
 # ---------------------------
 # 解碼
 # ---------------------------
-def decode_html(content: bytes) -> BeautifulSoup:
+def looks_mojibake(txt: str) -> bool:
+    """UTF-8 / Big5 頁面被當成 latin-1 類編碼解開的跡象。"""
+    return txt.count("å") + txt.count("ç") + txt.count("é") > 5
+
+def decode_html(content: bytes) -> "BeautifulSoup":
+    from bs4 import BeautifulSoup
     try:
         soup = BeautifulSoup(content, "lxml")
         txt = soup.get_text()[:200]
-        if txt.count("å") + txt.count("ç") + txt.count("é") > 5:
+        if looks_mojibake(txt):
             soup = BeautifulSoup(content.decode("big5", errors="ignore"), "lxml")
     except Exception:
         try:
@@ -29,7 +53,7 @@ def decode_html(content: bytes) -> BeautifulSoup:
 # 找主表
 # ---------------------------
 TYPICAL_PALACE_KEYWORDS = ["命宮","兄弟","夫妻","子女","財帛","疾厄","遷移","交友","事業","田宅","福德","父母","陽曆"]
-def find_main_table(soup: BeautifulSoup):
+def find_main_table(soup: "BeautifulSoup"):
     candidates = []
     for t in soup.find_all("table"):
         txt = t.get_text(" ", strip=True)
@@ -43,8 +67,12 @@ def find_main_table(soup: BeautifulSoup):
 # 解析中央資訊（陽曆/農曆/干支/五行局/四化/命主身主）
 # ---------------------------
 def parse_center_block(td_html: str) -> Optional[str]:
+    from bs4 import BeautifulSoup
     text = td_html.replace("<br>", "\n").replace("<br/>", "\n").replace("<br />", "\n")
-    text = BeautifulSoup(text, "lxml").get_text("\n")
+    return center_block_from_text(BeautifulSoup(text, "lxml").get_text("\n"))
+
+def center_block_from_text(text: str) -> Optional[str]:
+    parse_guard.check_size("中央資訊格", len(text), parse_guard.MAX_CELL_CHARS)
     if not any(k in text for k in ["陽曆", "農曆", "干支", "五行局", "生年四化", "命主", "身主"]):
         return None
     lines = [ln.strip() for ln in re.split(r"[\r\n]+", text) if ln.strip()]
@@ -57,23 +85,29 @@ GZ = "甲乙丙丁戊己庚辛壬癸"
 DZ = "子丑寅卯辰巳午未申酉戌亥"
 
 def td_html_to_text(td) -> str:
+    from bs4 import BeautifulSoup
     raw = td.decode_contents()
     raw = re.sub(r"(?i)<br\s*/?>", "\n", raw)
     return BeautifulSoup(raw, "lxml").get_text("\n")
 
+_HEADER_SAME_LINE = re.compile(r"(?:([%s][%s])\s*+)?【([^】【]*+(?<=[^】【]宮))】" % (GZ, DZ))
+_HEADER_PALACE = re.compile(r"【([^】【]*+(?<=[^】【]宮))】")
+_DAXIAN = re.compile(r"大\s*+限[:：]?+\s*+(\d{1,3})\s*+[-~－—～]\s*+(\d{1,3})")
+_XIAOXIAN = re.compile(r"小\s*+限[:：]?+([0-9\s,，、]++)")
+
 def build_header(full_text: str) -> str:
     """
     盡量輸出『干支【某某宮】』，若找不到干支則只輸出【某某宮】。
     """
-    # 同行：丁巳【事業宮】
-    m = re.search(r"([%s][%s])?\s*【([^】]+宮)】" % (GZ, DZ), full_text)
+    # 同行：丁巳【事業宮】（佔有量詞 + 宮名不含【：不回溯，連串「【【【…」也是線性）
+    m = _HEADER_SAME_LINE.search(full_text)
     if m:
         gz = (m.group(1) or "").strip()
         pal = m.group(2).strip()
         return f"{gz}【{pal}】" if gz else f"【{pal}】"
     # 可能『丁巳』與『【事業宮】』分行
     mgz = re.search(r"([%s][%s])" % (GZ, DZ), full_text)
-    mpal = re.search(r"【([^】]+宮)】", full_text)
+    mpal = _HEADER_PALACE.search(full_text)
     if mpal:
         pal = mpal.group(1)
         if mgz:
@@ -91,7 +125,12 @@ def parse_palace_block(td) -> Optional[str]:
     if center_try:
         return center_try
 
-    full = td_html_to_text(td)
+    return palace_block_from_text(td_html_to_text(td))
+
+def palace_block_from_text(full: str) -> Optional[str]:
+    """宮位格純文字 → 『干支【宮】/大限/小限/星曜』四行。"""
+    parse_guard.check_size("宮位格", len(full), parse_guard.MAX_CELL_CHARS)
+    parse_guard.check_budget()
     if not full.strip():
         return None
 
@@ -99,13 +138,13 @@ def parse_palace_block(td) -> Optional[str]:
 
     # ---- 抽「大限」「小限」（跨行也能抓），並從文本中刪除，避免落入星曜 ----
     # 大限：大限: 44-53 / 大限 44－53
-    m_da = re.search(r"大\s*限[:：]?\s*(\d{1,3})\s*[-~－—～]\s*(\d{1,3})", full, flags=re.S)
+    m_da = _DAXIAN.search(full)
     da_line = f"大限:{m_da.group(1)}-{m_da.group(2)}" if m_da else "大限:"
     if m_da:
         full = full.replace(m_da.group(0), "")
 
     # 小限：小限: 後面可跨行接一串數字
-    m_xiao = re.search(r"小\s*限[:：]?\s*([0-9\s,，、\n\r]+)", full, flags=re.S)
+    m_xiao = _XIAOXIAN.search(full)
     if m_xiao:
         nums = re.findall(r"\d{1,3}", m_xiao.group(1))
         xiao_line = "小限:" + (" ".join(nums) if nums else "")
@@ -119,7 +158,7 @@ def parse_palace_block(td) -> Optional[str]:
     rest_lines = [ln for ln in rest_lines if "宮" not in ln or "【" not in ln]
     rest_lines = [ln for ln in rest_lines if not re.fullmatch(r"[%s][%s]" % (GZ, DZ), ln)]
     # 清尾逗號與多餘頓號
-    stars = [re.sub(r"[，、]+\s*$", "", ln) for ln in rest_lines]
+    stars = [ln.rstrip("，、") for ln in rest_lines]
     # 濾掉明顯非星曜的殘字（大限/小限被清掉後仍可能殘留單獨冒號）
     stars = [s for s in stars if s and s not in (":", "：", "大限", "小限")]
 
@@ -127,6 +166,102 @@ def parse_palace_block(td) -> Optional[str]:
 
     return f"{header}\n{da_line}\n{xiao_line}\n{star_line}"
 
+# ---------------------------
+# 版面指紋：只看頁首幾個表格的標籤骨架（不含文字），已知版面直接切出主表快速解析，
+# 未知版面才走 find_main_table / parse_palace_block 的通用搜尋；各版面分別計數
+# ---------------------------
+LAYOUT_TABLES = 2                    # 骨架取到第幾個 </table> 為止（windada：年份表 + 主表）
+_SKELETON_TAG = re.compile(rb"<(/?)(form|table|tr|td)\b", re.I)
+_CELL_STRING_TYPES = None            # (NavigableString, CData)，第一次用到才匯入 bs4
+
+def layout_skeleton(content: bytes):
+    """回傳 (指紋, 各 <table> 起點位元組位置, 各 </table> 終點位元組位置)。"""
+    tokens, opens, closes = [], [], []
+    for m in _SKELETON_TAG.finditer(content):
+        tag = (m.group(1) + m.group(2)).lower()
+        tokens.append(tag)
+        if tag == b"table":
+            opens.append(m.start())
+        elif tag == b"/table":
+            closes.append(content.find(b">", m.end()) + 1)
+            if len(closes) >= LAYOUT_TABLES:
+                break
+    return hashlib.blake2b(b" ".join(tokens), digest_size=8).hexdigest(), opens, closes
+
+def cell_text(td) -> str:
+    """
+    等同 td_html_to_text(td)，但不重新序列化 / 重解析：
+    <br> 併入相鄰文字，其他標籤切開文字，最後以換行串接。
+    """
+    global _CELL_STRING_TYPES
+    if _CELL_STRING_TYPES is None:
+        from bs4.element import CData, NavigableString
+        _CELL_STRING_TYPES = (NavigableString, CData)
+    runs = []
+    for node in td.descendants:
+        is_br = getattr(node, "name", None) == "br"
+        if not is_br and type(node) not in _CELL_STRING_TYPES:
+            continue
+        piece = "\n" if is_br else str(node)
+        prev = node.previous_sibling          # 前一個兄弟是文字或 <br>：重解析後會是同一段文字
+        if runs and prev is not None and (type(prev) in _CELL_STRING_TYPES or getattr(prev, "name", None) == "br"):
+            runs[-1] += piece
+        else:
+            runs.append(piece)
+    if runs:                                  # lxml 重解析時會吃掉片段開頭的空白
+        runs[0] = runs[0].lstrip(" \t\r\n")
+        if not runs[0]:
+            runs.pop(0)
+    return "\n".join(runs)
+
+def parse_windada_v1(content: bytes, opens: list, closes: list) -> Optional[str]:
+    """fate.windada.com 命盤頁：第 2 個表格即主表（12 宮 + 中央共 13 格，無巢狀表格）。"""
+    from bs4 import BeautifulSoup
+    from bs4.dammit import EncodingDetector
+    if len(opens) < 2 or len(closes) < 2:
+        return None
+    # 與 decode_html 同一套編碼判斷（BOM / <meta charset> / 猜測，取 bs4 第一個會試的）；
+    # 解不開或 decode_html 會改用 big5 重解的頁面，一律交給通用解析，兩條路徑結果才一致
+    encoding = next(iter(EncodingDetector(content, is_html=True).encodings), None)
+    if encoding is None:
+        return None
+    try:
+        doc = content.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        return None
+    if looks_mojibake(doc):
+        return None
+    frag = content[opens[1]:closes[1]].decode(encoding)
+    tds = BeautifulSoup(frag, "lxml").find_all("td")
+    if len(tds) != 13:
+        return None
+    blocks = []
+    for td in tds:
+        text = cell_text(td)
+        block = center_block_from_text(text) or palace_block_from_text(text)
+        if block:
+            blocks.append(block)
+    return "\n\n".join(blocks) if len(blocks) == 13 else None
+
+KNOWN_LAYOUTS = {
+    "f8183caa5f95e43c": ("windada-v1", parse_windada_v1),
+}
+
+_layout_lock = threading.Lock()
+LAYOUT_STATS = {}                    # 指紋 -> {"name", "pages", "fast", "fallback", "first_seen", "last_seen"}
+
+def count_layout(fp: str, name: str, fast: bool):
+    now = int(time.time())
+    with _layout_lock:
+        st = LAYOUT_STATS.get(fp)
+        if st is None:
+            st = LAYOUT_STATS[fp] = {"name": name, "pages": 0, "fast": 0, "fallback": 0, "first_seen": now, "last_seen": now}
+            if name == "unknown":
+                print(f"[版面] 出現未知的上游版面 {fp}，改用通用解析")
+        st["pages"] += 1
+        st["fast" if fast else "fallback"] += 1
+        st["last_seen"] = now
+
 # ---------------------------
 # 送表單抓取（修正性別值）
 # ---------------------------
@@ -138,70 +273,28 @@ COMMON_NAME_MAP = {
     "sex":   ["Sex", "sex", "gender", "Gender"],
 }
 
+_upstream_local = threading.local()     # 並行取命盤的工作執行緒沒有請求上下文，先記在這裡（見 get_prepared_charts）
+
+@contextlib.contextmanager
+def upstream_wait():
+    """累計本請求等上游的牆鐘時間（給 Server-Timing；請求以外的呼叫不記）。"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            g.upstream_s = g.get("upstream_s", 0.0) + time.perf_counter() - t0
+        elif hasattr(_upstream_local, "s"):
+            _upstream_local.s += time.perf_counter() - t0
+
 def choose_field_name(cands: List[str], names: set) -> Optional[str]:
     for n in cands:
         if n in names:
             return n
     return None
 
-def fetch_chart(year, month, day, hour, gender):
-    s = requests.Session()
-    s.headers.update({"User-Agent": "Mozilla/5.0"})
-    r = s.get(FORM_URL, timeout=20)
-    soup = decode_html(r.content)
-    form = soup.find("form")
-    if not form:
-        txt = soup.get_text()[:800]
-        raise RuntimeError("找不到命盤表單：\n" + txt)
-
-    post_url = form.get("action") or FORM_URL
-    post_url = requests.compat.urljoin(FORM_URL, post_url)
-
-    payload = {}
-    form_names = set()
-
-    for inp in form.find_all(["input","textarea"]):
-        n = inp.get("name")
-        if not n: continue
-        form_names.add(n)
-        t = (inp.get("type") or "").lower()
-        v = inp.get("value", "")
-        if t in ("radio","checkbox"):
-            if inp.has_attr("checked"):
-                payload[n] = v
-        else:
-            payload[n] = v
-
-    # select 預設值
-    for sel in form.find_all("select"):
-        n = sel.get("name")
-        if not n: continue
-        form_names.add(n)
-        chosen = None
-        for opt in sel.find_all("option"):
-            if opt.has_attr("selected"):
-                chosen = opt.get("value", opt.text)
-                break
-        if chosen is None:
-            first = sel.find("option")
-            chosen = first.get("value", first.text) if first else ""
-        payload[n] = chosen
-
-    # 對應欄位名
-    yname = choose_field_name(COMMON_NAME_MAP["year"], form_names)  or "Year"
-    mname = choose_field_name(COMMON_NAME_MAP["month"], form_names) or "Month"
-    dname = choose_field_name(COMMON_NAME_MAP["day"], form_names)   or "Day"
-    hname = choose_field_name(COMMON_NAME_MAP["hour"], form_names)  or "Hour"
-    sname = choose_field_name(COMMON_NAME_MAP["sex"], form_names)   or "Sex"
-
-    payload[yname] = str(year)
-    payload[mname] = str(month)
-    payload[dname] = str(day)
-    payload[hname] = str(hour)
-
-       # ---- 性別（依使用者選擇 m/f 精準帶值）----
-    gender_str = str(gender).strip().lower()
-    want_female = gender_str.startswith(("f", "女"))  # True=女, False=男
+def sex_option_value(form, sname: str, want_female: bool) -> str:
+    """性別欄位要送的值（依使用者選擇 m/f 精準帶值）。"""
     sex_value = None
 
     # 先找 select[name=sname]
@@ -255,10 +348,141 @@ def fetch_chart(year, month, day, hour, gender):
     if sex_value is None:
         sex_value = "0" if want_female else "1"
 
-    payload[sname] = sex_value
+    return sex_value
+
+def parse_form_schema(content: bytes) -> dict:
+    """
+    上游表單頁 → 表單結構：送出網址、預設欄位值、出生資料各欄位名、男女對應值。
+    結構與出生資料無關，可快取後省掉每次送表單前的 GET。
+    """
+    soup = decode_html(content)
+    form = soup.find("form")
+    if not form:
+        txt = soup.get_text()[:800]
+        raise RuntimeError("找不到命盤表單：\n" + txt)
+
+    post_url = form.get("action") or FORM_URL
+    post_url = urljoin(FORM_URL, post_url)
+
+    payload = {}
+    form_names = set()
+
+    for inp in form.find_all(["input","textarea"]):
+        n = inp.get("name")
+        if not n: continue
+        form_names.add(n)
+        t = (inp.get("type") or "").lower()
+        v = inp.get("value", "")
+        if t in ("radio","checkbox"):
+            if inp.has_attr("checked"):
+                payload[n] = v
+        else:
+            payload[n] = v
+
+    # select 預設值
+    for sel in form.find_all("select"):
+        n = sel.get("name")
+        if not n: continue
+        form_names.add(n)
+        chosen = None
+        for opt in sel.find_all("option"):
+            if opt.has_attr("selected"):
+                chosen = opt.get("value", opt.text)
+                break
+        if chosen is None:
+            first = sel.find("option")
+            chosen = first.get("value", first.text) if first else ""
+        payload[n] = chosen
+
+    # 對應欄位名
+    yname = choose_field_name(COMMON_NAME_MAP["year"], form_names)  or "Year"
+    mname = choose_field_name(COMMON_NAME_MAP["month"], form_names) or "Month"
+    dname = choose_field_name(COMMON_NAME_MAP["day"], form_names)   or "Day"
+    hname = choose_field_name(COMMON_NAME_MAP["hour"], form_names)  or "Hour"
+    sname = choose_field_name(COMMON_NAME_MAP["sex"], form_names)   or "Sex"
+
+    return {
+        "post_url": post_url,
+        "defaults": payload,
+        "fields": {"year": yname, "month": mname, "day": dname, "hour": hname, "sex": sname},
+        "sex": {"m": sex_option_value(form, sname, False), "f": sex_option_value(form, sname, True)},
+    }
+
+def get_form_schema(s, refresh: bool = False):
+    """回傳 (表單結構, 是否剛從上游抓)；跨 worker 共用快取 FORM_SCHEMA_TTL 秒。"""
+    fresh = []
+
+    def load() -> bytes:
+        with upstream_wait():
+            r = s.get(FORM_URL, timeout=UPSTREAM_GET_TIMEOUT)
+        fresh.append(True)
+        return json.dumps(parse_form_schema(r.content), ensure_ascii=False).encode("utf-8")
+
+    if refresh:
+        CACHE.delete("form", FORM_URL)
+    return json.loads(CACHE.get_or_compute("form", FORM_URL, load, FORM_SCHEMA_TTL)), bool(fresh)
+
+PROBE_TIMEOUT = float(os.environ.get("PROBE_TIMEOUT", 10))
 
-    r2 = s.post(post_url, data=payload, timeout=25)
-    soup2 = decode_html(r2.content)
+def probe_upstream_form() -> dict:
+    """
+    背景健康探測：抓表單頁並解析（不送出命盤）。解析得出表單結構就代表上游仍可用；
+    順便把結構寫回共用快取，使用者送表單前不必再等這次 GET，上游改版也會在這裡先換掉舊結構。
+    """
+    s = upstream_replay.new_session()
+    s.headers.update({"User-Agent": "Mozilla/5.0"})
+    r = s.get(FORM_URL, timeout=PROBE_TIMEOUT)
+    r.raise_for_status()
+    schema = parse_form_schema(r.content)
+    CACHE.set("form", FORM_URL, json.dumps(schema, ensure_ascii=False).encode("utf-8"), FORM_SCHEMA_TTL)
+    return {"post_url": schema["post_url"], "fields": schema["fields"]}
+
+PROBER = upstream_probe.UpstreamProber(probe_upstream_form)
+
+def post_chart_form(s, schema: dict, year, month, day, hour, gender) -> str:
+    f = schema["fields"]
+    payload = dict(schema["defaults"])
+    payload[f["year"]] = str(year)
+    payload[f["month"]] = str(month)
+    payload[f["day"]] = str(day)
+    payload[f["hour"]] = str(hour)
+    payload[f["sex"]] = schema["sex"]["f" if str(gender).strip().lower().startswith(("f", "女")) else "m"]
+    with upstream_wait():
+        r2 = s.post(schema["post_url"], data=payload, timeout=UPSTREAM_POST_TIMEOUT, stream=True)
+    return read_chart_page(r2)
+
+def fetch_chart(year, month, day, hour, gender):
+    s = upstream_replay.new_session()
+    s.headers.update({"User-Agent": "Mozilla/5.0"})
+    schema, fresh = get_form_schema(s)
+    try:
+        return post_chart_form(s, schema, year, month, day, hour, gender)
+    except (UpstreamTooLarge, parse_guard.ParseLimitError):
+        raise
+    except RuntimeError:
+        if fresh:
+            raise
+        # 快取的表單結構可能已過時（上游改版）：重抓表單再送一次
+        schema, _ = get_form_schema(s, refresh=True)
+        return post_chart_form(s, schema, year, month, day, hour, gender)
+
+def match_layout(content: bytes):
+    """回傳 (指紋, 版面名, 快速解析結果或 None)；只需要頁首到主表結束的位元組。"""
+    parse_guard.check_size("命盤頁", len(content), parse_guard.MAX_PAGE_BYTES)
+    fp, opens, closes = layout_skeleton(content)
+    name, parser = KNOWN_LAYOUTS.get(fp, ("unknown", None))
+    return fp, name, (parser(content, opens, closes) if parser else None)
+
+def parse_chart_page(content: bytes) -> str:
+    """命盤結果頁 HTML → fetch_chart 的純文字原文；已知版面走快速解析，失敗或未知再走通用搜尋。"""
+    fp, name, raw = match_layout(content)
+    count_layout(fp, name, raw is not None)
+    if raw is not None:
+        return raw
+    return parse_chart_page_generic(content)
+
+def parse_chart_page_generic(content: bytes) -> str:
+    soup2 = decode_html(content)
     table = find_main_table(soup2)
     if not table:
         txt = soup2.get_text()[:800]
@@ -266,51 +490,622 @@ def fetch_chart(year, month, day, hour, gender):
 
     blocks = []
     for td in table.find_all("td"):
+        parse_guard.check_budget()
         block = parse_palace_block(td)
         if block:
             blocks.append(block)
 
     return "\n\n".join(blocks)
 
+# ---------------------------
+# 串流讀命盤頁：主表的 </table> 一出現就停止讀取並關連線，只把這段交給快速解析
+# （主表之後多是廣告與 script）；快速解析不成才把剩下的讀完走通用解析。總量上限 UPSTREAM_MAX_BYTES
+# ---------------------------
+UPSTREAM_MAX_BYTES = int(os.environ.get("UPSTREAM_MAX_BYTES", parse_guard.MAX_PAGE_BYTES))
+UPSTREAM_CHUNK = int(os.environ.get("UPSTREAM_CHUNK", 16 * 1024))
+_TABLE_CLOSE = re.compile(rb"</table\s*>", re.I)
+_TAG_TAIL = 16                       # 區塊邊界可能切在標籤中間：每次從尾端往前一點重掃
+
+class UpstreamTooLarge(RuntimeError):
+    """回應超過 UPSTREAM_MAX_BYTES；不是表單結構過時，fetch_chart 不重試。"""
+
+_read_lock = threading.Lock()
+READ_STATS = {"early": 0, "full": 0, "too_large": 0, "bytes": 0}
+
+def count_read(kind: str, nbytes: int):
+    with _read_lock:
+        READ_STATS[kind] += 1
+        READ_STATS["bytes"] += nbytes
+
+class StreamedPage:
+    """包住 stream=True 的回應：head() 讀到第 LAYOUT_TABLES 個 </table> 為止，rest() 讀完其餘。"""
+
+    def __init__(self, resp, limit: int = UPSTREAM_MAX_BYTES):
+        self.resp = resp
+        self.chunks = resp.iter_content(UPSTREAM_CHUNK)
+        self.buf = bytearray()
+        self.limit = limit
+        self.done = False
+
+    def _pull(self) -> bool:
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.done = True
+            return False
+        self.buf += chunk
+        if len(self.buf) > self.limit:
+            count_read("too_large", len(self.buf))
+            raise UpstreamTooLarge(f"上游回應超過 {self.limit} bytes，已中止讀取")
+        return True
+
+    def head(self) -> bytes:
+        seen, pos = 0, 0
+        while True:
+            for m in _TABLE_CLOSE.finditer(self.buf, pos):
+                seen += 1
+                pos = m.end()
+                if seen >= LAYOUT_TABLES:
+                    return bytes(self.buf[:pos])
+            pos = max(pos, len(self.buf) - _TAG_TAIL)
+            if not self._pull():
+                return bytes(self.buf)
+
+    def rest(self) -> bytes:
+        while self._pull():
+            pass
+        return bytes(self.buf)
+
+    def close(self):
+        self.resp.close()
+
+def read_chart_page(resp) -> str:
+    page = StreamedPage(resp)
+    try:
+        with upstream_wait():
+            head = page.head()
+        if not page.done:
+            fp, name, raw = match_layout(head)
+            if raw is not None:
+                count_layout(fp, name, True)
+                count_read("early", len(head))
+                return raw
+        with upstream_wait():
+            content = page.rest()
+        count_read("full", len(content))
+        return parse_chart_page(content)
+    finally:
+        page.close()               # 提早結束時未讀的部分直接丟棄，連線不回收
+
+# ---------------------------
+# 取命盤：共用快取 → 本地命盤庫 → 上游（同一張命盤跨 worker 只會有一個在抓）
+# ---------------------------
+CHART_STORE = chart_store.open_default_store()
+CHART_INDEX = chart_index.open_default_index()     # CHART_INDEX_PATH：python chart_index.py build 產生
+CHART_KEY_LOG = os.environ.get("CHART_KEY_LOG")   # 供 prefetch.py --access-log 統計熱門鍵
+CACHE = shared_cache.open_default_cache()          # CACHE_BACKEND=memory|file|redis
+CHART_CACHE_TTL = float(os.environ.get("CHART_CACHE_TTL", 7 * 86400))
+FORM_SCHEMA_TTL = float(os.environ.get("FORM_SCHEMA_TTL", 6 * 3600))
+REPORT_CACHE_TTL = float(os.environ.get("REPORT_CACHE_TTL", 86400))
+
+def log_chart_key(key: tuple, source: str):
+    if not CHART_KEY_LOG:
+        return
+    with open(CHART_KEY_LOG, "a", encoding="utf-8") as f:
+        f.write("\t".join([str(int(time.time()))] + [str(x) for x in key] + [source]) + "\n")
+
+def load_chart(key: tuple) -> str:
+    if CHART_STORE is not None:
+        raw = CHART_STORE.get(*key)
+        if raw is not None:
+            log_chart_key(key, "store")
+            return raw
+    raw = fetch_chart(*key)
+    log_chart_key(key, "upstream")
+    if CHART_STORE is not None:
+        CHART_STORE.put(*key, raw)
+    return raw
+
+def get_chart(key: tuple):
+    """key 為 chart_input.canonical_key 的標準鍵（已驗證）。"""
+    computed = []
+
+    def load() -> bytes:
+        computed.append(True)
+        return load_chart(key).encode("utf-8")
+
+    raw = CACHE.get_or_compute("chart", chart_input.key_string(key), load, CHART_CACHE_TTL)
+    if not computed:
+        log_chart_key(key, "cache")
+    return raw.decode("utf-8")
+
+# ---------------------------
+# 已解析命盤（依出生資料 LRU）：只換流年時不連上游、不重解析，只補算年份相關段落
+# ---------------------------
+PREPARED_CACHE_SIZE = int(os.environ.get("PREPARED_CACHE_SIZE", 256))
+_prepared = OrderedDict()
+_prepared_lock = threading.Lock()
+
+def get_prepared_chart(key: tuple) -> dict:
+    with _prepared_lock:
+        prep = _prepared.get(key)
+        if prep is not None:
+            _prepared.move_to_end(key)
+            return prep
+    with parse_guard.cpu_budget():         # 命盤頁解析 + 原文解析共用一份 CPU 預算（PARSE_CPU_BUDGET）
+        prep = mp.prepare_chart(get_chart(key))
+    with _prepared_lock:
+        _prepared[key] = prep
+        _prepared.move_to_end(key)
+        while len(_prepared) > PREPARED_CACHE_SIZE:
+            _prepared.popitem(last=False)
+    return prep
+
+# ---------------------------
+# 並行取多張命盤（合盤）：各自走共用快取 → 命盤庫 → 上游，總延遲約等於最慢的一張而非總和
+# ---------------------------
+CHART_FETCH_THREADS = int(os.environ.get("CHART_FETCH_THREADS", 8))
+_fetch_pool = ThreadPoolExecutor(CHART_FETCH_THREADS, thread_name_prefix="chart-fetch")
+
+def _prepared_timed(key: tuple):
+    _upstream_local.s = 0.0
+    try:
+        return get_prepared_chart(key), _upstream_local.s
+    finally:
+        del _upstream_local.s
+
+def get_prepared_charts(keys: list) -> list:
+    """同時取多張命盤；任一張失敗即丟出該例外。等上游的時間以最慢的一張計入本請求（並行的等待不重複累計）。"""
+    futures = [_fetch_pool.submit(_prepared_timed, k) for k in keys]
+    results = [f.result() for f in futures]
+    if has_request_context():
+        g.upstream_s = g.get("upstream_s", 0.0) + max(s for _, s in results)
+    return [prep for prep, _ in results]
+
+# ---------------------------
+# 表單 / 查詢參數：一律先經 chart_input 驗證與正規化，不合法的輸入不會碰到上游
+# ---------------------------
+DEFAULT_INPUTS = {"year": 1990, "month": 2, "day": 1, "hour": 0, "gender": "m", "cyear": 2026}
+
+def parse_inputs(src) -> dict:
+    """從 request.form / request.args 取出生資料與流年（缺的欄位用預設值）；不合法丟 chart_input.InputError。"""
+    return chart_input.validate_inputs(src, DEFAULT_INPUTS)
+
+def birth_key_of(inputs: dict) -> tuple:
+    return inputs["year"], inputs["month"], inputs["day"], inputs["hour"], inputs["gender"]
+
+def parse_partner_inputs(src) -> dict:
+    """合盤的第二人：欄位加尾碼 2（year2、month2…），流年與第一人共用；year2 必填。"""
+    if not src.get("year2"):
+        raise chart_input.InputError("year2", "合盤必填")
+    try:
+        y, m, d, h, gdr = chart_input.canonical_key(
+            *(src.get(k + "2", DEFAULT_INPUTS[k]) for k in ("year", "month", "day", "hour", "gender")))
+    except chart_input.InputError as e:         # 錯誤指回第二人的欄位（month2…），不是第一人的
+        raise chart_input.InputError(e.field + "2", e.msg) from None
+    return {"year": y, "month": m, "day": d, "hour": h, "gender": gdr}
+
 # ---------------------------
 # Flask UI
+# 結果頁用 GET 參數表示（/?year=..&month=..&day=..&hour=..&gender=..&cyear=..），網址固定即可快取；
+# ETag 取自命盤原文 + 流年 + 版面版本，命中時不重算報告
+# ---------------------------
+RENDER_VERSION = http_cache.file_digest(
+    os.path.join(app.root_path, "templates", "index.html"),
+    os.path.join(app.root_path, "mingpan_templates.py"),
+    os.path.join(app.root_path, "mingpan_logic.py"),
+)
+STATIC_VERSION = http_cache.static_version(app.static_folder)
+_FORM_PAGE = {}
+
+@app.context_processor
+def inject_static_version():
+    return {"static_v": STATIC_VERSION}
+
+app.view_functions["static"] = lambda filename: http_cache.serve_static(app.static_folder, filename)
+app.after_request(http_cache.compress_response)
+profiling.init_app(app)      # PROFILE_ENABLED=1 時才生效
+
+def _timing_start():
+    g.timing_t0 = time.perf_counter()
+    g.timing_c0 = time.thread_time()
+
+def _timing_finish(resp):
+    """Server-Timing：upstream = 等上游，cpu = 本執行緒 CPU（解析 + 報告 + 渲染），total = 牆鐘。"""
+    if "timing_t0" in g:
+        total = time.perf_counter() - g.timing_t0
+        cpu = time.thread_time() - g.timing_c0
+        resp.headers["Server-Timing"] = (
+            f"upstream;dur={g.get('upstream_s', 0.0) * 1000:.1f}, cpu;dur={cpu * 1000:.1f}, total;dur={total * 1000:.1f}"
+        )
+    return resp
+
+if SERVER_TIMING:
+    app.before_request(_timing_start)
+    app.after_request(_timing_finish)
+
 # ---------------------------
+# 准入控制：結果頁（interactive）/ API（batch）/ 健康檢查（health）分開排隊，
+# 並發上限依上游延遲調整，排不進去就立刻回 503 + Retry-After（見 admission.py）
+# ---------------------------
+_ADMISSION_THREADS = os.environ.get("ADMISSION_THREADS") or os.environ.get("GUNICORN_THREADS")
+ADMISSION = admission.AdmissionController(int(_ADMISSION_THREADS or 4),
+                                          enabled=admission.ENABLED and bool(_ADMISSION_THREADS))
+ADMISSION_EXEMPT_PREFIXES = ("/static/", "/_")     # 靜態檔與內部端點不排隊
+HEALTH_PATHS = ("/healthz", "/readyz")               # 只讀記憶體，不排隊、不佔名額
+
+def request_class() -> Optional[str]:
+    """None = 不經准入控制。客戶端可用 X-Request-Priority: batch 自降優先級（不能自升）。"""
+    path = request.path
+    if path.startswith(ADMISSION_EXEMPT_PREFIXES):
+        return None
+    if path in HEALTH_PATHS:
+        return "health"
+    if path.startswith("/api/") or request.headers.get("X-Request-Priority", "").strip().lower() == "batch":
+        return "batch"
+    return "interactive"
+
+def overloaded_response(e: admission.Rejected):
+    if request.path.startswith("/api/"):
+        resp = api_error(str(e), 503)
+    else:
+        resp = error_page(e, dict(DEFAULT_INPUTS), 503)
+    resp.headers["Retry-After"] = str(e.retry_after)
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+@app.before_request
+def start_upstream_probe():
+    PROBER.ensure_started()          # PROBE_ENABLED=1 時，每個 worker 進程第一次收到請求就啟動（preload 的 master 不探測）
+
+@app.before_request
+def admit_request():
+    klass = request_class()
+    if klass is None:
+        return None
+    try:
+        g.admission = ADMISSION.acquire(klass)
+    except admission.Rejected as e:
+        return overloaded_response(e)
+    return None
+
+@app.teardown_request
+def release_request(exc):
+    ticket = g.pop("admission", None)
+    if ticket is not None:
+        ADMISSION.release(ticket, g.get("upstream_s", 0.0))
+
+def preload_heavy_modules():
+    """gunicorn preload 時在 master 先載入延遲匯入的解析套件，worker fork 後以 copy-on-write 共用。"""
+    import requests                     # noqa: F401
+    import lxml.etree                   # noqa: F401
+    from bs4 import BeautifulSoup
+    BeautifulSoup("<table><tr><td>暖機</td></tr></table>", "lxml")
+
+def render_report_html(prep: dict, cyear: int) -> str:
+    with mp.capture_debug() as lines:
+        report = mp.render_report_for_year(prep, cyear)
+    debug = "\n".join(lines)
+    full = (debug + "\n\n" + report) if debug else report
+    return (
+        "<pre style='white-space:pre-wrap;font-size:14px;line-height:1.6;'>"
+        + html.escape(full) + "</pre>"
+    )
+
+def error_page(e: Exception, user_inputs: dict, status: int = 200):
+    output_html = f"<p style='color:red;'>發生錯誤：{html.escape(str(e))}</p>"
+    resp = make_response(render_template("index.html", result_html=output_html, raw_input="", inputs=user_inputs), status)
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+def form_page():
+    """空白表單：每個進程只渲染一次。"""
+    if "body" not in _FORM_PAGE:
+        body = render_template("index.html", result_html="", raw_input="", inputs=DEFAULT_INPUTS)
+        _FORM_PAGE["body"] = body
+        _FORM_PAGE["etag"] = hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+    etag = _FORM_PAGE["etag"]
+    resp = Response(status=304) if http_cache.etag_matches(etag) else make_response(_FORM_PAGE["body"])
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = http_cache.FORM_CACHE_CONTROL
+    return resp
+
 @app.route("/", methods=["GET", "POST"])
 def home():
-    output_html = ""
-    raw_text = ""
-    user_inputs = {"year": 1990, "month": 2, "day": 1, "hour": 0, "gender": "m", "cyear": 2026}
-
     if request.method == "POST":
+        # 舊表單 / 外部 POST：轉成可快取的 GET 網址
+        try:
+            user_inputs = parse_inputs(request.form)
+        except chart_input.InputError as e:
+            return error_page(e, dict(DEFAULT_INPUTS), 400)
+        return redirect(url_for("home", **user_inputs), code=303)
+
+    if "year" not in request.args:
+        return form_page()
+
+    try:
+        user_inputs = parse_inputs(request.args)
+    except chart_input.InputError as e:
+        return error_page(e, dict(DEFAULT_INPUTS), 400)
+    try:
+        prep = get_prepared_chart(birth_key_of(user_inputs))
+        etag = chart_fingerprint(prep["raw"], user_inputs["cyear"], "html", RENDER_VERSION)
+        if http_cache.etag_matches(etag):
+            resp = Response(status=304)
+        else:
+            output_html = CACHE.get_or_compute(
+                "report", etag, lambda: render_report_html(prep, user_inputs["cyear"]).encode("utf-8"), REPORT_CACHE_TTL
+            ).decode("utf-8")
+            resp = make_response(render_template("index.html", result_html=output_html, raw_input=prep["raw"], inputs=user_inputs))
+    except Exception as e:
+        return error_page(e, user_inputs)
+
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = http_cache.RESULT_CACHE_CONTROL
+    return resp
+
+# ---------------------------
+# JSON API：結構化命盤與破財雷達（不渲染 HTML）
+# ---------------------------
+API_VERSION = "1"
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def chart_fingerprint(raw_text: str, *parts) -> str:
+    """命盤原文 + 其他影響輸出的參數（cyear、格式…）→ 強 ETag 用的指紋。"""
+    h = hashlib.blake2b(raw_text.encode("utf-8"), digest_size=16)
+    for p in parts:
+        h.update(b"\0" + str(p).encode("utf-8"))
+    return h.hexdigest()
+
+def api_encoding():
+    """依 Accept 選序列化格式：msgpack（需安裝）或 JSON（有 orjson 就用）。"""
+    if msgpack is not None and request.accept_mimetypes.best_match(
+            ["application/json", "application/msgpack"]) == "application/msgpack":
+        return "msgpack", "application/msgpack"
+    return "json", "application/json"
+
+def encode_payload(obj, fmt: str) -> bytes:
+    if fmt == "msgpack":
+        return msgpack.packb(obj, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def api_error(msg: str, status: int):
+    fmt, mimetype = api_encoding()
+    return Response(encode_payload({"error": msg}, fmt), status=status, mimetype=mimetype)
+
+def parse_period_args(src) -> dict:
+    """months=1 → 附整年 12 個流月；lmonth=N → 附農曆 N 月每日的流日（month 是出生月，故另取名）。"""
+    return {
+        "months": src.get("months", "") in ("1", "true", "yes"),
+        "month": chart_input.lunar_month(src["lmonth"]) if src.get("lmonth") else None,
+    }
+
+def period_payload(entries: list) -> list:
+    """流月 / 流日清單：每筆只帶命宮欄與財忌結論（不重複附整列）。"""
+    out = []
+    for e in entries:
+        r = e["scope"]
+        item = {"month": e["month"]}
+        if "day" in e:
+            item["day"] = e["day"]
+        item.update({
+            "ming_branch": e["branch"], "ming_col": e["ming_col"],
+            "star": r["star"], "stem": r["stem"], "col": r["col"],
+            "palace": r["palace"], "palace_name": mp.PALACE_FULL.get(r["palace"], ""),
+            "status": r["note"] or "一般",
+        })
+        out.append(item)
+    return out
+
+def build_chart_payload(prep: dict, inputs: dict, periods: Optional[dict] = None) -> dict:
+    with mp.capture_debug():                            # DEBUG 輸出不進 API
+        res = mp.cai_ji_for_year(prep, inputs["cyear"])
+
+    def scope(r: dict, row: list) -> dict:
+        return {
+            "star": r["star"], "stem": r["stem"], "col": r["col"],
+            "palace": r["palace"], "palace_name": mp.PALACE_FULL.get(r["palace"], ""),
+            "status": r["note"] or "一般",
+            "row": dict(zip(res["cols"], row)),
+        }
+
+    payload = {
+        "version": API_VERSION,
+        "input": inputs,
+        "birth_year": prep["byear"],
+        "year_stem": prep["year_stem"],
+        "palaces": mp.chart_records(prep["data"], prep["col_order"]),
+        "cai_ji": {
+            "cyear": res["cyear"], "age": res["age"], "daxian_anchor": res["anchor"],
+            "daxian": scope(res["daxian"], res["daxian_row"]),
+            "liunian": scope(res["liunian"], res["liu_row"]),
+        },
+    }
+    periods = periods or {}
+    if periods.get("months"):
+        payload["liuyue"] = period_payload(mp.cai_ji_for_months(prep, inputs["cyear"]))
+    if periods.get("month"):
+        payload["liuri"] = period_payload(mp.cai_ji_for_days(prep, inputs["cyear"], periods["month"]))
+    return payload
+
+@app.route("/api/chart", methods=["GET"])
+def api_chart():
+    try:
+        inputs = parse_inputs(request.args)
+        periods = parse_period_args(request.args)
+    except chart_input.InputError as e:
+        return api_error(f"參數錯誤：{e}", 400)
+    try:
+        prep = get_prepared_chart(birth_key_of(inputs))
+    except Exception as e:
+        return api_error(str(e), 502)
+
+    fmt, mimetype = api_encoding()
+    etag = chart_fingerprint(prep["raw"], inputs["cyear"], fmt, API_VERSION, periods["months"], periods["month"])
+    if http_cache.etag_matches(etag):              # 命盤與流年未變：不必重算
+        resp = Response(status=304)
+    else:
+        try:
+            payload = build_chart_payload(prep, inputs, periods)
+        except ValueError as e:                    # 原文缺農曆生月 / 生時
+            return api_error(str(e), 422)
+        resp = Response(encode_payload(payload, fmt), mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.vary.add("Accept")
+    resp.headers["Cache-Control"] = http_cache.RESULT_CACHE_CONTROL
+    return resp
+
+@app.route("/api/pair", methods=["GET"])
+def api_pair():
+    """
+    合盤：year/month/day/hour/gender 為第一人、year2/month2/… 為第二人，cyear 共用。
+    兩張命盤並行取得；cross 列出一方各層（本命 / 大限 / 流年）財宮天干的四化星落在另一方的哪一宮。
+    """
+    try:
+        inputs = parse_inputs(request.args)
+        partner = parse_partner_inputs(request.args)
+    except chart_input.InputError as e:
+        return api_error(f"參數錯誤：{e}", 400)
+    partner["cyear"] = inputs["cyear"]
+    try:
+        prep_a, prep_b = get_prepared_charts([birth_key_of(inputs), birth_key_of(partner)])
+    except Exception as e:
+        return api_error(str(e), 502)
+
+    fmt, mimetype = api_encoding()
+    etag = chart_fingerprint(prep_a["raw"], prep_b["raw"], inputs["cyear"], fmt, API_VERSION, "pair")
+    if http_cache.etag_matches(etag):
+        resp = Response(status=304)
+    else:
+        cyear = inputs["cyear"]
         try:
-            user_inputs["year"]   = int(request.form.get("year", 1990))
-            user_inputs["month"]  = int(request.form.get("month", 1))
-            user_inputs["day"]    = int(request.form.get("day", 1))
-            user_inputs["hour"]   = int(request.form.get("hour", 0))
-            user_inputs["gender"] = request.form.get("gender", "m")
-            user_inputs["cyear"]  = int(request.form.get("cyear", 2026))
-
-            raw_text = fetch_chart(
-                user_inputs["year"], user_inputs["month"],
-                user_inputs["day"], user_inputs["hour"], user_inputs["gender"]
-            )
-
-            mp.CYEAR = user_inputs["cyear"]
-            buf = io.StringIO()
-            with contextlib.redirect_stdout(buf):
-                report = mp.run_report(raw_text)
-            debug = buf.getvalue().strip()
-            full = (debug + "\n\n" + report) if debug else report
-
-            output_html = (
-                "<pre style='white-space:pre-wrap;font-size:14px;line-height:1.6;'>"
-                + html.escape(full) + "</pre>"
-            )
-
-        except Exception as e:
-            output_html = f"<p style='color:red;'>發生錯誤：{html.escape(str(e))}</p>"
-
-    return render_template("index.html", result_html=output_html, raw_input=raw_text, inputs=user_inputs)
+            charts = [build_chart_payload(prep_a, inputs), build_chart_payload(prep_b, partner)]
+        except ValueError as e:
+            return api_error(str(e), 422)
+        with mp.capture_debug():
+            cross = {"a_to_b": mp.cross_cai_hua(prep_a, prep_b, cyear), "b_to_a": mp.cross_cai_hua(prep_b, prep_a, cyear)}
+        payload = {"version": API_VERSION, "cyear": cyear, "charts": charts, "cross": cross}
+        resp = Response(encode_payload(payload, fmt), mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.vary.add("Accept")
+    resp.headers["Cache-Control"] = http_cache.RESULT_CACHE_CONTROL
+    return resp
+
+SEARCH_MAX_LIMIT = 1000
+
+@app.route("/api/search", methods=["GET"])
+def api_search():
+    """
+    依命盤特徵查命盤庫：q 為布林查詢（見 chart_index），回傳命中數與前 limit 張的出生資料。
+    例：/api/search?q=star:紫微@命 AND caiji:2027:流年=田宅宮&limit=20
+    """
+    if CHART_INDEX is None:
+        return api_error("未設定命盤索引（CHART_INDEX_PATH）", 404)
+    try:
+        limit = min(SEARCH_MAX_LIMIT, max(0, int(request.args.get("limit", 50))))
+    except ValueError:
+        return api_error("參數錯誤：limit 須為整數", 400)
+    q = request.args.get("q", "")
+    CHART_INDEX.refresh()
+    index = CHART_INDEX.current()          # 查詢與取鍵用同一版索引
+    try:
+        bm = index.query(q)
+    except chart_index.QueryError as e:
+        return api_error(f"查詢錯誤：{e}", 400)
+    fmt, mimetype = api_encoding()
+    payload = {
+        "q": q, "count": index.count(bm), "n_docs": index.n_docs,
+        "charts": [dict(zip(("year", "month", "day", "hour", "gender"), key))
+                   for key in index.keys_of(bm, limit)],
+    }
+    resp = Response(encode_payload(payload, fmt), mimetype=mimetype)
+    resp.vary.add("Accept")
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+REVERSE_MAX_YEARS = int(os.environ.get("REVERSE_MAX_YEARS", 10))   # 無索引、需掃命盤庫時的年數上限
+
+@app.route("/api/reverse", methods=["GET"])
+def api_reverse():
+    """
+    反查：cyear + 財忌條件（da / liu / da_star / liu_star / da_status / liu_status）+ from / to 出生年，
+    以 NDJSON 串流回傳符合的出生資料，最後一行為統計。索引涵蓋該流年時不限年數。
+    例：/api/reverse?cyear=2027&liu=田宅宮&from=1980&to=1989
+    """
+    try:
+        target = reverse_search.parse_target(request.args)
+        if CHART_INDEX is not None:
+            CHART_INDEX.refresh()
+        span = 0 if reverse_search.index_covers(CHART_INDEX, target["cyear"]) else REVERSE_MAX_YEARS
+        year_from, year_to = chart_input.year_range(request.args.get("from", ""), request.args.get("to", ""), span)
+        gender = chart_input.normalize_gender(request.args["gender"]) if request.args.get("gender") else None
+        limit = min(SEARCH_MAX_LIMIT, max(0, int(request.args.get("limit", SEARCH_MAX_LIMIT))))
+    except chart_input.InputError as e:
+        return api_error(f"參數錯誤：{e}", 400)
+    except ValueError:
+        return api_error("參數錯誤：limit 須為整數", 400)
+    if CHART_STORE is None and not reverse_search.index_covers(CHART_INDEX, target["cyear"]):
+        return api_error("沒有命盤庫或涵蓋該流年的索引可供反查", 404)
+
+    def generate():
+        # 在 worker 執行緒內逐批解析；不開子行程（gunicorn worker 內 fork 不划算）
+        for rec in reverse_search.search(target, year_from, year_to, gender, CHART_STORE, CHART_INDEX, 0, limit):
+            yield json.dumps(rec, ensure_ascii=False) + "\n"
+
+    resp = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+@app.route("/_layouts", methods=["GET"])
+def layout_stats():
+    """
+    各上游版面指紋的解析次數（快速 / 退回通用），上游改版時會出現新的 unknown 指紋；
+    reads：命盤頁提早停讀 / 讀完整頁 / 超過上限的次數與累計讀入位元組。
+    """
+    with _layout_lock, _read_lock:
+        body = json.dumps({"layouts": LAYOUT_STATS, "reads": READ_STATS}, ensure_ascii=False, indent=1)
+    resp = Response(body, mimetype="application/json")
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+@app.route("/healthz", methods=["GET", "HEAD"])
+def healthz():
+    """存活檢查：進程能回應即可，不看上游、不渲染模板（render.yaml 的 healthCheckPath）。"""
+    resp = Response("ok\n", mimetype="text/plain")
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+@app.route("/readyz", methods=["GET", "HEAD"])
+def readyz():
+    """就緒檢查：讀背景探測的快取結果（上游表單能否解析、延遲歷史）；未就緒回 503。"""
+    snap = PROBER.snapshot()
+    resp = Response(json.dumps(snap, ensure_ascii=False, indent=1), status=200 if snap["ready"] else 503,
+                    mimetype="application/json")
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+@app.route("/_admission", methods=["GET"])
+def admission_stats():
+    """本 worker 的准入控制狀態：目前並發上限、各類進行中 / 排隊數、拒絕次數、上游延遲。"""
+    resp = Response(json.dumps(ADMISSION.snapshot(), ensure_ascii=False, indent=1), mimetype="application/json")
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
+
+@app.route("/_cache", methods=["GET"])
+def cache_stats():
+    """本 worker 的共用快取命中統計（命盤 / 表單結構 / 報告）。"""
+    resp = Response(json.dumps(CACHE.snapshot(), ensure_ascii=False, indent=1), mimetype="application/json")
+    resp.headers["Cache-Control"] = http_cache.NO_STORE
+    return resp
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=os.environ.get("FLASK_DEBUG", "1") == "1")
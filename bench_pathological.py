@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+病態輸入基準：證明解析層在最壞情況下仍是線性時間。
+
+每個案例產生長度 n, 2n, 4n… 的惡意 / 畸形輸入（長串空白、未閉合的【、沒有換行的重複表頭…），
+量目前的解析函式耗時，算「長度加倍時耗時變幾倍」的指數（1 ≈ 線性，2 ≈ 平方）。
+--legacy 另跑改寫前的正規式作對照（平方級，尺寸最好別開太大）。
+量測時暫時關掉 parse_guard 的大小上限（量的是演算法本身），最後再示範預設上限與 CPU 預算的攔截。
+
+用法：python bench_pathological.py [--sizes 2000,4000,8000,16000,32000] [--legacy] [--max-exponent 1.4]
+任何案例的指數超過 --max-exponent 時結束碼為 1，可放進 CI。
+"""
+import argparse
+import math
+import re
+import time
+
+import mingpan_logic as mp
+import parse_guard
+import star_catalog
+
+GZ = "甲乙丙丁戊己庚辛壬癸"
+DZ = "子丑寅卯辰巳午未申酉戌亥"
+
+# 改寫前的寫法（對照用）
+LEGACY = {
+    "header": lambda t: re.search(r"([%s][%s])?\s*【([^】]+宮)】" % (GZ, DZ), t),
+    "trailing": lambda t: [re.sub(r"[，、]+\s*$", "", ln) for ln in t.splitlines()],
+    "blocks": lambda t: list(re.finditer(
+        r"([%s][%s])【([^】]+)】\s*大限:([0-9]+)-([0-9]+)\s*小限:[^\n]*\n([^\n]+)" % (GZ, DZ), t)),
+    "lunar": lambda t: re.search(
+        r"農曆[:：︰]?\s*\d{4}年\s*(閏)?\s*(\d{1,2})月\s*(\d{1,2})日\s*([子丑寅卯辰巳午未申酉戌亥])時", t),
+    "token": lambda t: re.sub(r"(旺|陷|廟|地|平|權|科|祿|忌|利)+$", "", t),
+}
+
+def _cases(app):
+    """(名稱, 產生長度約 n 的輸入, 目前的解析函式, 對照的舊寫法鍵)"""
+    return [
+        ("大限後長空白", lambda n: "大限" + " " * n + "x", app.palace_block_from_text, None),
+        ("未閉合的【", lambda n: "【" * n + "宮", app.build_header, "header"),
+        ("長空白無【", lambda n: " " * n + "x", app.build_header, "header"),
+        ("行尾長串逗號", lambda n: "天機" + "，" * n + "x", app.palace_block_from_text, "trailing"),
+        ("重複表頭無換行", lambda n: "甲子【命宮】大限:1-2小限:" * (n // 16), lambda t: list(mp.iter_palace_blocks(t)), "blocks"),
+        ("未閉合表頭", lambda n: "甲子【" * (n // 3), lambda t: list(mp.iter_palace_blocks(t)), "blocks"),
+        ("農曆後長空白", lambda n: "農曆1991年" + " " * n + "x", mp.parse_lunar_birth, "lunar"),
+        ("四化連串", lambda n: "祿" * n + "x", star_catalog.scan_star_line, "token"),
+        ("星曜長行", lambda n: "天機旺,祿,天天" * (n // 8), star_catalog.scan_star_line, None),
+    ]
+
+def time_call(fn, arg, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def growth_exponent(sizes, times) -> float:
+    """相鄰尺寸耗時比的 log2 / 尺寸比的 log2，取最後兩段的中位（前段太小容易被常數項蓋過）。"""
+    exps = []
+    for (n0, t0), (n1, t1) in zip(zip(sizes, times), zip(sizes[1:], times[1:])):
+        if t0 > 0 and t1 > 0:
+            exps.append(math.log(t1 / t0) / math.log(n1 / n0))
+    tail = sorted(exps[-2:]) if exps else [0.0]
+    return tail[len(tail) // 2]
+
+def run(sizes, legacy: bool, legacy_max: int, max_exponent: float) -> bool:
+    import app
+
+    saved = (parse_guard.MAX_CELL_CHARS, parse_guard.MAX_RAW_CHARS)
+    parse_guard.MAX_CELL_CHARS = parse_guard.MAX_RAW_CHARS = 0
+    ok = True
+    try:
+        print(f"{'案例':<12} {'尺寸':>8} {'目前 ms':>10} {'舊寫法 ms':>10}")
+        for name, gen, fn, old_key in _cases(app):
+            times, old_sizes, old_times = [], [], []
+            for n in sizes:
+                text = gen(n)
+                t = time_call(fn, text)
+                times.append(t)
+                old = ""
+                if legacy and old_key and n <= legacy_max:
+                    ot = time_call(LEGACY[old_key], text, repeat=1)
+                    old_sizes.append(n)
+                    old_times.append(ot)
+                    old = f"{ot * 1000:10.2f}"
+                print(f"{name:<12} {n:>8} {t * 1000:10.3f} {old:>10}")
+            exp = growth_exponent(sizes, times)
+            flag = "OK" if exp <= max_exponent else "超線性！"
+            ok = ok and exp <= max_exponent
+            line = f"  → 加倍指數 {exp:.2f} {flag}"
+            if len(old_times) >= 2:
+                line += f"（舊寫法 {growth_exponent(old_sizes, old_times):.2f}）"
+            print(line)
+    finally:
+        parse_guard.MAX_CELL_CHARS, parse_guard.MAX_RAW_CHARS = saved
+
+    # 預設上限：過大的輸入在進正規式之前就被拒絕
+    big = "大限" + " " * (max(sizes) * 4) + "x"
+    t0 = time.perf_counter()
+    try:
+        app.palace_block_from_text(big)
+        print(f"\n上限 PARSE_MAX_CELL_CHARS={parse_guard.MAX_CELL_CHARS}：{len(big)} 字的格子未被攔下")
+    except parse_guard.ParseLimitError as e:
+        print(f"\n上限：{e}（{(time.perf_counter() - t0) * 1e6:.0f} µs）")
+
+    # CPU 預算：極小預算下解析一份很長的原文，應在第一批區塊內中止
+    raw = "甲子【命宮】大限:1-2小限:\n天機\n" * 20000
+    parse_guard.MAX_RAW_CHARS = 0
+    t0 = time.perf_counter()
+    try:
+        with parse_guard.cpu_budget(0.005):
+            mp.parse_chart(raw)
+        print("CPU 預算：5 ms 內解析完畢，未觸發")
+    except parse_guard.ParseLimitError as e:
+        print(f"CPU 預算：{e}（牆鐘 {(time.perf_counter() - t0) * 1000:.1f} ms）")
+    finally:
+        parse_guard.MAX_RAW_CHARS = saved[1]
+    return ok
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="病態輸入基準：解析層最壞情況應為線性")
+    ap.add_argument("--sizes", default="2000,4000,8000,16000,32000")
+    ap.add_argument("--legacy", action="store_true", help="另跑改寫前的正規式作對照")
+    ap.add_argument("--legacy-max", type=int, default=8000, help="舊寫法只跑到這個尺寸（平方級）")
+    ap.add_argument("--max-exponent", type=float, default=1.4)
+    args = ap.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    raise SystemExit(0 if run(sizes, args.legacy, args.legacy_max, args.max_exponent) else 1)
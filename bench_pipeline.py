@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+離線管線基準：讀 upstream_replay 錄下的回應檔，對每一個命盤結果頁（POST 回應）
+重跑 解碼 → 找主表 → 逐格解析 → run_report，輸出各階段耗時分佈；
+另量 parse_chart_page（依版面指紋走快速解析）的整段耗時作對照。
+完全不連網、輸入固定，可當效能回歸測試。
+
+用法：
+  UPSTREAM_MODE=record UPSTREAM_ARCHIVE=prod.ndjson.gz gunicorn app:app ...   # 先錄
+  python bench_pipeline.py prod.ndjson.gz [--repeat 3] [--dump-raw corpus.ndjson]
+"""
+import argparse
+import base64
+import json
+import statistics
+import time
+
+import mingpan_logic as mp
+import upstream_replay
+
+def _pct(vals, q):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+def bench(archive: str, repeat: int = 1, dump_raw: str = ""):
+    import app
+
+    pages = [r for r in upstream_replay.iter_records(archive) if r["method"] == "POST"]
+    stages = {"decode_html": [], "find_main_table": [], "parse_blocks": [], "run_report": [], "total": [],
+              "parse_chart_page": []}
+    dump = open(dump_raw, "w", encoding="utf-8") if dump_raw else None
+    failed = 0
+
+    for rnd in range(repeat):
+        for rec in pages:
+            content = base64.b64decode(rec["body_b64"])
+            t0 = time.perf_counter()
+            soup = app.decode_html(content)
+            t1 = time.perf_counter()
+            table = app.find_main_table(soup)
+            t2 = time.perf_counter()
+            if table is None:
+                failed += 1
+                continue
+            blocks = [b for b in (app.parse_palace_block(td) for td in table.find_all("td")) if b]
+            raw = "\n\n".join(blocks)
+            t3 = time.perf_counter()
+            with mp.capture_debug():
+                mp.run_report(raw)
+            t4 = time.perf_counter()
+            app.parse_chart_page(content)
+            t5 = time.perf_counter()
+            for k, v in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0, t5 - t4)):
+                stages[k].append(v * 1000)
+            if dump is not None and rnd == 0:
+                dump.write(json.dumps({"raw": raw, "request": rec["data"]}, ensure_ascii=False) + "\n")
+    if dump is not None:
+        dump.close()
+
+    print(f"命盤頁 {len(pages)} 張 × {repeat} 輪，找不到主表 {failed} 次")
+    for fp, st in app.LAYOUT_STATS.items():
+        print(f"版面 {fp} ({st['name']})：快速 {st['fast']}，退回通用 {st['fallback']}")
+    for k, vals in stages.items():
+        if vals:
+            print(f"{k:>16}: 中位數 {statistics.median(vals):7.2f} ms  p95 {_pct(vals, 0.95):7.2f} ms  合計 {sum(vals):9.1f} ms")
+    return stages
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="以錄製的上游回應做離線管線基準")
+    ap.add_argument("archive")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--dump-raw", default="", help="順便輸出命盤原文 NDJSON（給 run_corpus / mingpan_batch 用）")
+    args = ap.parse_args()
+    mp.DEBUG = False
+    bench(args.archive, args.repeat, args.dump_raw)
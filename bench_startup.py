@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+冷啟動基準：每輪開一個新的 Python 進程，量
+  - import app 的時間
+  - 第一個 GET / 回應（渲染表單）
+  - 第一份報告（--raw 指定命盤原文時，以該原文代替上游，量 POST / → 303 → GET 報告頁全程）
+最後列出 -X importtime 累計最久的模組。
+
+用法：python bench_startup.py [--runs 5] [--raw chart.txt]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+c = app.app.test_client()
+r = c.get("/")
+assert r.status_code == 200
+t2 = time.perf_counter()
+out = {"import_app": t1 - t0, "first_get": t2 - t1}
+raw_path = sys.argv[1]
+if raw_path:
+    raw = open(raw_path, encoding="utf-8").read()
+    app.get_chart = lambda *a: raw
+    r = c.post("/", data={"year": 1990, "month": 2, "day": 1, "hour": 0, "gender": "m", "cyear": 2026},
+               follow_redirects=True)
+    assert r.status_code == 200 and len(r.history) == 1
+    out["first_report"] = time.perf_counter() - t2
+print(json.dumps(out))
+"""
+
+def run_once(raw_path: str) -> dict:
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-c", CHILD, raw_path or ""], cwd=HERE,
+                       capture_output=True, text=True, check=True)
+    out = json.loads(p.stdout.strip().splitlines()[-1])
+    out["process_total"] = time.perf_counter() - t0
+    return out
+
+def import_top(n: int = 10):
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=HERE,
+                       capture_output=True, text=True, check=True)
+    rows = []
+    for ln in p.stderr.splitlines():
+        if not ln.startswith("import time:") or "cumulative" in ln:
+            continue
+        _, cum_us, name = ln.split("|", 2)
+        rows.append((int(cum_us), name.rstrip()))
+    # 只看頂層套件（縮排最淺的兩層）
+    rows = [r for r in rows if len(r[1]) - len(r[1].lstrip()) <= 3]
+    return sorted(rows, reverse=True)[:n]
+
+def main():
+    ap = argparse.ArgumentParser(description="冷啟動到第一個回應的時間")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--raw", help="命盤原文檔（量第一份報告）")
+    args = ap.parse_args()
+
+    results = [run_once(args.raw) for _ in range(args.runs)]
+    for key in results[0]:
+        vals = [r[key] * 1000 for r in results]
+        print(f"{key:>15}: 中位數 {statistics.median(vals):7.1f} ms（最小 {min(vals):.1f} / 最大 {max(vals):.1f}）")
+    print("\nimport app 累計最久：")
+    for cum, name in import_top():
+        print(f"  {cum / 1000:7.1f} ms  {name.strip()}")
+
+if __name__ == "__main__":
+    main()
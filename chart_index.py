@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+命盤語料庫倒排索引
+
+從命盤庫（chart_store）建索引：每張命盤一個文件編號（依出生資料排序），每個特徵（term）一張點陣圖，
+第 i 位 = 第 i 張命盤具有此特徵。查詢時點陣圖就是 Python int，AND / OR / NOT 直接是 & | ^，
+百萬張命盤（125 KB 的整數）一次運算只要數十微秒，不必重解析任何命盤。
+
+特徵（term）：
+  star:紫微@命               星曜落在本命某宮（全星曜目錄，見 star_catalog）
+  stem:命=甲  branch:命=亥    本命各宮天干 / 地支
+  dx:命=3-12                 本命各宮大限區間
+  shen:遷                    身宮所在
+  byear:1991  gender:m  ystem:辛
+  caiji:2027:流年=田          該年流年財忌落宮（大限同理：caiji:2027:大限=財）
+  caiji:2027:流年:star=太陽   caiji:2027:流年:status=自化忌
+查詢語法：AND / OR / NOT / 括號（NOT > AND > OR；相鄰兩個條件預設為 AND），
+宮位可寫全名（田宅宮 → 田）；數值可寫範圍（byear:1980..1990）；ALL = 全部命盤。
+  例：star:紫微@命 AND caiji:2027:流年=田宅宮
+
+檔案格式："ZWIX1\\n" + 4 bytes 表頭長度 + 表頭 JSON + 資料區
+  命盤鍵：每張 6 bytes（<HBBBc），整段 zlib
+  點陣圖：每 65536 張一塊、各塊獨立 zlib（稀疏特徵壓得很小；全空的塊不存）
+建索引需要 numpy（財忌以 mingpan_batch 向量化計算）；查詢只用標準庫。
+
+用法：
+  python chart_index.py build charts.db charts.idx [--cyears 2020-2035]
+  python chart_index.py query charts.idx "star:紫微@命 AND caiji:2027:流年=田" [--limit 20]
+  python chart_index.py terms charts.idx [前綴]
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import mingpan_logic as mp
+
+MAGIC = b"ZWIX1\n"
+CHUNK_DOCS = 1 << 16
+CHUNK_BYTES = CHUNK_DOCS // 8
+KEY_STRUCT = struct.Struct("<HBBBc")
+TERM_CACHE = int(os.environ.get("CHART_INDEX_TERM_CACHE", 512))   # 已解壓的點陣圖最多留幾張
+
+class QueryError(ValueError):
+    """查詢語法錯誤。"""
+
+# ======================= 特徵 =======================
+def chart_terms(key: tuple, parsed) -> set:
+    """單張命盤的靜態特徵（不含與流年有關的財忌）。"""
+    data, col_order, year_stem = parsed
+    terms = {f"byear:{key[0]}", f"gender:{key[4]}"}
+    if year_stem:
+        terms.add(f"ystem:{year_stem}")
+    for col in col_order:
+        b = data[col]
+        pal = b["abbr"]
+        if not pal:
+            continue
+        terms.add(f"stem:{pal}={col[0]}")
+        terms.add(f"branch:{pal}={col[1]}")
+        terms.add(f"dx:{pal}={b['daxian'].replace('~', '-')}")
+        if "身宮" in b["palace"]:
+            terms.add(f"shen:{pal}")
+        for st in b.get("stars", []):
+            if st["category"] != "unknown":
+                terms.add(f"star:{st['name']}@{pal}")
+    return terms
+
+# ======================= 建索引 =======================
+class IndexBuilder:
+    """依序 add 命盤，每滿一塊就把該塊各特徵的點陣圖壓縮存起來；最後 write。"""
+
+    def __init__(self, cyears=()):
+        import mingpan_batch
+        self.batch = mingpan_batch
+        self.cyears = list(cyears)
+        self.keys = []
+        self.postings = {}           # term -> [(塊號, 壓縮後的點陣圖)]
+        self._ids = {}               # 目前這塊：term -> [塊內編號 或 ndarray]
+        self._rows, self._row_ids = [], []
+
+    def add(self, key: tuple, raw_text: str):
+        local = len(self.keys) % CHUNK_DOCS
+        parsed = mp.parse_chart(raw_text)
+        for t in chart_terms(key, parsed):
+            self._ids.setdefault(t, []).append(local)
+        enc = self.batch.encode_chart(raw_text, parsed)
+        if enc is not None:
+            self._rows.append(enc)
+            self._row_ids.append(local)
+        self.keys.append(key)
+        if local == CHUNK_DOCS - 1:
+            self._flush()
+
+    def _add_cai_ji(self):
+        """本塊所有命盤在各流年的大 / 流財忌：整塊向量化算，依結果值分組成特徵。"""
+        np = self.np
+        corpus = self.batch.stack_rows(self._rows)
+        ids = np.asarray(self._row_ids, dtype=np.int64)
+        for y in self.cyears:
+            res = self.batch.cai_ji_batch(corpus, y)
+            for scope, pre in (("大限", "da"), ("流年", "liu")):
+                groups = (
+                    (res[f"{pre}_palace"], lambda v: f"caiji:{y}:{scope}={mp.PALACE_ORDER[v]}"),
+                    (res[f"{pre}_star"], lambda v: f"caiji:{y}:{scope}:star={self.batch.STAR_LIST[v]}"),
+                    (res[f"{pre}_status"], lambda v: f"caiji:{y}:{scope}:status={self.batch.STATUS_TEXT[v]}"),
+                )
+                for arr, name in groups:
+                    for v in np.unique(arr):
+                        term = name(int(v)) if v >= 0 else ""
+                        if term and not term.endswith("="):       # 找不到 / 無特殊狀態不建特徵
+                            self._ids.setdefault(term, []).append(ids[arr == v])
+
+    def _flush(self):
+        if not self.keys or (not self._ids and not self._rows):
+            return
+        import numpy as np
+        self.np = np
+        if self._rows and self.cyears:
+            self._add_cai_ji()
+        chunk_no = (len(self.keys) - 1) // CHUNK_DOCS
+        for term, parts in self._ids.items():
+            bits = np.zeros(CHUNK_DOCS, dtype=bool)
+            for p in parts:
+                bits[p] = True
+            blob = zlib.compress(np.packbits(bits, bitorder="little").tobytes(), 6)
+            self.postings.setdefault(term, []).append((chunk_no, blob))
+        self._ids, self._rows, self._row_ids = {}, [], []
+
+    def write(self, path: str):
+        self._flush()
+        keys_blob = zlib.compress(b"".join(
+            KEY_STRUCT.pack(y, m, d, h, g.encode("ascii")) for y, m, d, h, g in self.keys), 6)
+        terms, offset = {}, len(keys_blob)
+        for term in sorted(self.postings):
+            entries = []
+            for chunk_no, blob in self.postings[term]:
+                entries.append([chunk_no, offset, len(blob)])
+                offset += len(blob)
+            terms[term] = entries
+        header = json.dumps({
+            "version": 1, "n_docs": len(self.keys), "chunk_docs": CHUNK_DOCS, "cyears": self.cyears,
+            "built_at": int(time.time()), "keys": [0, len(keys_blob)], "terms": terms,
+        }, ensure_ascii=False).encode("utf-8")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header + keys_blob)
+            for term in sorted(self.postings):
+                for _, blob in self.postings[term]:
+                    f.write(blob)
+        os.replace(tmp, path)          # 查詢端以 mtime 察覺後重開；舊的 mmap 仍指向舊檔，不受影響
+
+def build_from_store(store, path: str, cyears=(), progress_every: int = 0) -> int:
+    builder = IndexBuilder(cyears)
+    for key, raw, _ in store.iter_latest():
+        builder.add(key, raw)
+        if progress_every and len(builder.keys) % progress_every == 0:
+            print(f"  已加入 {len(builder.keys)} 張", flush=True)
+    builder.write(path)
+    return len(builder.keys)
+
+# ======================= 查詢 =======================
+_TOKEN = re.compile(r"\(|\)|[^\s()]+")
+_RANGE = re.compile(r"(.+?)(\d+)\.\.(\d+)$")
+_NONZERO = re.compile(rb"[^\x00]")
+
+def normalize_term(term: str) -> str:
+    for full, ab in mp.PALACE_ABBR.items():
+        if full in term:
+            term = term.replace(full, ab)
+    return term
+
+QUERY_MAX_TOKENS = 2000      # 查詢字串的詞數上限
+QUERY_MAX_DEPTH = 64         # 括號 / NOT 巢狀層數上限（遞迴下降解析，避免 RecursionError）
+
+class IndexSnapshot:
+    """
+    某一版索引檔的唯讀視圖：mmap、表頭、已解壓的點陣圖快取綁在一起，不會被換掉。
+    一次查詢從頭到尾用同一個 snapshot，重建索引時不會拿新位移去讀舊檔。
+    不再被引用時（最後一個用到它的請求結束）關閉 mmap。
+    """
+
+    def __init__(self, path: str, cache_terms: int):
+        self.mm = None
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise RuntimeError(f"{path} 不是命盤索引檔")
+            (hlen,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(hlen).decode("utf-8"))
+            self.mtime = os.fstat(f.fileno()).st_mtime
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.base = len(MAGIC) + 4 + hlen
+        self.cache_terms = cache_terms
+        self.n_docs = self.header["n_docs"]
+        self.n_bytes = (self.n_docs + 7) // 8
+        self.universe = (1 << self.n_docs) - 1
+        self.term_index = self.header["terms"]
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._keys = None
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def __del__(self):
+        self.close()
+
+    def _slice(self, off: int, ln: int) -> bytes:
+        start = self.base + off
+        return self.mm[start:start + ln]
+
+    # ---- 點陣圖 ----
+    def term(self, term: str) -> int:
+        with self._lock:
+            bm = self._cache.get(term)
+            if bm is not None:
+                self._cache.move_to_end(term)
+                return bm
+        entries = self.term_index.get(term)
+        if not entries:
+            return 0
+        buf = bytearray(self.n_bytes)
+        for chunk_no, off, ln in entries:
+            bits = zlib.decompress(self._slice(off, ln))
+            lo = chunk_no * CHUNK_BYTES
+            buf[lo:lo + CHUNK_BYTES] = bits[:max(0, self.n_bytes - lo)]
+        bm = int.from_bytes(buf, "little")
+        with self._lock:
+            self._cache[term] = bm
+            while len(self._cache) > self.cache_terms:
+                self._cache.popitem(last=False)
+        return bm
+
+    def terms(self, prefix: str = "") -> list:
+        return [t for t in self.term_index if t.startswith(prefix)]
+
+    def _atom(self, tok: str) -> int:
+        if tok.upper() == "ALL":
+            return self.universe
+        tok = normalize_term(tok)
+        m = _RANGE.match(tok)
+        if m:
+            prefix, lo, hi = m.group(1), int(m.group(2)), int(m.group(3))
+            bm = 0
+            for t in self.terms(prefix):
+                v = t[len(prefix):]
+                if v.isdigit() and lo <= int(v) <= hi:
+                    bm |= self.term(t)
+            return bm
+        return self.term(tok)
+
+    def query(self, expr: str) -> int:
+        """布林查詢 → 點陣圖（Python int）。"""
+        toks = _TOKEN.findall(expr)
+        if not toks:
+            raise QueryError("查詢是空的")
+        if len(toks) > QUERY_MAX_TOKENS:
+            raise QueryError(f"查詢太長（{len(toks)} 個詞，上限 {QUERY_MAX_TOKENS}）")
+        pos = depth = 0
+
+        def peek():
+            return toks[pos].upper() if pos < len(toks) else None
+
+        def take():
+            nonlocal pos
+            pos += 1
+            return toks[pos - 1]
+
+        def nested(fn):
+            nonlocal depth
+            depth += 1
+            if depth > QUERY_MAX_DEPTH:
+                raise QueryError(f"括號 / NOT 巢狀太深（上限 {QUERY_MAX_DEPTH} 層）")
+            try:
+                return fn()
+            finally:
+                depth -= 1
+
+        def or_expr():
+            bm = and_expr()
+            while peek() == "OR":
+                take()
+                bm |= and_expr()
+            return bm
+
+        def and_expr():
+            bm = not_expr()
+            while peek() not in (None, "OR", ")"):
+                if peek() == "AND":
+                    take()
+                bm &= not_expr()
+            return bm
+
+        def not_expr():
+            if peek() == "NOT":
+                take()
+                return self.universe ^ nested(not_expr)
+            return atom()
+
+        def atom():
+            tok = peek()
+            if tok is None:
+                raise QueryError("查詢在運算子後中斷")
+            if tok in ("AND", "OR", ")"):
+                raise QueryError(f"這裡不能是「{toks[pos]}」")
+            take()
+            if tok == "(":
+                bm = nested(or_expr)
+                if peek() != ")":
+                    raise QueryError("括號沒有閉合")
+                take()
+                return bm
+            return self._atom(toks[pos - 1])
+
+        bm = or_expr()
+        if pos != len(toks):
+            raise QueryError(f"多餘的「{toks[pos]}」")
+        return bm
+
+    # ---- 結果 ----
+    @staticmethod
+    def count(bm: int) -> int:
+        return bm.bit_count()
+
+    def doc_ids(self, bm: int, limit: int = None):
+        """依文件編號遞增產生命中的命盤；跳過全零的位元組（C 速度）。"""
+        n = 0
+        for m in _NONZERO.finditer(bm.to_bytes(self.n_bytes, "little")):
+            byte, base = m.group()[0], m.start() * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
+                    n += 1
+                    if limit is not None and n >= limit:
+                        return
+
+    def key(self, doc: int) -> tuple:
+        keys = self._keys
+        if keys is None:
+            keys = self._keys = zlib.decompress(self._slice(*self.header["keys"]))
+        y, m, d, h, g = KEY_STRUCT.unpack_from(keys, doc * KEY_STRUCT.size)
+        return y, m, d, h, g.decode("ascii")
+
+    def keys_of(self, bm: int, limit: int = None) -> list:
+        return [self.key(i) for i in self.doc_ids(bm, limit)]
+
+class ChartIndex:
+    """
+    索引檔的持有者：current() 取目前的 IndexSnapshot；refresh() 察覺檔案重建後整個換新
+    （單一指派，進行中的查詢仍用舊的，用完即關閉舊 mmap）。
+    """
+
+    def __init__(self, path: str, cache_terms: int = TERM_CACHE):
+        self.path = path
+        self.cache_terms = cache_terms
+        self._reload_lock = threading.Lock()
+        self._snap = IndexSnapshot(path, cache_terms)
+
+    def current(self) -> IndexSnapshot:
+        return self._snap
+
+    @property
+    def header(self) -> dict:
+        return self._snap.header
+
+    def refresh(self) -> bool:
+        """索引檔重建過（mtime 變了）就重開；回傳是否重開。"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._snap.mtime:
+            return False
+        with self._reload_lock:
+            if os.stat(self.path).st_mtime != self._snap.mtime:
+                self._snap = IndexSnapshot(self.path, self.cache_terms)
+        return True
+
+def open_default_index():
+    """依環境變數 CHART_INDEX_PATH 開啟索引；未設定或檔案不存在回傳 None。"""
+    path = os.environ.get("CHART_INDEX_PATH")
+    return ChartIndex(path) if path and os.path.exists(path) else None
+
+# ======================= 命令列 =======================
+def _year_range(s: str) -> list:
+    if not s:
+        return []
+    lo, _, hi = s.partition("-")
+    return list(range(int(lo), int(hi or lo) + 1))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="命盤語料庫倒排索引")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="由命盤庫建索引")
+    b.add_argument("db")
+    b.add_argument("index")
+    b.add_argument("--cyears", default=f"{mp.CYEAR - 5}-{mp.CYEAR + 10}", help="財忌特徵的流年範圍，如 2020-2035")
+    q = sub.add_parser("query", help="布林查詢")
+    q.add_argument("index")
+    q.add_argument("expr")
+    q.add_argument("--limit", type=int, default=20)
+    t = sub.add_parser("terms", help="列出特徵")
+    t.add_argument("index")
+    t.add_argument("prefix", nargs="?", default="")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        import chart_store
+        mp.DEBUG = False
+        t0 = time.perf_counter()
+        n = build_from_store(chart_store.ChartStore(args.db), args.index, _year_range(args.cyears), 100000)
+        print(f"索引 {n} 張命盤 → {args.index}（{os.path.getsize(args.index)} bytes，{time.perf_counter() - t0:.1f} 秒）")
+    elif args.cmd == "query":
+        idx = ChartIndex(args.index).current()
+        t0 = time.perf_counter()
+        try:
+            bm = idx.query(args.expr)
+        except QueryError as e:
+            raise SystemExit(f"查詢錯誤：{e}")
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"命中 {idx.count(bm)} / {idx.n_docs} 張（{ms:.2f} ms）")
+        for key in idx.keys_of(bm, args.limit):
+            print("\t".join(str(x) for x in key))
+    else:
+        idx = ChartIndex(args.index).current()
+        for term in idx.terms(args.prefix):
+            print(term)
+
+if __name__ == "__main__":
+    sys.exit(main())
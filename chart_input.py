@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+出生資料驗證與正規化
+
+在連上游之前就擋掉不合法的輸入（2/30、25 時、年份 0…），
+並產生唯一的標準鍵 (year, month, day, hour, gender)，
+命盤庫、已解析命盤快取、去重等各層一律用這個鍵。
+"""
+import calendar
+import os
+
+YEAR_MIN = int(os.environ.get("BIRTH_YEAR_MIN", 1900))
+YEAR_MAX = int(os.environ.get("BIRTH_YEAR_MAX", 2100))
+CYEAR_MIN = int(os.environ.get("CYEAR_MIN", YEAR_MIN))
+CYEAR_MAX = int(os.environ.get("CYEAR_MAX", YEAR_MAX + 100))
+
+GENDER_ALIASES = {
+    "m": "m", "male": "m", "男": "m", "1": "m",
+    "f": "f", "female": "f", "女": "f", "0": "f",
+}
+FIELD_LABEL = {"year": "年", "month": "月", "day": "日", "hour": "時辰", "gender": "性別", "cyear": "流年", "lmonth": "農曆月份",
+               "from": "起始年", "to": "結束年", "target": "反查條件",
+               "da": "大限財忌落宮", "liu": "流年財忌落宮", "da_star": "大限忌星", "liu_star": "流年忌星",
+               "da_status": "大限財忌狀態", "liu_status": "流年財忌狀態",
+               "range": "出生日期區間",
+               "year2": "第二人年", "month2": "第二人月", "day2": "第二人日", "hour2": "第二人時辰", "gender2": "第二人性別"}
+
+class InputError(ValueError):
+    """輸入不合法；field 為出錯欄位，msg 為不含欄位名稱的說明。"""
+
+    def __init__(self, field: str, msg: str):
+        super().__init__(f"{FIELD_LABEL.get(field, field)}：{msg}")
+        self.field = field
+        self.msg = msg
+
+def _int_field(field: str, value, lo: int, hi: int) -> int:
+    s = str(value).strip()
+    if not (s.isascii() and s.isdecimal()):    # 只收 ASCII 非負整數，避免 "1e3"、"-0"、" 12abc"、"²"
+        raise InputError(field, f"必須是整數（收到 {value!r}）")
+    n = int(s)
+    if not lo <= n <= hi:
+        raise InputError(field, f"需介於 {lo}~{hi}（收到 {n}）")
+    return n
+
+def normalize_gender(value) -> str:
+    g = GENDER_ALIASES.get(str(value).strip().lower())
+    if g is None:
+        raise InputError("gender", f"只接受 m/f（男/女）（收到 {value!r}）")
+    return g
+
+def canonical_key(year, month, day, hour, gender) -> tuple:
+    """驗證並回傳標準鍵；不合法丟 InputError。"""
+    y = _int_field("year", year, YEAR_MIN, YEAR_MAX)
+    m = _int_field("month", month, 1, 12)
+    d = _int_field("day", day, 1, calendar.monthrange(y, m)[1])
+    h = _int_field("hour", hour, 0, 23)
+    return y, m, d, h, normalize_gender(gender)
+
+def hour(value) -> int:
+    """單獨的時辰欄位（預抓的 --hours 等）。"""
+    return _int_field("hour", value, 0, 23)
+
+def lunar_month(value) -> int:
+    """流月 / 流日查詢的農曆月份（1~12）。"""
+    return _int_field("lmonth", value, 1, 12)
+
+def cyear(value) -> int:
+    """只需要流年的入口（反查等）。"""
+    return _int_field("cyear", value, CYEAR_MIN, CYEAR_MAX)
+
+def year_range(year_from, year_to, max_span: int = 0) -> tuple:
+    """出生年範圍（含兩端）；max_span > 0 時限制最多幾年。"""
+    lo = _int_field("from", year_from, YEAR_MIN, YEAR_MAX)
+    hi = _int_field("to", year_to, lo, YEAR_MAX)
+    if max_span and hi - lo + 1 > max_span:
+        raise InputError("to", f"範圍最多 {max_span} 年（收到 {hi - lo + 1} 年）")
+    return lo, hi
+
+def key_string(key: tuple) -> str:
+    """標準鍵的字串形式，例如 1991-07-24T17:m（記錄、快取鍵用）。"""
+    y, m, d, h, g = key
+    return f"{y:04d}-{m:02d}-{d:02d}T{h:02d}:{g}"
+
+def validate_inputs(src, defaults: dict) -> dict:
+    """
+    從 request.form / request.args 讀出生資料與流年；缺的欄位用 defaults。
+    回傳已正規化的 dict（與表單欄位同名）。
+    """
+    get = lambda k: src.get(k, defaults[k])
+    y, m, d, h, g = canonical_key(get("year"), get("month"), get("day"), get("hour"), get("gender"))
+    cyear = _int_field("cyear", get("cyear"), CYEAR_MIN, CYEAR_MAX)
+    return {"year": y, "month": m, "day": d, "hour": h, "gender": g, "cyear": cyear}
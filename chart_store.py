@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+本地命盤庫：只增不改的 SQLite 表，原文壓縮成 blob，
+以 (year, month, day, hour, gender) 複合索引查詢（B-tree，O(log n)）。
+
+同一組出生資料可重複寫入，查詢一律取最新一筆。
+匯入 / 匯出格式與 run_corpus.py 相同（NDJSON：出生資料 + raw）。
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+import chart_input
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charts (
+    id         INTEGER PRIMARY KEY,
+    year       INTEGER NOT NULL,
+    month      INTEGER NOT NULL,
+    day        INTEGER NOT NULL,
+    hour       INTEGER NOT NULL,
+    gender     TEXT    NOT NULL,
+    fetched_at REAL    NOT NULL,
+    codec      TEXT    NOT NULL,
+    blob       BLOB    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS charts_birth ON charts (year, month, day, hour, gender, id);
+"""
+INSERT_SQL = "INSERT INTO charts (year, month, day, hour, gender, fetched_at, codec, blob) VALUES (?,?,?,?,?,?,?,?)"
+
+# ======================= 壓縮 =======================
+# 單盤原文僅 1~2KB，一般壓縮吃不到重複；以固定的預設字典（常見欄名、宮名、星名、
+# 大限小限格式）開頭，壓縮後約為純 zlib 的一半。字典一經使用就不可再改，
+# 要調整請新增版本（zlib-d2）並保留舊版解碼。
+ZDICT_V1 = (
+    "陽曆︰年 月 日時　陰男陽女\n農曆︰年月日子時丑時寅時卯時辰時巳時午時未時申時酉時戌時亥時\n"
+    "干支︰年月日時\n五行局: 水二局木三局金四局土五局火六局\n"
+    "生年四化:化權,化科,化祿,化忌\n命主:, 身主:\n"
+    "天福,截路,天馬,八座,天鉞,天才,天使,華蓋,天姚,地劫,天空,紅鸞,孤辰,空亡,寡宿,天殤,天官,三台,鳳閣,蜚廉,天刑,台輔,旬空,"
+    "地空,天魁,天喜,月馬,解神,天巫,陰煞,天虛,破碎,咸池,天壽,天哭,龍池,天月,封誥,恩光,天貴,天德,月德,年解,大耗,"
+    "長生,沐浴,冠帶,臨官,帝旺,衰,病,死,墓,絕,胎,養,博士,力士,青龍,小耗,將軍,奏書,飛廉,喜神,病符,大耗,伏兵,官府,"
+    "火星,鈴星,祿存,擎羊,陀羅,文昌,文曲,左輔,右弼,"
+    "紫微廟,天機旺,太陽陷,武曲平,天同利,廉貞地,天府廟,太陰旺,貪狼陷,巨門平,天相利,天梁地,七殺廟,破軍旺,"
+    "【命宮】【兄弟宮】【夫妻宮】【子女宮】【財帛宮】【疾厄宮】【遷移宮】【交友宮】【事業宮】【田宅宮】【福德宮】【父母宮】-身宮】\n"
+    "甲子乙丑丙寅丁卯戊辰己巳庚午辛未壬申癸酉甲戌乙亥\n大限:3-12\n小限:1 13 25 37 49 61 73\n"
+    "大限:13-22\n大限:23-32\n大限:33-42\n大限:43-52\n大限:53-62\n大限:63-72\n大限:73-82\n大限:83-92\n小限:"
+).encode("utf-8")
+
+def pack(text: str):
+    co = zlib.compressobj(9, zdict=ZDICT_V1)
+    return "zlib-d1", co.compress(text.encode("utf-8")) + co.flush()
+
+def unpack(codec: str, blob: bytes) -> str:
+    if codec == "zlib-d1":
+        do = zlib.decompressobj(zdict=ZDICT_V1)
+        raw = do.decompress(blob) + do.flush()
+    elif codec == "zlib":
+        raw = zlib.decompress(blob)
+    else:
+        raise RuntimeError(f"未知的命盤壓縮格式：{codec}")
+    return raw.decode("utf-8")
+
+# 鍵一律用 chart_input 的標準鍵（含日期驗證），與 app 各層快取一致
+normalize_gender = chart_input.normalize_gender
+birth_key = chart_input.canonical_key
+
+# ======================= 命盤庫 =======================
+class ChartStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 連線不可跨執行緒共用：每執行緒一條
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def reset_after_fork(self):
+        """gunicorn preload：master 建的連線不能帶進 worker，fork 後丟掉重開。"""
+        self._local = threading.local()
+
+    def get(self, year, month, day, hour, gender):
+        row = self._conn().execute(
+            "SELECT codec, blob FROM charts WHERE year=? AND month=? AND day=? AND hour=? AND gender=? "
+            "ORDER BY id DESC LIMIT 1",
+            birth_key(year, month, day, hour, gender),
+        ).fetchone()
+        return unpack(*row) if row else None
+
+    def put(self, year, month, day, hour, gender, raw_text: str, fetched_at=None):
+        codec, blob = pack(raw_text)
+        with self._conn() as c:
+            c.execute(
+                INSERT_SQL,
+                birth_key(year, month, day, hour, gender) + (fetched_at or time.time(), codec, blob),
+            )
+
+    def __contains__(self, key) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM charts WHERE year=? AND month=? AND day=? AND hour=? AND gender=? LIMIT 1",
+            birth_key(*key),
+        ).fetchone() is not None
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+
+    def iter_latest(self, years=None, gender=None):
+        """每組出生資料的最新一筆：產生 (key, raw_text, fetched_at)。years / gender 可限定範圍。"""
+        where, args = [], []
+        if years is not None:
+            years = sorted(set(years))
+            where.append(f"year IN ({','.join('?' * len(years))})")
+            args += years
+        if gender is not None:
+            where.append("gender=?")
+            args.append(gender)
+        cond = " WHERE " + " AND ".join(where) if where else ""
+        cur = self._conn().execute(
+            "SELECT year, month, day, hour, gender, fetched_at, codec, blob FROM charts "
+            f"WHERE id IN (SELECT MAX(id) FROM charts{cond} GROUP BY year, month, day, hour, gender) "
+            "ORDER BY year, month, day, hour, gender",
+            args,
+        )
+        for y, m, d, h, g, ts, codec, blob in cur:
+            yield (y, m, d, h, g), unpack(codec, blob), ts
+
+    # ---- 批次匯入 / 匯出 ----
+    def import_ndjson(self, path: str, batch: int = 1000) -> int:
+        n, rows = 0, []
+        with open(path, encoding="utf-8") as f, self._conn() as c:
+            for ln in f:
+                ln = ln.strip()
+                if not ln:
+                    continue
+                rec = json.loads(ln)
+                codec, blob = pack(rec["raw"])
+                key = birth_key(rec["year"], rec["month"], rec["day"], rec["hour"], rec.get("gender", "m"))
+                rows.append(key + (rec.get("fetched_at") or time.time(), codec, blob))
+                if len(rows) >= batch:
+                    c.executemany(INSERT_SQL, rows)
+                    n += len(rows)
+                    rows = []
+            if rows:
+                c.executemany(INSERT_SQL, rows)
+                n += len(rows)
+        return n
+
+    def export_ndjson(self, path: str) -> int:
+        n = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for (y, m, d, h, g), raw, ts in self.iter_latest():
+                rec = {"year": y, "month": m, "day": d, "hour": h, "gender": g, "fetched_at": ts, "raw": raw}
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                n += 1
+        return n
+
+def open_default_store():
+    """依環境變數 CHART_STORE_PATH 開啟命盤庫；未設定則回傳 None。"""
+    path = os.environ.get("CHART_STORE_PATH")
+    return ChartStore(path) if path else None
+
+# ======================= 命令列 =======================
+if __name__ == "__main__":
+    # 用法：python chart_store.py import|export|stats DB [NDJSON]
+    cmd, db = sys.argv[1], sys.argv[2]
+    store = ChartStore(db)
+    if cmd == "import":
+        print(f"匯入 {store.import_ndjson(sys.argv[3])} 筆")
+    elif cmd == "export":
+        print(f"匯出 {store.export_ndjson(sys.argv[3])} 筆")
+    elif cmd == "stats":
+        print(f"共 {store.count()} 筆，檔案 {os.path.getsize(db)} bytes")
+    else:
+        raise SystemExit(f"未知指令：{cmd}")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 設定：gunicorn -c gunicorn.conf.py app:app
+
+每一項都可用環境變數覆寫。worker / thread / worker_class 沒設定時，
+若有 loadtest.py --save 產生的量測檔（GUNICORN_PROFILE，預設 loadtest_profile.json），
+就採用它依實測 CPU / 等上游比例算出的建議值，否則 1 worker × 4 threads。
+
+preload_app：master 先載入 app（含 requests / bs4 / lxml），gc.freeze() 後再 fork，
+worker 以 copy-on-write 共用這些已匯入的模組與常數表。
+"""
+import gc
+import json
+import os
+
+def _load_profile() -> dict:
+    path = os.environ.get("GUNICORN_PROFILE", "loadtest_profile.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("recommended", {})
+    except (OSError, ValueError):
+        return {}
+
+_rec = _load_profile()
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY") or _rec.get("workers") or 1)
+threads = int(os.environ.get("GUNICORN_THREADS") or _rec.get("threads") or 4)
+os.environ["ADMISSION_THREADS"] = str(threads)     # app 的准入控制依實際執行緒數保留健康檢查名額
+os.environ.setdefault("PROBE_ENABLED", "1")        # 上游健康探測只在正式服務啟用（upstream_probe 預設關）
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS") or _rec.get("worker_class") or "gthread"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))            # 0 = 不定期重啟 worker
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+accesslog = os.environ.get("GUNICORN_ACCESSLOG") or None
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import app
+    app.preload_heavy_modules()
+    gc.freeze()           # 移到永久代：worker 的 GC 不再走訪並改寫這些物件標頭，減少 fork 後的頁面複製
+    server.log.info("preload：已載入解析套件並凍結 GC；workers=%s threads=%s class=%s%s",
+                    workers, threads, worker_class, "（依量測檔）" if _rec else "")
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    import app
+    if app.CHART_STORE is not None:
+        app.CHART_STORE.reset_after_fork()
+    app.PROBER.ensure_started()       # 探測執行緒不會跟著 fork 過來：每個 worker 開機就起一條
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 快取與壓縮
+
+- 強 ETag：由命盤指紋決定；壓縮後的表示法加上 -gz / -br 後綴（不同位元組 = 不同強 ETag）
+- 動態回應：依 Accept-Encoding 壓成 br（有裝 brotli）或 gzip
+- 靜態檔：優先送出建置時預先壓好的 .br / .gz（見 precompress_static.py）
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:          # 沒裝就只用 gzip
+    brotli = None
+
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml", "image/x-icon",
+                      "image/vnd.microsoft.icon")
+ENCODING_SUFFIX = {"br": "-br", "gzip": "-gz"}
+
+# 結果頁：同一張命盤 + 流年的輸出固定，可交給瀏覽器與 CDN 快取
+RESULT_CACHE_CONTROL = "public, max-age=86400, s-maxage=604800"
+FORM_CACHE_CONTROL = "public, max-age=3600"
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"     # 網址帶 ?v=<內容雜湊>
+NO_STORE = "no-store"
+
+# ======================= ETag =======================
+def etag_matches(etag: str) -> bool:
+    """If-None-Match 是否含此 ETag（任一壓縮表示法皆算）。"""
+    inm = request.if_none_match
+    return any(inm.contains(etag + sfx) for sfx in ("", *ENCODING_SUFFIX.values()))
+
+def file_digest(*paths) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    for p in paths:
+        with open(p, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+# ======================= 壓縮 =======================
+def choose_encoding(available=("br", "gzip")) -> str:
+    acc = request.accept_encodings
+    for enc in available:
+        if enc == "br" and brotli is None:
+            continue
+        if acc[enc]:
+            return enc
+    return ""
+
+def _compressible(resp) -> bool:
+    if resp.direct_passthrough or resp.status_code < 200 or resp.status_code in (204, 206, 304):
+        return False
+    if "Content-Encoding" in resp.headers:
+        return False
+    return (resp.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+
+def compress_response(resp):
+    """after_request：壓縮動態回應，強 ETag 加上編碼後綴。"""
+    if not _compressible(resp):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    body = resp.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return resp
+    enc = choose_encoding()
+    if not enc:
+        return resp
+    packed = brotli.compress(body, quality=5) if enc == "br" else gzip.compress(body, compresslevel=6, mtime=0)
+    resp.set_data(packed)
+    resp.headers["Content-Encoding"] = enc
+    etag, weak = resp.get_etag()
+    if etag:
+        resp.set_etag(etag + ENCODING_SUFFIX[enc], weak)
+    return resp
+
+# ======================= 靜態檔 =======================
+def static_version(static_dir: str) -> str:
+    """所有靜態檔內容的雜湊，給 url_for('static', ..., v=...) 破快取。"""
+    paths = sorted(
+        os.path.join(static_dir, f) for f in os.listdir(static_dir)
+        if not f.endswith((".gz", ".br")) and os.path.isfile(os.path.join(static_dir, f))
+    )
+    return file_digest(*paths)
+
+def serve_static(static_dir: str, filename: str):
+    """取代 Flask 預設 static 端點：有預壓檔就直接送，附長效快取。"""
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+        if os.path.isfile(os.path.join(static_dir, filename + ext)) and choose_encoding((enc,)):
+            resp = send_from_directory(static_dir, filename + ext, mimetype=mimetype, conditional=True)
+            resp.headers["Content-Encoding"] = enc
+            break
+    else:
+        resp = send_from_directory(static_dir, filename, mimetype=mimetype, conditional=True)
+    resp.vary.add("Accept-Encoding")
+    if request.args.get("v"):
+        resp.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+    return resp
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+壓測 + 部署建議：量每個請求花在「等上游」與「CPU（解析 + 報告 + 渲染）」各多少，
+再依比例建議 gunicorn 的 worker / thread 數。
+
+預設自己起一個 upstream_stub.py 與一個 gunicorn（gunicorn.conf.py，SERVER_TIMING=1），
+每個請求用不同的出生資料，確保命盤庫與已解析命盤快取都不命中（量的是完整路徑）。
+
+用法：
+  python loadtest.py --requests 300 --concurrency 16 --upstream-delay 0.4 --save loadtest_profile.json
+  python loadtest.py --url http://127.0.0.1:10000      # 打現有服務（需 SERVER_TIMING=1）
+  python loadtest.py --cores 1 ...                     # 依部署機器的核心數給建議
+
+建議算法（gthread，每個 worker 一個 GIL）：
+  CPU 佔比 f = cpu / (cpu + upstream)
+  每個 worker 的 threads ≈ ceil(1 / f)：CPU 剛好吃滿一個核心時，其餘執行緒都在等上游
+  workers = 核心數；理論吞吐上限 ≈ 核心數 × 1000 / cpu_ms（req/s）
+存檔後 gunicorn.conf.py 會在未設定 WEB_CONCURRENCY / GUNICORN_THREADS 時採用建議值。
+"""
+import argparse
+import datetime as dt
+import json
+import math
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAX_THREADS = 64
+_TIMING = re.compile(r"(\w+);dur=([\d.]+)")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_http(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"等不到 {url} 啟動")
+
+def birth_params(i: int) -> str:
+    """第 i 個請求的出生資料：每天 24 時辰 × 男女共 48 組，彼此不重複。"""
+    d = dt.date(1950, 1, 1) + dt.timedelta(days=i // 48)
+    return f"year={d.year}&month={d.month}&day={d.day}&hour={(i // 2) % 24}&gender={'mf'[i % 2]}&cyear=2026"
+
+# ======================= 壓測 =======================
+def one_request(base: str, i: int, path: str) -> dict:
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f"{base}{path}?{birth_params(i)}", timeout=120) as r:
+            r.read()
+            status, timing = r.status, r.headers.get("Server-Timing", "")
+    except urllib.error.HTTPError as e:
+        status, timing = e.code, e.headers.get("Server-Timing", "")
+    except OSError as e:
+        return {"status": 0, "error": str(e), "wall": (time.perf_counter() - t0) * 1000}
+    row = {"status": status, "wall": (time.perf_counter() - t0) * 1000}
+    row.update({k: float(v) for k, v in _TIMING.findall(timing)})
+    return row
+
+def run_load(base: str, n: int, concurrency: int, path: str, offset: int = 0) -> dict:
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        rows = list(ex.map(lambda i: one_request(base, offset + i, path), range(n)))
+    elapsed = time.perf_counter() - t0
+    ok = [r for r in rows if r["status"] == 200 and "cpu" in r]
+    if not ok:
+        raise SystemExit(f"沒有成功且帶 Server-Timing 的回應（服務需 SERVER_TIMING=1）：{rows[:3]}")
+
+    def pct(key, q):
+        vals = sorted(r[key] for r in ok)
+        return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+    cpu = statistics.mean(r["cpu"] for r in ok)
+    io = statistics.mean(r["upstream"] for r in ok)
+    total = statistics.mean(r["total"] for r in ok)
+    return {
+        "requests": n, "ok": len(ok), "errors": n - len(ok), "concurrency": concurrency,
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "wall_p50_ms": round(pct("wall", 0.5), 1), "wall_p95_ms": round(pct("wall", 0.95), 1),
+        "cpu_ms": round(cpu, 2), "upstream_ms": round(io, 2), "server_total_ms": round(total, 2),
+        # 伺服器內牆鐘扣掉 CPU 與等上游：多半是搶 GIL / 排隊
+        "other_ms": round(max(0.0, total - cpu - io), 2),
+    }
+
+def recommend(m: dict, cores: float) -> dict:
+    f = m["cpu_ms"] / max(1e-6, m["cpu_ms"] + m["upstream_ms"])
+    threads = max(1, min(MAX_THREADS, math.ceil(1 / max(f, 1e-6))))
+    workers = max(1, round(cores))
+    return {
+        "workers": workers, "threads": threads, "worker_class": "gthread",
+        "cpu_fraction": round(f, 4),
+        "max_rps_estimate": round(max(cores, 0.05) * 1000 / max(m["cpu_ms"], 1e-3), 1),
+    }
+
+# ======================= 自帶環境 =======================
+def start_stack(args):
+    stub_port, app_port = free_port(), free_port()
+    procs = [subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "upstream_stub.py"), "--port", str(stub_port),
+         "--delay", str(args.upstream_delay), "--jitter", str(args.upstream_jitter)],
+        cwd=HERE)]
+    env = dict(os.environ, PORT=str(app_port), HOST="127.0.0.1", SERVER_TIMING="1",
+               UPSTREAM_FORM_URL=f"http://127.0.0.1:{stub_port}/cgi-bin/fate",
+               WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads),
+               GUNICORN_PROFILE=os.devnull, UPSTREAM_MODE="off")
+    env.pop("CHART_STORE_PATH", None)          # 不讓命盤庫命中
+    procs.append(subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(HERE, "gunicorn.conf.py"), "app:app"],
+        cwd=HERE, env=env))
+    wait_http(f"http://127.0.0.1:{stub_port}/")
+    wait_http(f"http://127.0.0.1:{app_port}/")
+    return f"http://127.0.0.1:{app_port}", procs
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="壓測：量 CPU / 等上游比例並建議 gunicorn 設定")
+    ap.add_argument("--url", help="打現有服務（不自帶上游樁與 gunicorn）")
+    ap.add_argument("--path", default="/",
+                    help="壓測路徑（預設 / 報告頁；/api/* 屬 batch 類，准入控制會先限流，量到的多是排隊）")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--upstream-delay", type=float, default=0.3)
+    ap.add_argument("--upstream-jitter", type=float, default=0.05)
+    ap.add_argument("--workers", type=int, default=1, help="自帶 gunicorn 的 worker 數")
+    ap.add_argument("--threads", type=int, default=16, help="自帶 gunicorn 的 thread 數")
+    ap.add_argument("--cores", type=float, default=float(os.cpu_count() or 1), help="部署機器的核心數")
+    ap.add_argument("--save", help="量測與建議寫成 JSON（gunicorn.conf.py 會讀）")
+    args = ap.parse_args(argv)
+
+    procs = []
+    try:
+        if args.url:
+            base = args.url.rstrip("/")
+        else:
+            base, procs = start_stack(args)
+        if args.warmup:
+            run_load(base, args.warmup, min(args.warmup, args.concurrency), args.path, offset=10 ** 5)
+        m = run_load(base, args.requests, args.concurrency, args.path)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+    rec = recommend(m, args.cores)
+    print(f"請求 {m['ok']}/{m['requests']}（並發 {m['concurrency']}）  吞吐 {m['throughput_rps']} req/s  "
+          f"延遲 p50 {m['wall_p50_ms']} ms / p95 {m['wall_p95_ms']} ms")
+    print(f"每請求：等上游 {m['upstream_ms']} ms，CPU {m['cpu_ms']} ms，其他（GIL / 排隊）{m['other_ms']} ms  "
+          f"→ CPU 佔比 {rec['cpu_fraction']:.1%}")
+    print(f"建議（{args.cores:g} 核）：WEB_CONCURRENCY={rec['workers']} GUNICORN_THREADS={rec['threads']} "
+          f"GUNICORN_WORKER_CLASS={rec['worker_class']}  理論上限約 {rec['max_rps_estimate']} req/s")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"measured": m, "recommended": rec, "cores": args.cores,
+                       "upstream_delay": None if args.url else args.upstream_delay,
+                       "measured_at": int(time.time())}, f, ensure_ascii=False, indent=1)
+        print(f"已寫入 {args.save}")
+    return m, rec
+
+if __name__ == "__main__":
+    main()
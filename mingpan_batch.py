@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+命盤批次分析（欄式 / NumPy 向量化）
+
+把 parse_chart 的 dict 結果編碼成整數陣列（宮位、天干、地支、大限、星曜位置），
+再以 NumPy 一次算完整個語料庫的大限錨點、流年命行與財忌落宮，
+結果與 mingpan_logic.summarize_cai_ji_targets 逐盤計算一致。
+
+語料檔格式（NDJSON）：每行一個 JSON，至少含 "raw"（fetch_chart 的原文）。
+"""
+import json
+import sys
+
+import numpy as np
+
+import mingpan_logic as mp
+
+# ======================= 編碼表 =======================
+STAR_LIST = mp.MAIN_STARS + mp.AUX_STARS + mp.MINI_STARS
+STAR_ID = {s: i for i, s in enumerate(STAR_LIST)}
+STEM_ID = {s: i for i, s in enumerate(mp.STEMS)}
+BRANCH_ID = {b: i for i, b in enumerate(mp.ZODIAC)}
+N_PAL = len(mp.PALACE_ORDER)            # 12
+CAI = mp.PALACE_ORDER.index("財")
+FU = mp.PALACE_ORDER.index("福")
+
+# 天干 → 化忌星 id
+JI_STAR_OF_STEM = np.array([STAR_ID[mp.YEAR_HUA[s]["忌"]] for s in mp.STEMS], dtype=np.int16)
+
+NO_RANGE = 10**6        # 大限無法解析時的距離值（等同排除）
+
+# 狀態碼（note_da / note_liu）
+STATUS_NONE, STATUS_SELF, STATUS_EMPTY = 0, 1, 2
+STATUS_TEXT = {STATUS_NONE: "", STATUS_SELF: "自化忌", STATUS_EMPTY: "對宮空宮"}
+
+# ======================= 單盤編碼 =======================
+def encode_chart(raw_text: str, parsed=None):
+    """
+    回傳單盤的欄式資料（依 PALACE_ORDER 的宮位序，位置 p=0 為命宮）；
+    十二宮不全者回傳 None（交由逐盤路徑處理）。parsed 可傳入 parse_chart 的結果，免得重解析。
+    """
+    data, col_order, _ = parsed or mp.parse_chart(raw_text)
+    cols = mp.reorder_cols_by_palace(data, col_order)
+    if len(cols) != N_PAL or any(data[c]["abbr"] != mp.PALACE_ORDER[i] for i, c in enumerate(cols)):
+        return None
+
+    stem = np.empty(N_PAL, dtype=np.int8)
+    branch = np.empty(N_PAL, dtype=np.int8)
+    dx = np.full((N_PAL, 2), -1, dtype=np.int16)
+    has_main = np.zeros(N_PAL, dtype=bool)
+    star_pos = np.full(len(STAR_LIST), -1, dtype=np.int8)
+
+    for p, c in enumerate(cols):
+        b = data[c]
+        stem[p] = STEM_ID[c[0]]
+        branch[p] = BRANCH_ID[c[1]]
+        lo, _, hi = b["daxian"].partition("~")
+        if lo.isdigit() and hi.isdigit():
+            dx[p] = (int(lo), int(hi))
+        has_main[p] = bool(b["main"])
+        for s in b["main"] + b["aux"] + b["mini"]:
+            sid = STAR_ID.get(s)
+            # _locate_star_column 取宮位序第一個命中者
+            if sid is not None and star_pos[sid] < 0:
+                star_pos[sid] = p
+
+    return {
+        "stem": stem, "branch": branch, "dx": dx, "has_main": has_main,
+        "star_pos": star_pos, "byear": mp.parse_birth_year(raw_text),
+    }
+
+# ======================= 語料庫 =======================
+def encode_corpus(raw_texts):
+    """
+    把多張命盤編成欄式語料庫（dict of ndarray，第一維為命盤）。
+    無法編碼的盤記在 'skipped'（原始序號），其餘依序編號。
+    """
+    rows, index, skipped = [], [], []
+    for i, raw in enumerate(raw_texts):
+        enc = encode_chart(raw)
+        if enc is None:
+            skipped.append(i)
+            continue
+        rows.append(enc)
+        index.append(i)
+    return stack_rows(rows, index, skipped)
+
+def stack_rows(rows: list, index=(), skipped=()) -> dict:
+    """encode_chart 的結果串成欄式語料庫；index 為各列的原始序號。"""
+    n = len(rows)
+    corpus = {
+        "stem": np.empty((n, N_PAL), dtype=np.int8),
+        "branch": np.empty((n, N_PAL), dtype=np.int8),
+        "dx": np.empty((n, N_PAL, 2), dtype=np.int16),
+        "has_main": np.empty((n, N_PAL), dtype=bool),
+        "star_pos": np.empty((n, len(STAR_LIST)), dtype=np.int8),
+        "byear": np.empty(n, dtype=np.int32),
+        "index": np.asarray(index, dtype=np.int64),
+        "skipped": np.asarray(skipped, dtype=np.int64),
+    }
+    for k, enc in enumerate(rows):
+        for key in ("stem", "branch", "dx", "has_main", "star_pos", "byear"):
+            corpus[key][k] = enc[key]
+    return corpus
+
+def save_corpus(path: str, corpus: dict):
+    np.savez_compressed(path, **corpus)
+
+def load_corpus(path: str) -> dict:
+    with np.load(path) as z:
+        return {k: z[k] for k in z.files}
+
+def iter_ndjson_raw(path: str):
+    with open(path, encoding="utf-8") as f:
+        for ln in f:
+            ln = ln.strip()
+            if ln:
+                yield json.loads(ln)["raw"]
+
+# ======================= 向量化邏輯 =======================
+def daxian_anchor(corpus: dict, cyear: int) -> np.ndarray:
+    """
+    各盤大限命所在宮位序（對應 safe_find_anchor_by_age）；無出生年或無大限者為 -1。
+    命中區間距離為 0；未命中取最近者，同距取宮位序在前者（argmin 取第一個）。
+    """
+    age = (cyear - corpus["byear"])[:, None]
+    lo, hi = corpus["dx"][..., 0], corpus["dx"][..., 1]
+    gap = np.where(age < lo, lo - age, np.where(age > hi, age - hi, 0)).astype(np.int64)
+    gap[lo < 0] = NO_RANGE
+    anchor = gap.argmin(axis=1)
+    bad = (corpus["byear"] == 0) | (gap.min(axis=1) >= NO_RANGE)
+    return np.where(bad, -1, anchor)
+
+def liunian_anchor(corpus: dict, cyear: int) -> np.ndarray:
+    """各盤流年命（當年地支所在宮）之宮位序；找不到為 -1。"""
+    hit = corpus["branch"] == BRANCH_ID[mp.zodiac_of_year(cyear)]
+    return np.where(hit.any(axis=1), hit.argmax(axis=1), -1)
+
+def row_labels(anchor: np.ndarray) -> np.ndarray:
+    """(n, 12) 標籤矩陣：位置 p 的宮名為 PALACE_ORDER[(p - anchor) % 12]；無錨點為 -1。"""
+    lab = (np.arange(N_PAL)[None, :] - anchor[:, None]) % N_PAL
+    return np.where(anchor[:, None] < 0, -1, lab)
+
+def four_hua_locate(corpus: dict, stem: np.ndarray, typ: str = "忌") -> np.ndarray:
+    """以天干陣列取某一化的星，回傳其所在宮位序；天干無效(-1)或星不在盤中為 -1。"""
+    table = np.array([STAR_ID[mp.YEAR_HUA[s][typ]] for s in mp.STEMS], dtype=np.int16)
+    sid = table[np.clip(stem, 0, None)]
+    pos = corpus["star_pos"][np.arange(len(stem)), sid]
+    return np.where(stem < 0, -1, pos)
+
+def cai_ji_scope(corpus: dict, anchor: np.ndarray):
+    """
+    給定某一層（大限/流年）的命宮錨點，回傳 (star_id, palace_idx, status)：
+    - star_id：該層財宮天干之忌星（無錨點為 -1）
+    - palace_idx：忌星所在宮在該層的宮名序（PALACE_ORDER 索引；未定位為 -1）
+    - status：落財宮時福宮有主星=自化忌、無=對宮空宮
+    """
+    n = len(anchor)
+    rows = np.arange(n)
+    ok = anchor >= 0
+    a = np.where(ok, anchor, 0)
+
+    stem = np.where(ok, corpus["stem"][rows, (a + CAI) % N_PAL], -1)
+    star = np.where(ok, JI_STAR_OF_STEM[np.clip(stem, 0, None)], -1)
+    pos = four_hua_locate(corpus, stem)
+    palace = np.where(pos >= 0, (pos - a) % N_PAL, -1)
+
+    fu_main = corpus["has_main"][rows, (a + FU) % N_PAL]
+    status = np.where(palace == CAI, np.where(fu_main, STATUS_SELF, STATUS_EMPTY), STATUS_NONE)
+    return star, palace, status
+
+def cai_ji_batch(corpus: dict, cyear: int) -> dict:
+    """整個語料庫在 cyear 的大財忌 / 流財忌（結果同 summarize_cai_ji_targets）。"""
+    da_star, da_pal, da_st = cai_ji_scope(corpus, daxian_anchor(corpus, cyear))
+    liu_star, liu_pal, liu_st = cai_ji_scope(corpus, liunian_anchor(corpus, cyear))
+    return {
+        "da_star": da_star, "da_palace": da_pal, "da_status": da_st,
+        "liu_star": liu_star, "liu_palace": liu_pal, "liu_status": liu_st,
+    }
+
+# ======================= 統計 =======================
+def palace_histogram(palace_idx: np.ndarray) -> dict:
+    """宮名 → 次數；未定位者記在 ''。"""
+    counts = np.bincount(palace_idx + 1, minlength=N_PAL + 1)
+    out = {"": int(counts[0])}
+    out.update({mp.PALACE_ORDER[i]: int(counts[i + 1]) for i in range(N_PAL)})
+    return out
+
+def cai_ji_palace_stats(corpus: dict, cyears) -> dict:
+    """各 cyear 的財忌落宮分佈：{cyear: {'大限': {...}, '流年': {...}}}。"""
+    out = {}
+    for y in cyears:
+        res = cai_ji_batch(corpus, y)
+        out[y] = {"大限": palace_histogram(res["da_palace"]), "流年": palace_histogram(res["liu_palace"])}
+    return out
+
+# ======================= 命令列 =======================
+if __name__ == "__main__":
+    # 用法：python mingpan_batch.py corpus.ndjson|corpus.npz 2025 [2026 ...]
+    mp.DEBUG = False
+    src, years = sys.argv[1], [int(y) for y in sys.argv[2:]] or [mp.CYEAR]
+    if src.endswith(".npz"):
+        corpus = load_corpus(src)
+    else:
+        corpus = encode_corpus(iter_ndjson_raw(src))
+        save_corpus(src.rsplit(".", 1)[0] + ".npz", corpus)
+    print(f"命盤數：{len(corpus['byear'])}（略過 {len(corpus['skipped'])}）")
+    for y, st in cai_ji_palace_stats(corpus, years).items():
+        print(json.dumps({"cyear": y, **st}, ensure_ascii=False))
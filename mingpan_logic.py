@@ -1,5 +1,16 @@
 # -*- coding: utf-8 -*-
+import contextlib
+import datetime
 import re
+import threading
+
+import parse_guard
+from star_catalog import STAR_LOOKUP, scan_star_line
+
+try:
+    from lunardate import LunarDate          # 選用：流日依農曆月的實際天數（29 / 30）
+except ImportError:
+    LunarDate = None
 
 # ======================= 全域設定 =======================
 DEBUG = True            # 建議先開著，方便檢查
@@ -31,21 +42,48 @@ YEAR_HUA = {
     "癸": {"祿":"破軍","權":"巨門","科":"太陰","忌":"貪狼"},
 }
 
+# ======================= DEBUG 輸出 =======================
+_debug_local = threading.local()
+
+@contextlib.contextmanager
+def capture_debug():
+    """
+    本執行緒的 DEBUG 訊息改收進回傳的 list（不論 DEBUG 開關），不動 sys.stdout；
+    多執行緒同時算報告時各收各的，不會互相吃掉或混進別人的輸出。
+    """
+    prev = getattr(_debug_local, "sink", None)
+    sink = _debug_local.sink = []
+    try:
+        yield sink
+    finally:
+        _debug_local.sink = prev
+
+def debug(msg: str):
+    sink = getattr(_debug_local, "sink", None)
+    if sink is not None:
+        sink.append(msg)
+    elif DEBUG:
+        print(msg)
+
 # ======================= 工具 =======================
 def normalize_token(t: str) -> str:
     """去同義、尾綴（廟旺陷平祿權科忌利），不砍『星』字。"""
     t = t.strip()
     t = ALIASES.get(t, t)
-    t = re.sub(r"(旺|陷|廟|地|平|權|科|祿|忌|利)+$", "", t)
-    return t
+    return t.rstrip("旺陷廟地平權科祿忌利")
+
+_WHITELIST_NAMES = {STAR_LOOKUP.get(n, n) for n in MAIN_STARS + AUX_STARS + MINI_STARS}   # 星曜目錄中的標準名（陀螺→陀羅）
 
-def pick_whitelist(star_line: str):
-    """只抽取白名單（主/輔/小），去重保序。"""
-    raw = re.split(r"[,\，\s、]+", star_line.strip())
-    raw = [x for x in raw if x]
+def pick_whitelist(stars: list):
+    """
+    只抽取白名單（主/輔/小），去重保序。stars 為 scan_star_line 的結果：只看各星所在整格（token），
+    去尾綴後須與白名單完全相同（「紫微天府」「天機星」「火星得」都不算）。
+    """
     found_main, found_aux, found_mini = [], [], []
-    for tok in raw:
-        norm = normalize_token(tok)
+    for st in stars:
+        if st["name"] not in _WHITELIST_NAMES or not st["token"]:
+            continue
+        norm = normalize_token(st["token"])
         if norm in MAIN_STARS and norm not in found_main:
             found_main.append(norm)
         elif norm in AUX_STARS and norm not in found_aux:
@@ -64,33 +102,61 @@ def palace_to_abbr(palace_name: str) -> str:
     return ""
 
 def parse_year_stem(raw_text: str) -> str:
-    m = re.search(r"干支[:：︰]\s*([甲乙丙丁戊己庚辛壬癸])[子丑寅卯辰巳午未申酉戌亥]年", raw_text)
+    m = re.search(r"干支[:：︰]\s*+([甲乙丙丁戊己庚辛壬癸])[子丑寅卯辰巳午未申酉戌亥]年", raw_text)
     return m.group(1) if m else ""
 
 def parse_birth_year(raw_text: str) -> int:
-    m = re.search(r"陽曆[:：︰]?\s*(\d{4})年", raw_text)
+    m = re.search(r"陽曆[:：︰]?+\s*+(\d{4})年", raw_text)
     return int(m.group(1)) if m else 0
 
+def parse_lunar_birth(raw_text: str) -> dict:
+    """農曆生月 / 生日 / 生時地支（流月斗君用）；找不到回空 dict。"""
+    m = re.search(r"農曆[:：︰]?+\s*+\d{4}年\s*+(閏)?+\s*+(\d{1,2})月\s*+(\d{1,2})日\s*+([子丑寅卯辰巳午未申酉戌亥])時", raw_text)
+    if not m:
+        return {}
+    return {"leap": bool(m.group(1)), "month": int(m.group(2)), "day": int(m.group(3)), "hour_branch": m.group(4)}
+
 # ======================= 解析 RAW → 結構 =======================
+# 正規式一律用佔有量詞（*+ ++ ?+，Python 3.11+）或有界長度，不回溯；宮名不跨行、不含【】
+_BLOCK_HEAD = re.compile(r"([甲乙丙丁戊己庚辛壬癸][子丑寅卯辰巳午未申酉戌亥])【([^】【\n]{1,32})】")
+_BLOCK_DX = re.compile(r"\s*+大限:([0-9]++)-([0-9]++)\s*+小限:")
+
+def iter_palace_blocks(raw_text: str):
+    """
+    依序找出「干支【宮】/ 大限:a-b / 小限:… / 星曜行」區塊 → (干支, 宮名, 大限起, 大限迄, 星曜行)。
+    手寫掃描：每次比對都從上一個位置往後，換行位置只找一次，任何輸入都是線性時間。
+    """
+    pos, nl, n = 0, -1, len(raw_text)
+    while True:
+        h = _BLOCK_HEAD.search(raw_text, pos)
+        if h is None:
+            return
+        parse_guard.check_budget()
+        pos = h.end()                      # 宮名不含【，下一個表頭不可能從這段中間開始
+        d = _BLOCK_DX.match(raw_text, pos)
+        if d is None:
+            continue
+        if nl < d.end():
+            nl = raw_text.find("\n", d.end())
+        if nl < 0:                         # 小限行後面沒有換行：之後不可能再有完整區塊
+            return
+        eol = raw_text.find("\n", nl + 1)
+        eol = n if eol < 0 else eol
+        if eol == nl + 1:                  # 星曜行是空的
+            continue
+        yield h.group(1), h.group(2), d.group(1), d.group(2), raw_text[nl + 1:eol]
+        pos = eol
+
 def parse_chart(raw_text: str):
     """
     回傳 data, col_order, year_stem
-    data[col] = {'palace','main'[], 'aux'[], 'mini'[], 'daxian','abbr'}
+    data[col] = {'palace','main'[], 'aux'[], 'mini'[], 'daxian','abbr','stars'[]}
     """
-    block_pat = re.compile(
-        r"([甲乙丙丁戊己庚辛壬癸][子丑寅卯辰巳午未申酉戌亥])【([^】]+)】\s*"
-        r"大限:([0-9]+)-([0-9]+)\s*"
-        r"小限:[^\n]*\n"
-        r"([^\n]+)"
-    )
+    parse_guard.check_size("命盤原文", len(raw_text), parse_guard.MAX_RAW_CHARS)
     data, col_order = {}, []
-    for m in re.finditer(block_pat, raw_text):
-        col = m.group(1)
-        palace = m.group(2)
-        dx_a, dx_b = m.group(3), m.group(4)
-        star_line = m.group(5)
-
-        main, aux, mini = pick_whitelist(star_line)
+    for col, palace, dx_a, dx_b, star_line in iter_palace_blocks(raw_text):
+        stars = scan_star_line(star_line)
+        main, aux, mini = pick_whitelist(stars)
         abbr = palace_to_abbr(palace)
 
         data[col] = {
@@ -100,6 +166,7 @@ def parse_chart(raw_text: str):
             "mini": [ALIASES.get(x, x) for x in mini],
             "daxian": f"{dx_a}~{dx_b}",
             "abbr": abbr,
+            "stars": stars,            # 全部星曜（含亮度 / 四化 / 類別），見 star_catalog
         }
         if col not in col_order:
             col_order.append(col)
@@ -125,35 +192,39 @@ def reorder_cols_by_palace(data: dict, col_order: list) -> list:
     tail = [c for c in col_order if c not in used]
     return ordered + tail
 
-def find_daxian_anchor_col(data: dict, cols: list, age: int) -> str:
+def daxian_ranges(data: dict, cols: list) -> list:
+    """[(col, 起, 迄)]，依 cols 順序；無法解析者略過。"""
+    out = []
     for c in cols:
-        rng = data.get(c, {}).get("daxian", "")
-        m = re.match(r"^\s*(\d+)\s*~\s*(\d+)\s*$", rng)
-        if not m:
-            continue
-        a, b = int(m.group(1)), int(m.group(2))
+        m = re.match(r"^\s*(\d+)\s*~\s*(\d+)\s*$", data.get(c, {}).get("daxian", ""))
+        if m:
+            out.append((c, int(m.group(1)), int(m.group(2))))
+    return out
+
+def find_daxian_anchor_col(data: dict, cols: list, age: int) -> str:
+    for c, a, b in daxian_ranges(data, cols):
         if a <= age <= b:
             return c
     return ""
 
-def safe_find_anchor_by_age(data: dict, cols: list, age: int) -> str:
-    found = find_daxian_anchor_col(data, cols, age)
-    if found:
-        if DEBUG:
-            print(f"DEBUG[DAXIAN] 歲數 {age} 命中：{found}（區間 {data[found]['daxian']}）")
-        return found
+def anchor_from_ranges(ranges: list, data: dict, age: int) -> str:
+    """safe_find_anchor_by_age 的本體（區間已預先解析）：命中取第一個，否則取最近。"""
+    for c, a, b in ranges:
+        if a <= age <= b:
+            debug(f"DEBUG[DAXIAN] 歲數 {age} 命中：{c}（區間 {data[c]['daxian']}）")
+            return c
     best_col, best_gap = "", 10**9
-    for c in cols:
-        m = re.match(r"^\s*(\d+)\s*~\s*(\d+)\s*$", data.get(c,{}).get("daxian",""))
-        if not m: continue
-        a,b = int(m.group(1)), int(m.group(2))
+    for c, a, b in ranges:
         gap = min(abs(age-a), abs(age-b)) if (age < a or age > b) else 0
         if gap < best_gap:
             best_gap, best_col = gap, c
-    if DEBUG and best_col:
-        print(f"DEBUG[DAXIAN] 歲數 {age} 未命中任何區間，改用最近：{best_col}（區間 {data[best_col]['daxian']}，距離={best_gap}）")
+    if best_col:
+        debug(f"DEBUG[DAXIAN] 歲數 {age} 未命中任何區間，改用最近：{best_col}（區間 {data[best_col]['daxian']}，距離={best_gap}）")
     return best_col
 
+def safe_find_anchor_by_age(data: dict, cols: list, age: int) -> str:
+    return anchor_from_ranges(daxian_ranges(data, cols), data, age)
+
 def build_daxian_ming_row(cols: list, data: dict, anchor_col: str) -> list:
     """anchor_col 標『命』，右側依序標『兄→夫→子→財→疾→遷→僕→官→田→福→父』循環。"""
     if not anchor_col or anchor_col not in cols:
@@ -181,7 +252,10 @@ def get_col_with_branch(cols: list, branch: str) -> str:
 
 def build_liunian_row(cols: list, year: int) -> list:
     """以當年地支所在欄為命，右側依 PALACE_ORDER 循環。"""
-    dz = zodiac_of_year(year)
+    return build_branch_row(cols, zodiac_of_year(year))
+
+def build_branch_row(cols: list, dz: str) -> list:
+    """以地支 dz 所在欄為命（流年 / 流月 / 流日共用），右側依 PALACE_ORDER 循環。"""
     anchor_col = get_col_with_branch(cols, dz)
     if not anchor_col:
         return [""] * len(cols)
@@ -197,7 +271,7 @@ def debug_four_hua_locate(tag: str, stem: str, cols: list, data: dict) -> dict:
     """回傳 cells[col] = ['星祿','星權','星科','星忌', ...]；stem 無效回空。"""
     cells = {c: [] for c in cols}
     if not stem or stem not in YEAR_HUA:
-        if DEBUG: print(f"DEBUG[HUA] {tag}：無有效天干（{stem}）")
+        debug(f"DEBUG[HUA] {tag}：無有效天干（{stem}）")
         return cells
     det = []
     for typ in ["祿","權","科","忌"]:
@@ -209,7 +283,7 @@ def debug_four_hua_locate(tag: str, stem: str, cols: list, data: dict) -> dict:
             det.append(f"{typ}:{star}->" + ",".join(located))
             for c in located:
                 cells[c].append(f"{star}{typ}")
-    if DEBUG: print(f"DEBUG[HUA] {tag}（{stem}）｜" + "； ".join(det))
+    debug(f"DEBUG[HUA] {tag}（{stem}）｜" + "； ".join(det))
     return cells
 
 # ======================= 破財雷達：結論與模板 =======================
@@ -223,50 +297,62 @@ def _locate_star_column(cols, data, star):
 def _has_main_star(data, col):
     return bool(data.get(col, {}).get("main", []))
 
-def summarize_cai_ji_targets(data, col_order, raw_text):
+def _cai_ji_scope(cols, data, row):
+    """單一層（大限/流年）：該層財宮天干之忌星 → 落欄 → 該層宮位；落財再看福宮。"""
+    col_cai = _col_for_label(cols, row, "財")
+    stem = col_cai[0] if col_cai else ""
+    star = YEAR_HUA.get(stem, {}).get("忌", "")
+    col_star = _locate_star_column(cols, data, star)
+    palace = row[cols.index(col_star)] if col_star else ""
+    note = ""
+    if palace == "財":
+        col_fu = _col_for_label(cols, row, "福")
+        note = "自化忌" if _has_main_star(data, col_fu) else "對宮空宮"
+    return {"stem": stem, "star": star, "col": col_star, "palace": palace, "note": note}
+
+def compute_cai_ji(data, col_order, raw_text, cyear=None):
     """
-    依『大限財』與『流年財』欄位的天干 → 取該干的『忌』星
-    → 找該星落在哪一欄 → 對映到大限命/流年命的宮位
-    若落『財』判斷：福宮有無主星（有=自化忌；無=對宮空宮）
+    結構化的財忌結果（summarize_cai_ji_targets / JSON API 共用）：
+    {'cyear','cols','age','anchor','daxian_row','liu_row','daxian':{...},'liunian':{...}}
     """
+    cyear = CYEAR if cyear is None else cyear
     cols = reorder_cols_by_palace(data, col_order)
 
     # --- 大限命行 ---
     byear = parse_birth_year(raw_text)
-    age = CYEAR - byear if byear else None
+    age = cyear - byear if byear else None
     anchor = safe_find_anchor_by_age(data, cols, age) if age is not None else ""
     daxian_row = build_daxian_ming_row(cols, data, anchor)
 
-    # 大財四化
-    col_da_cai = _col_for_label(cols, daxian_row, "財")
-    stem_da_cai = col_da_cai[0] if col_da_cai else ""
-    star_ji_da = YEAR_HUA.get(stem_da_cai, {}).get("忌", "")
-    col_star_da = _locate_star_column(cols, data, star_ji_da)
-    palace_da = daxian_row[cols.index(col_star_da)] if col_star_da else ""
-    note_da = ""
-    if palace_da == "財":
-        col_fu = _col_for_label(cols, daxian_row, "福")
-        note_da = "自化忌" if _has_main_star(data, col_fu) else "對宮空宮"
-
     # --- 流年命行 ---
-    liu_row = build_liunian_row(cols, CYEAR)
-    col_liu_cai = _col_for_label(cols, liu_row, "財")
-    stem_liu_cai = col_liu_cai[0] if col_liu_cai else ""
-    star_ji_liu = YEAR_HUA.get(stem_liu_cai, {}).get("忌", "")
-    col_star_liu = _locate_star_column(cols, data, star_ji_liu)
-    palace_liu = liu_row[cols.index(col_star_liu)] if col_star_liu else ""
-    note_liu = ""
-    if palace_liu == "財":
-        col_fu2 = _col_for_label(cols, liu_row, "福")
-        note_liu = "自化忌" if _has_main_star(data, col_fu2) else "對宮空宮"
-
-    # 組字串（用全名宮）
+    liu_row = build_liunian_row(cols, cyear)
+
+    return {
+        "cyear": cyear, "cols": cols, "age": age, "anchor": anchor,
+        "daxian_row": daxian_row, "liu_row": liu_row,
+        "daxian": _cai_ji_scope(cols, data, daxian_row),
+        "liunian": _cai_ji_scope(cols, data, liu_row),
+    }
+
+def cai_ji_lines(res: dict):
+    """compute_cai_ji 結果 → 兩行結論（用全名宮）。"""
     def _full(pkey): return PALACE_FULL.get(pkey, pkey+"宮")
-    line1 = f"大財四化： {star_ji_da}化忌 入 大限{_full(palace_da)}"
-    if note_da: line1 += f" {note_da}"
-    line2 = f"流財四化： {star_ji_liu}化忌 入 流年{_full(palace_liu)}"
-    if note_liu: line2 += f" {note_liu}"
-    return line1, line2, daxian_row, liu_row
+    da, liu = res["daxian"], res["liunian"]
+    line1 = f"大財四化： {da['star']}化忌 入 大限{_full(da['palace'])}"
+    if da["note"]: line1 += f" {da['note']}"
+    line2 = f"流財四化： {liu['star']}化忌 入 流年{_full(liu['palace'])}"
+    if liu["note"]: line2 += f" {liu['note']}"
+    return line1, line2
+
+def summarize_cai_ji_targets(data, col_order, raw_text, cyear=None):
+    """
+    依『大限財』與『流年財』欄位的天干 → 取該干的『忌』星
+    → 找該星落在哪一欄 → 對映到大限命/流年命的宮位
+    若落『財』判斷：福宮有無主星（有=自化忌；無=對宮空宮）
+    """
+    res = compute_cai_ji(data, col_order, raw_text, cyear)
+    line1, line2 = cai_ji_lines(res)
+    return line1, line2, res["daxian_row"], res["liu_row"]
 
 def _col_for_label(cols, row_labels, target_label):
     for i, lab in enumerate(row_labels):
@@ -275,400 +361,8 @@ def _col_for_label(cols, row_labels, target_label):
     return ""
 
 # ===== 模板（補齊『對宮空宮』條列，風格對齊你的附圖） =====
-CAIJI_TEMPLATE = {
-    "夫": {  # 夫妻宮
-        "說明": "\n".join([
-            "•  夫妻宮為「財帛宮之福德」，掌管財氣的感受層與使用體驗。",
-            "當財忌臨於此宮，代表：",
-            "•  金錢與情感、快樂、享受產生糾纏；花錢難得滿足，甚至被人情與情緒綁架。",
-            "•  這是「財的感受系統出現失衡」的象徵，命主往往不是沒有錢，而是錢帶來的快樂不再純粹。",
-        ]),
-        "大運意義": "\n".join([
-            "財忌入夫妻之大運，主「情感用事、享樂成耗」。",
-            "常見現象包括："
-            "• 因情感因素花錢（討好、彌補、維繫關係），導致財務受損；",
-            "• 對物質與享受的慾望上升，但內在滿足下降；",
-            "• 花錢的動機常來自孤單、焦慮或比較，而非真正的需要。",
-            "   ",
-            "深層含義在於：命要你學習“情緒與金錢分離”。",
-            "金錢若成為情感的代替品，福德就會轉為耗德。",
-            "   ",
-            "👉 命理建議：此大運宜培養「自我價值感的穩定」，讓金錢使用回歸理性節奏。",
-            "讓金錢的使用回歸理性與節奏，",
-            "避免以“付出換關係”、“消費換快樂”的方式消耗財氣。",
-            "愛可以流動，但財需有界。"
-        ]),
-        "流年意義": "\n".join([
-            "流年財忌入夫妻，多主「人情破財、感情消耗」。",
-            "• 容易被情感勒索、道德綁架、或情緒性花費捲入；",
-            "• 可能為伴侶、家人、或親密朋友需要而被迫支出；",
-            "• 或單純因情緒起伏、壓力過高而透過消費尋求慰藉。",
-            "   ",
-            "此象是財氣的短期紊亂——情感主導金錢，理智退出舞台。",
-            "   ",
-            "👉 命理建議：練習分辨「我現在花的，是錢，還是情緒？」",
-            "當你能分辨並安撫內在的感受，破財便能止於覺察之前。"
-        ]),
-    },
-    "命": {  # 命宮
-        "說明": "\n".join([
-            "• 命宮為一切能量的核心，是「我」的主體意識所在。",
-            "當財忌入命時，代表財氣的課題直接進入人格核心，",
-            "金錢不再只是外在事件，而成為「自我價值、人生方向、與存在焦慮」的投射場。",
-            "   ",
-            "同時從十二宮相生結構看，命宮為「財帛宮之官祿」——",
-            "也就是「財的事業」。",
-            "換言之，這是一個關於如何以金錢構築自我定位與行動主軸的命運考題。",
-        ]),
-        "大運意義": "\n".join([
-            "當大運財忌入命，意味著長期能量焦點被「生存壓力」所牽制。",
-            "財帛氣場化忌臨身，常見現象為：",
-            "• 財務規劃失衡，支出結構凌駕收入；",
-            "• 無論努力多少，總覺得錢難留、人事牽絆多；",
-            "• 易為現實所迫而失去長期方向，整體運勢呈「應付現實」的姿態。",
-            " ",
-            "👉 命理建議：此時宜收斂外務、減少非必要開銷，",
-            "將重點回歸內在穩定與價值重構。",
-        ]),
-        "流年意義": "\n".join([
-            "流年財忌入命，多主「短期財務緊縮與心理焦慮並行」。",
-            "• 經常性支出增加，壓迫到生活基本面；",
-            "• 錢花得快、來得慢，行動上被動受限；",
-            "• 內在出現「越努力越緊」的能量拉扯。",
-            " ",
-            "此年是財氣壓力直接作用於心身的時期。",
-            "若未能及時調整思維，容易陷入「為錢而活」的循環，",
-           "失去方向感與內在動力。",
-        ]),
-    },
-    "兄": {  # 兄弟宮
-        "說明": "\n".join([
-            "• 兄弟宮為「財帛宮之田宅」，象徵財氣的基礎與庫存能量，也就是命主的「財庫」與「資源穩定度」。",
-            "此宮反映一個人對金錢安全感、財務累積方式，以及資產守護的能力。",
-            "    ",
-            "•  當財忌臨於兄弟宮時，代表：",
-            "財庫受壓、資源難聚，既存的財務基礎容易鬆動、消耗、或被外力動用。",
-            "   ",
-            "•  這是一種「財根不穩」的象徵，金錢不是不來，而是來得有壓力、留得不安穩。",
-        ]),
-        "大運意義": "\n".join([
-            "財忌入兄弟之大運，主「財庫持續減損、積蓄難守」。",
-            "常見現象包括："
-            "• 長期支出超過儲蓄，存款逐年下滑；",
-            "• 資產被牽動或挪用（家人、合作、投資分攤等）；",
-            "• 對錢缺乏歸屬感，越想守越留不住。",
-            "   ",
-            "此運的深層課題在於——財庫與心庫同頻。",
-            "當內心缺乏安全感或信任感，潛意識會透過外在事件「洩財」來平衡焦慮。",
-            "   ",
-            "👉 命理建議：此大運不僅要理財，更要「理心」。",
-            "建立穩定的收支習慣、簡化財務結構、減少複雜合作。",
-            "若能練習「讓錢有家、讓心有根」，財氣自然回穩。",
-        ]),
-        "流年意義": "\n".join([
-            "流年財忌入兄弟，多主「短期財庫破口」「無形耗財」。",
-            "• 常見突發支出（家人借用、投資回收不及、資產變現困難）；",
-            "• 或財務調度緊繃、現金流周轉壓力大；",
-            "• 也可能因信任錯誤（朋友、手足）導致錢外流。",
-            "   ",
-            "👉 命理建議：此年宜檢查財務安全結構，避免共帳、合資、或借貸行為。",
-            "重新劃分財務邊界，將資金集中管理、設定留存比例。",
-            "心能安於當下，財才會安於你手。"
-        ]),
-    },
-    "子": {  # 子女宮
-        "說明": "\n".join([
-            "• 子女宮為「財帛宮之父母」，主掌生財之源與財氣的制度上游。",
-            "當財忌臨此，象徵「財的生源出現堵塞」，",
-            "即——金錢的上游動力受限，無論是事業架構、上級主管、或制度合約，",
-            "皆可能成為「破財觸發點」。",
-        ]),
-        "大運意義": "\n".join([
-            "財忌入子女宮之大運，多主「上層權責與規章壓力」形成長期能量消耗。",
-            "常見現象：""",
-            "• 合約、制度、主管指令使事業穩定性下降；",
-            "• 被上級、公司政策或合作條件綁住資金流；",
-            "• 投入多而回報遲緩，或成果被上層攫取。",
-            " ",
-            "👉 命理建議：此運宜審慎處理合約文件、職場條件與權責界線；",
-            "看似微小條款，往往是財氣流失的根。",
-        ]),
-        "流年意義": "\n".join([
-            "流年財忌入子女宮，為「上級導致財務受損」之象。",
-            "• 易因公司錯誤決策、主管指令、制度改動而連帶破財；",
-            "• 或上游資源斷流、款項延遲、報酬削減等現象頻生；""",
-            "• 若命盤原局財氣偏弱，則此年更易陷入「為他人承擔成本」。",
-            " ",
-            "👉 命理建議：當年宜謹慎與上層互動，凡涉及簽署、保證、合約、授權之事，",
-            "須保留紀錄、清楚界線。""",
-        ]),
-    },
-    "財": {  # 財帛宮（一般）
-        "說明": "\n".join([
-            " 財帛宮為「財帛之命」，是金錢能量的本體核心，",
-            "象徵財氣的運作方式、理財思維與對金錢的主觀態度。",
-            "當財忌臨於此宮，意即：",
-            "金錢的核心能量出現自我消耗傾向，錢雖來得快，但流失更快，",
-            "命主對金錢的意識與行動之間產生矛盾。",
-            "這是典型的「財自損格」——不是外界奪財，而是自身行為與心念讓財氣難留。",
-        ]),
-        "大運意義": "大財忌入財帛宮，十年間財運多波折，需建立長期理財計畫。",
-        "流年意義": "流財忌入財帛宮，當年收入波動或破財，慎防衝動消費。",
-    },
-    "對宮空宮": {
-        "說明": "\n".join([
-            "• 空宮 自化忌在福德",
-            "此象為「財氣化於享受」，主金錢與感受糾纏、財隨欲走。",
-            "錢的用途偏向滿足慾望與形象需求，屬「情緒性耗財格」。",
-        ]),
-        "大運意義": (
-            "\n".join([
-           "• 財化忌於福德，象徵「花錢換感覺」，命主易以消費維持自我價值或社交地位；",
-           "愛享受、重顯擺，花錢時滿足，事後空虛；",
-           "財氣表面繁榮，實際入不敷出，財庫虛浮。",
-           " ",
-           "👉 命理建議：此運宜修「享受的節制」，學會分辨「真實滿足」與「外在表演」。",
-           "當心回歸簡靜，財庫自然回穩。""",
-       ])
-   ),
-        "流年意義": (
-        "\n".join([
-            "• 此年慾望性消費暴增，尤其與外觀、娛樂、品味、身分象徵相關；",
-            "易出現「花完才知不該花」的情境。""",
-            " ",
-            "👉 命理建議：檢視消費動機，若源於焦慮、比較或虛榮，即為破財信號。",
-        ])
-    ),
-    },
-    "自化忌": {
-     "說明": "\n".join([
-         "非空宮 自化忌，此象為「財氣自亂」，",
-         "主內部理財意識錯亂與能量渙散。",
-         "不是外力奪財，而是命主「不在意錢、理財無序」，",
-         "屬於「潛意識漏財格」。",
-     ]),
-     "大運意義": "\n".join([
-         "對錢的態度散漫、理財觀念混亂；",
-         "收入穩定但財務缺乏系統與秩序；",
-         "易犯錯誤投資、錯估風險，",
-         "或因懶於管理而錯失累積機會；",
-         "心態上覺得「錢反正會再來」，",
-         "結果資產長期原地踏步。",
-         "",
-         "👉命理建議：",
-         "此運是命要你「重建財意識」的時期。",
-         "財不是累積問題，而是紀律問題。",
-         "若能養成每月檢視、固定儲蓄、簡化開銷習慣，忌氣可化為對秩序的學習力。",
-     ]),
-     "流年意義": "\n".join([
-         "此流年為「財念渙散、無覺之耗」之象。",
-         "表面看似平靜、並無大筆開銷，但月終結算時，",
-         "卻發現帳面始終清空，錢總不知花到哪去了。",
-         "",
-         "• 這並非單純的破財，而是「對財的意識關閉」——",
-         "人處在一種「沒在花、但也沒在守」的能量狀態，",
-         "行為上鬆散、情緒上模糊，財氣於無形間流失。",
-         "",
-         "👉 命理建議：此年要「喚醒金錢意識」，",
-         "每天記錄收支，讓錢回到你的覺察中。",
-         "不要問「錢去哪了」，要問「我在忽略什麼」。",
-         "每日追蹤收支，覺察每一筆花費背後的情緒動機。",
-         "不要問「錢去哪了」，而要問：「我是否對財失去主導權？」。",
-         "當心重新安住，財氣自然歸位。",
-     ]),
- },
- "疾": {
-     "說明": "\n".join([
-         "疾厄宮為財帛之兄弟，主「財氣互動場域」——",
-         "即你與金錢之間的能量交換是否順暢，",
-         "以及環境、人際是否成為財運的助力或耗損。",
-         "當財忌臨此，意味財氣流動的環境開始產生摩擦，",
-         "人事關係、合作氛圍、生活習慣，",
-         "都可能成為財氣耗散的根。",
-     ]),
-     "大運意義": "\n".join([
-         "財忌入疾厄之大運，為「錢生煩惱、人帶阻力」之象。",
-         "常見現象：",
-         "• 財運與人際能量糾纏，為了維持關係而花錢、為他人情所困；",
-         "• 財務相關的人事互動頻生不愉快，錢越多事越多；",
-         "• 或職場環境、人際磁場帶來壓力，使財氣變得沉重難流。",
-         "",
-         "👉 命理建議：此運宜檢視財氣的外部連結：",
-         "哪些人、哪些場合、哪些合作讓你心生壓力？",
-         "切斷不健康的財務互動，即是化忌為順的起點。",
-     ]),
-     "流年意義": "\n".join([
-         "流年財忌入疾厄，多主「財氣在互動中受損」。",
-         "• 容易因人情往來、誤會、合作、環境突變而破財；",
-         "或在職場、家庭、社交圈中被情緒性花費綁架；",
-         "最常見的是：為了排解不舒服的氛圍而花錢——",
-         "像是「買東西解壓」、「請客化解尷尬」、「花錢逃避壓力」。",
-         "",
-         "👉 命理建議：這一年要特別警覺「花錢換舒服」的模式。",
-         "金錢流出的每一筆，其實都在映照一種人際壓力或心理疲累。",
-         "先理清內在的能量界線，財氣自然回穩。",
-     ]),
- },
- "遷": {
-     "說明": "\n".join([
-         "• 遷移宮為「財帛宮之夫妻」，",
-         "象徵財氣的外在互動層與對外呈現的能量場。",
-         "這個位置主「財的外我」——",
-         "即金錢與外界的交換關係、合作契約、社會連結與環境磁場。",
-         "當財忌臨於此宮，便意味著：",
-         "外部世界對你財氣的干擾增強，",
-         "金錢不再由內心掌控，而被外境推著走。",
-     ]),
-     "大運意義": "\n".join([
-         "財忌入遷移之大運，多主「外部環境強勢、被動應對財務」。常見：",
-         "• 因環境變遷、社會局勢、產業結構或公司政策而被迫支出；",
-         "• 人際互動中易為「面子、情理、責任」而破財；",
-         "• 外部事件頻生，使財務無法自主（房市、投資、合作條件突變）。",
-         "此運象徵：財氣受外界推動，自己難定方向。",
-         "若命盤內宮弱，更顯「外強內虛」——忙碌奔波而財流失。",
-         "",
-         "👉 命理建議：宜「守內不逐外」，減少跟風與冒進；以靜制動、以定應變。",
-     ]),
-     "流年意義": "\n".join([
-         "流年財忌入遷移，為「外動破財」之象。",
-         "• 因出差、旅行、遷動、外地往來而生開銷或損失；",
-         "• 因外國客戶、遠方合作、他人邀約導致突發支出；",
-         "• 常與「移動、變化、外求」相關。",
-         "若再忌沖福德或田宅，防「遠行意外支出／外地災耗」。",
-         "",
-         "👉 命理建議：不宜冒進遠行投資，不可輕信外地合作；必要時留後路與緩衝金。",
-     ]),
- },
- "僕": {
-     "說明": "\n".join([
-         "•  交友宮為「財帛宮之子女」，象徵財氣的延伸與外化成果——",
-         "金錢能否在合作、團隊、人脈中「順利孳生」。",
-         "此宮掌管合夥、共事、社交與團隊互信，是財能外放之處。",
-         "當財忌臨於此宮，意味：財的延伸受阻，人際成為破口。",
-         "原本該「生財」的人事關係，反而讓財氣陷入糾纏。",
-     ]),
-     "大運意義": "\n".join([
-         "財忌入交友之大運，多主「合夥關係拖累、共識難維持」。常見：",
-         "• 團隊意見不合、分潤不均；",
-         "• 朋友間金錢糾紛，為情義埋單；",
-         "• 組織結構不穩，導致財務壓力與責任模糊。",
-         "",
-         "深層意涵是「信任錯位」：一人出力、眾人分利，財氣外洩難收。",
-         "",
-         "👉 命理建議：宜獨立作業、減少共擔風險；金錢合作一律白紙黑字；別把熟人當安全。",
-     ]),
-     "流年意義": "\n".join([
-         "流年財忌入交友，多主「友誼試煉、團隊陷阱」。",
-         "• 團體或朋友圈易有財務糾紛；",
-         "• 合作提案／投資邀約看似有利，實則暗藏風險；",
-         "• 同輩壓力、群體比較，誘發衝動消費與錯誤判斷。",
-         "此年常見「共好變共耗」。",
-         "",
-         "👉 命理建議：謹慎合夥、團購、群體投資與朋友借貸；堅守界線、獨立決策，方能看清人心。",
-     ]),
- },
- "官": {
-     "說明": "\n".join([
-         "• 官祿宮為財帛之財帛，是財能「再生」與「放大」的核心位置。",
-         "象徵如何運用資源創造更多財富——屬「資本運作／投資槓桿／以錢生錢」的舞台。",
-         "當財忌臨於此宮：以財生財的機制不順，操作易出變數，",
-         "投資／創業／再投入都容易遭遇隱形風險與外力干擾。",
-     ]),
-     "大運意義": "\n".join([
-         "財忌入官祿之大運：以財生財不順，操作結果倒吃回頭。",
-         "• 決策失誤、槓桿過度、週轉困難；",
-         "• 臨門一腳遇變數；",
-         "• 太急／太貪／太冒進而損失。",
-         "",
-         "深層意涵：財氣需穩定輸入，而非過度放大；冒進易被市場反噬。",
-         "👉 命理建議：保守理財、穩定營運，不宜高風險投機；守成勝於開創，蓄勢優於冒進。",
-     ]),
-     "流年意義": "\n".join([
-         "流年財忌入官祿：財動遇阻、行動突變。",
-         "• 年內若企圖加碼投資、擴張，容易遭遇意外事件；",
-         "• 市場／合作／技術／制度變化致中斷；",
-         "• 看似好機會，一投反成破口。",
-         "",
-         "本質：外在變化快於內在準備；宇宙要學的是節奏與穩度。",
-         "👉 命理建議：避開槓桿與高風險；行動前確保風險可控與現金流充足。",
-     ]),
- },
- "田": {
-     "說明": "\n".join([
-         "• 田宅宮為「財帛宮之疾厄」，主財氣的穩定度與留存能力。",
-         "象徵「財的體質」——是否能聚、能守。",
-         "當財忌臨田宅：財的基礎阻滯，存不住、留不穩，財入即洩如水入沙。",
-         "不是不會賺，而是難以積財，形成「錢過手不聚」。",
-     ]),
-     "大運意義": "\n".join([
-         "財忌入田宅之大運：財根受阻、守財困難。",
-         "• 存錢計畫屢中斷；",
-         "• 意外支出、家庭開銷、投資錯誤頻繁消耗財庫；",
-         "• 想建立安全感，卻前有牽制、後有壓力。",
-         "",
-         "深層意涵：修「守」的功課；問題不是賺，而是讓財安住。",
-         "👉 命理建議：練習「財務安定心」，長期儲蓄、分散配置、減少風險衝動；慢養財。",
-     ]),
-     "流年意義": "\n".join([
-         "流年財忌入田宅：短期財庫空虛、難守之年。",
-         "• 收入穩定但年終結餘為零；",
-         "• 居家／環境事件導致財庫流出；",
-         "• 無明破財：沒多花，存款仍減少。",
-         "",
-         "本質：財氣未穩、內心未定；焦慮與匱乏讓財難聚。",
-         "👉 命理建議：修「靜財心」；固定儲蓄、節制開銷、調整居家磁場，讓財氣安住。",
-     ]),
- },
- "福": {
-     "說明": "\n".join([
-         "• 福德宮為「財帛宮之遷移」，掌管財氣的流動、轉換與能量循環。",
-         "財帛宮是擁有，福德宮是流向（資產轉移／週轉／交換／自由度）。",
-         "當財忌臨此：流動受阻、轉換不暢，像被看不見的力卡住，外動難成。",
-     ]),
-     "大運意義": "\n".join([
-         "財忌入福德之大運：財氣轉移受限、流通不順。",
-         "• 換房／投資／調度遇障礙；",
-         "• 調整架構時，延誤／手續／人事卡關；",
-         "• 心態對流向矛盾（想自由又怕失控），內在拉扯化為外阻。",
-         "",
-         "👉 命理建議：順流不強求，先處理控制慾與不安，再談資產流通；願讓錢自由走動，財自然回流。",
-     ]),
-     "流年意義": "\n".join([
-         "流年財忌入福德：錢在流動時受阻。",
-         "• 匯款延遲、投資卡關、借貸不順、週轉不靈；",
-         "• 流程面技術性問題（凍結、延宕、審核停滯）；",
-         "• 常見「錢該到了，卻卡在半路」。",
-         "",
-         "這是財能減速帶，要學穩定心與信任感。",
-         "👉 命理建議：不急擴張或轉資產；預留時間、備案與緩衝金；以平常心面對延滯，年底守得財根。",
-     ]),
- },
- "父": {
-     "說明": "\n".join([
-         "• 父母宮為「財帛宮之交友」，象徵財氣的人際對應層——",
-         "掌管金錢與權威／規範／契約之關係，也反映上對下、制度對個體的壓力來源。",
-         "當財忌臨此：財被權力、關係或制度束縛；錢不由己，因名義或責任被迫流出。",
-     ]),
-     "大運意義": "\n".join([
-         "財忌入父母之大運：錢被壓迫、權力勒索。",
-         "• 上級／政府／公司／長輩以名義控你財；",
-         "• 被迫承擔不屬於你的開銷（贍養／代墊／責任費）；",
-         "• 合約綁架：簽了就付、違約就賠、求助無門。",
-         "",
-         "本質：金錢不是問題，界線才是根本；界線不清，人情與權威會侵蝕財氣。",
-         "👉 命理建議：一切以書面與規範自保，不可口頭承諾；學會理性拒絕，靠界線守財。",
-     ]),
-     "流年意義": "\n".join([
-         "流年財忌入父母：強迫性破財、法律壓力。",
-         "• 合約條款／法律糾紛／罰款／稅務或誤判的支出；",
-         "• 家人／長輩／上司要求支出難拒；",
-         "• 常見「親子金錢壓力」或「合同失衡」。",
-         "",
-         "此破多為制度性收割——被迫在不公平結構下付代價。",
-         "👉 命理建議：逐條檢查文件與合約；避免模糊條款或替他人擔保；涉稅／保險／貸款／監護務必先諮詢。",
-     ]),
- },
-}
+# 文案已預先展開為常數字串，放在 mingpan_templates.py
+from mingpan_templates import CAIJI_TEMPLATE
 
 def _template_text(palace_key: str, mode: str, status: str = "一般") -> str:
     """mode = '說明'/'大運意義'/'流年意義'；status = 一般/對宮空宮/自化忌"""
@@ -716,53 +410,214 @@ def _parse_star_and_palace(line: str, scope: str):
     return star, pkey
 
 # ======================= 主輸出（破財雷達） =======================
-def render_cai_ji_report(raw_text: str, data=None, col_order=None, year_stem=None) -> str:
+def render_cai_ji_report(raw_text: str, data=None, col_order=None, year_stem=None, cyear=None) -> str:
     """產出與截圖相同風格的純文字報告。"""
+    cyear = CYEAR if cyear is None else cyear
     if data is None or col_order is None:
         data, col_order, year_stem = parse_chart(raw_text)
 
     # 結論 + 兩行
-    line1, line2, daxian_row, liu_row = summarize_cai_ji_targets(data, col_order, raw_text)
+    line1, line2, daxian_row, liu_row = summarize_cai_ji_targets(data, col_order, raw_text, cyear)
+
+    return _assemble_report(cyear, _daxian_section(line1), _liunian_section(line2))
 
+def _status_of(line: str) -> str:
+    return "自化忌" if "自化忌" in line else ("對宮空宮" if "對宮空宮" in line else "一般")
+
+def _daxian_section(line1: str) -> list:
     # 解析星名與宮位（縮寫→全名）
     star_da, pkey_da = _parse_star_and_palace(line1, "大限")
-    star_liu, pkey_liu = _parse_star_and_palace(line2, "流年")
     full_da = PALACE_FULL.get(pkey_da, pkey_da+"宮")
+    status_da = _status_of(line1)
+    return [
+        "1. 十年大運： " + line1,
+        "",
+        f"{star_da}忌 入 {full_da} 說明：",
+        _template_text(pkey_da, "說明", status_da),
+        "",
+        "大運" + star_da + "忌 入 " + full_da + " 意義：",
+        _template_text(pkey_da, "大運意義", status_da),
+    ]
+
+def _liunian_section(line2: str) -> list:
+    star_liu, pkey_liu = _parse_star_and_palace(line2, "流年")
     full_liu = PALACE_FULL.get(pkey_liu, pkey_liu+"宮")
-
-    status_da = "自化忌" if "自化忌" in line1 else ("對宮空宮" if "對宮空宮" in line1 else "一般")
-    status_liu = "自化忌" if "自化忌" in line2 else ("對宮空宮" if "對宮空宮" in line2 else "一般")
-
+    status_liu = _status_of(line2)
+    return [
+        "2. 流年運勢： " + line2,
+        "",
+        f"{star_liu}忌 入 {full_liu} 說明：",
+        _template_text(pkey_liu, "說明", status_liu),
+        "",
+        "流年" + star_liu + "忌 入 " + full_liu + " 意義：",
+        _template_text(pkey_liu, "流年意義", status_liu),
+    ]
+
+def _assemble_report(cyear, da_section: list, liu_section: list) -> str:
     # ── 組整份文字（比照你的截圖行距與標點） ──
-    out = []
-    out.append(f"{CYEAR}年 破財雷達")
-    out.append("")
-    out.append("1. 十年大運： " + line1)
-    out.append("")
-    out.append(f"{star_da}忌 入 {full_da} 說明：")
-    out.append(_template_text(pkey_da, "說明", status_da))
-    out.append("")
-    out.append("大運" + star_da + "忌 入 " + full_da + " 意義：")
-    out.append(_template_text(pkey_da, "大運意義", status_da))
-    out.append("")
-    out.append("────────────────────────")
-    out.append("")
-    out.append("2. 流年運勢： " + line2)
-    out.append("")
-    out.append(f"{star_liu}忌 入 {full_liu} 說明：")
-    out.append(_template_text(pkey_liu, "說明", status_liu))
-    out.append("")
-    out.append("流年" + star_liu + "忌 入 " + full_liu + " 意義：")
-    out.append(_template_text(pkey_liu, "流年意義", status_liu))
+    out = [f"{cyear}年 破財雷達", ""]
+    out += da_section
+    out += ["", "────────────────────────", ""]
+    out += liu_section
     out.append("")
     return "\n".join(out)
 
 # ======================= 便捷：完整流程 =======================
-def run_report(raw_text: str) -> str:
-    """外部呼叫用：直接回傳破財雷達報告字串（避免重複 DEBUG）。"""
+def run_report(raw_text: str, cyear=None) -> str:
+    """外部呼叫用：直接回傳破財雷達報告字串（避免重複 DEBUG）。cyear 省略時用全域 CYEAR。"""
     data, col_order, year_stem = parse_chart(raw_text)
     # 不再在這裡額外呼叫 summarize_cai_ji_targets（由 render_* 內部呼叫一次即可）
-    return render_cai_ji_report(raw_text, data, col_order, year_stem)
+    return render_cai_ji_report(raw_text, data, col_order, year_stem, cyear)
+
+# ======================= 換年重算：同一命盤只解析一次 =======================
+def prepare_chart(raw_text: str) -> dict:
+    """
+    解析一次、可重複換 cyear 的命盤。與年份無關的部分（欄序、大限區間、出生年）先算好；
+    與年份有關的列與段落依「大限命所在欄」「流年地支」記憶，最多各 12 種。
+    """
+    data, col_order, year_stem = parse_chart(raw_text)
+    cols = reorder_cols_by_palace(data, col_order)
+    return {
+        "raw": raw_text, "data": data, "col_order": col_order, "year_stem": year_stem,
+        "cols": cols, "byear": parse_birth_year(raw_text), "lunar": parse_lunar_birth(raw_text),
+        "ranges": daxian_ranges(data, cols),
+        "memo": {},
+    }
+
+def _memo(prep: dict, key, fn):
+    memo = prep["memo"]
+    if key not in memo:
+        memo[key] = fn()
+    return memo[key]
+
+def cai_ji_for_year(prep: dict, cyear: int) -> dict:
+    """同 compute_cai_ji，但列與財忌結果依錨點記憶；只有大限跨區間時才重算大限部分。"""
+    data, cols = prep["data"], prep["cols"]
+    age = cyear - prep["byear"] if prep["byear"] else None
+    anchor = anchor_from_ranges(prep["ranges"], data, age) if age is not None else ""
+
+    def _da():
+        row = build_daxian_ming_row(cols, data, anchor)
+        return row, _cai_ji_scope(cols, data, row)
+
+    daxian_row, da = _memo(prep, ("dx", anchor), _da)
+    liu_row, liu = branch_scope(prep, zodiac_of_year(cyear))
+    return {
+        "cyear": cyear, "cols": cols, "age": age, "anchor": anchor,
+        "daxian_row": daxian_row, "liu_row": liu_row, "daxian": da, "liunian": liu,
+    }
+
+def render_report_for_year(prep: dict, cyear: int) -> str:
+    """輸出與 run_report(raw, cyear) 相同；換年時只補算年份相關段落。"""
+    res = cai_ji_for_year(prep, cyear)
+    line1, line2 = cai_ji_lines(res)
+    da_section = _memo(prep, ("dx_text", res["anchor"]), lambda: _daxian_section(line1))
+    liu_section = _memo(prep, ("liu_text", zodiac_of_year(cyear)), lambda: _liunian_section(line2))
+    return _assemble_report(cyear, da_section, liu_section)
+
+def branch_scope(prep: dict, branch: str):
+    """以地支 branch 為命的 (列, 財忌結果)；流年、流月、流日只要命宮地支相同就共用，最多 12 種。"""
+    def _calc():
+        row = build_branch_row(prep["cols"], branch)
+        return row, _cai_ji_scope(prep["cols"], prep["data"], row)
+    return _memo(prep, ("liu", branch), _calc)
+
+# ======================= 流月 / 流日 =======================
+# 月、日皆為農曆序數（正月=1，初一=1）；閏月依本月論。
+def doujun_branch(year_branch: str, lunar_month: int, hour_branch: str) -> str:
+    """斗君（流月正月命宮）：由流年命宮逆數至生月，再從該宮起子時順數至生時。"""
+    i = ZODIAC.index(year_branch) - (lunar_month - 1) + ZODIAC.index(hour_branch)
+    return ZODIAC[i % 12]
+
+def liuyue_branches(prep: dict, cyear: int) -> list:
+    """cyear 正月～十二月各流月命宮地支。"""
+    def _calc():
+        lunar = prep.get("lunar") or {}
+        if not lunar:
+            raise ValueError("命盤原文缺農曆生月 / 生時，無法排流月")
+        start = ZODIAC.index(doujun_branch(zodiac_of_year(cyear), lunar["month"], lunar["hour_branch"]))
+        return [ZODIAC[(start + k) % 12] for k in range(12)]
+    return _memo(prep, ("liuyue", zodiac_of_year(cyear)), _calc)
+
+def _period_entry(prep: dict, branch: str, **label) -> dict:
+    row, scope = branch_scope(prep, branch)
+    ming_col = prep["cols"][row.index("命")] if "命" in row else ""
+    return dict(label, branch=branch, ming_col=ming_col, row=row, scope=scope)
+
+def cai_ji_for_months(prep: dict, cyear: int, months=range(1, 13)) -> list:
+    """流月破財雷達：[{month, branch, ming_col, row, scope}]，scope 同 _cai_ji_scope。"""
+    branches = liuyue_branches(prep, cyear)
+    return [_period_entry(prep, branches[m - 1], month=m) for m in months]
+
+def lunar_month_days(cyear: int, month: int) -> int:
+    """cyear 年農曆 month 月（非閏月）的天數；沒裝 lunardate 或年份超出其範圍（1900–2099）時一律 30。"""
+    if LunarDate is None:
+        return 30
+    try:
+        d = LunarDate(cyear, month, 1).to_solar_date() + datetime.timedelta(days=29)
+        return 30 if LunarDate.from_solar_date(d.year, d.month, d.day).day == 30 else 29
+    except ValueError:
+        return 30
+
+def cai_ji_for_days(prep: dict, cyear: int, month: int, days: int = 0) -> list:
+    """
+    流日破財雷達：流月命宮為初一，順行逐日；整月只會算到最多 12 種命宮。
+    days 省略時取該農曆月的實際天數（見 lunar_month_days）。
+    """
+    start = ZODIAC.index(liuyue_branches(prep, cyear)[month - 1])
+    days = days or lunar_month_days(cyear, month)
+    return [_period_entry(prep, ZODIAC[(start + d - 1) % 12], month=month, day=d) for d in range(1, days + 1)]
+
+# ======================= 合盤 =======================
+HUA_TYPES = ("祿", "權", "科", "忌")
+
+def cai_cols(prep: dict, cyear: int) -> dict:
+    """本命 / 大限 / 流年三層財宮所在欄；找不到為空字串。"""
+    res = cai_ji_for_year(prep, cyear)
+    cols, data = prep["cols"], prep["data"]
+    return {
+        "本命": next((c for c in cols if data[c]["abbr"] == "財"), ""),
+        "大限": _col_for_label(cols, res["daxian_row"], "財"),
+        "流年": _col_for_label(cols, res["liu_row"], "財"),
+    }
+
+def cross_cai_hua(prep_a: dict, prep_b: dict, cyear: int) -> list:
+    """
+    合盤：A 盤各層財宮天干的四化星 → 落在 B 盤哪一欄，再對映 B 的本命宮 / 當年大限宮 / 流年宮。
+    [{'level','col','stem','hua','star','to_col','palace','daxian_palace','liunian_palace'}]；
+    星不在 B 盤時 to_col 與各宮皆為空字串。
+    """
+    res_b = cai_ji_for_year(prep_b, cyear)
+    cols_b, data_b = prep_b["cols"], prep_b["data"]
+    out = []
+    for level, col in cai_cols(prep_a, cyear).items():
+        stem = col[0] if col else ""
+        for typ in HUA_TYPES:
+            star = YEAR_HUA.get(stem, {}).get(typ, "")
+            to_col = _locate_star_column(cols_b, data_b, star) if star else ""
+            i = cols_b.index(to_col) if to_col else -1
+            out.append({
+                "level": level, "col": col, "stem": stem, "hua": typ, "star": star, "to_col": to_col,
+                "palace": data_b[to_col]["abbr"] if to_col else "",
+                "daxian_palace": res_b["daxian_row"][i] if to_col else "",
+                "liunian_palace": res_b["liu_row"][i] if to_col else "",
+            })
+    return out
+
+def chart_records(data: dict, col_order: list) -> list:
+    """依宮位序輸出每宮的結構化資料（JSON API 用）。"""
+    out = []
+    for col in reorder_cols_by_palace(data, col_order):
+        b = data[col]
+        lo, _, hi = b["daxian"].partition("~")
+        out.append({
+            "col": col, "stem": col[0], "branch": col[1],
+            "palace": b["palace"], "abbr": b["abbr"],
+            "main": b["main"], "aux": b["aux"], "mini": b["mini"],
+            "stars": [{k: st[k] for k in ("name", "category", "brightness", "hua")} for st in b.get("stars", [])],
+            "daxian": [int(lo), int(hi)] if lo.isdigit() and hi.isdigit() else None,
+        })
+    return out
 
 # ======================= 測試入口（獨立跑） =======================
 if __name__ == "__main__":
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+破財雷達文案（預先展開的常數字串）
+
+原本在 mingpan_logic 匯入時以 "\n".join(...) 組字串；這裡直接寫成字面常數，
+編譯成 .pyc 後載入即可，不需在啟動時再組。修改文案請直接改本檔。
+"""
+
+CAIJI_TEMPLATE = {
+    "夫": {  # 夫妻宮
+        "說明": (
+            "•  夫妻宮為「財帛宮之福德」，掌管財氣的感受層與使用體驗。\n"
+            "當財忌臨於此宮，代表：\n"
+            "•  金錢與情感、快樂、享受產生糾纏；花錢難得滿足，甚至被人情與情緒綁架。\n"
+            "•  這是「財的感受系統出現失衡」的象徵，命主往往不是沒有錢，而是錢帶來的快樂不再純粹。"
+        ),
+        "大運意義": (
+            "財忌入夫妻之大運，主「情感用事、享樂成耗」。\n"
+            "常見現象包括：• 因情感因素花錢（討好、彌補、維繫關係），導致財務受損；\n"
+            "• 對物質與享受的慾望上升，但內在滿足下降；\n"
+            "• 花錢的動機常來自孤單、焦慮或比較，而非真正的需要。\n"
+            "   \n"
+            "深層含義在於：命要你學習“情緒與金錢分離”。\n"
+            "金錢若成為情感的代替品，福德就會轉為耗德。\n"
+            "   \n"
+            "👉 命理建議：此大運宜培養「自我價值感的穩定」，讓金錢使用回歸理性節奏。\n"
+            "讓金錢的使用回歸理性與節奏，\n"
+            "避免以“付出換關係”、“消費換快樂”的方式消耗財氣。\n"
+            "愛可以流動，但財需有界。"
+        ),
+        "流年意義": (
+            "流年財忌入夫妻，多主「人情破財、感情消耗」。\n"
+            "• 容易被情感勒索、道德綁架、或情緒性花費捲入；\n"
+            "• 可能為伴侶、家人、或親密朋友需要而被迫支出；\n"
+            "• 或單純因情緒起伏、壓力過高而透過消費尋求慰藉。\n"
+            "   \n"
+            "此象是財氣的短期紊亂——情感主導金錢，理智退出舞台。\n"
+            "   \n"
+            "👉 命理建議：練習分辨「我現在花的，是錢，還是情緒？」\n"
+            "當你能分辨並安撫內在的感受，破財便能止於覺察之前。"
+        ),
+    },
+    "命": {  # 命宮
+        "說明": (
+            "• 命宮為一切能量的核心，是「我」的主體意識所在。\n"
+            "當財忌入命時，代表財氣的課題直接進入人格核心，\n"
+            "金錢不再只是外在事件，而成為「自我價值、人生方向、與存在焦慮」的投射場。\n"
+            "   \n"
+            "同時從十二宮相生結構看，命宮為「財帛宮之官祿」——\n"
+            "也就是「財的事業」。\n"
+            "換言之，這是一個關於如何以金錢構築自我定位與行動主軸的命運考題。"
+        ),
+        "大運意義": (
+            "當大運財忌入命，意味著長期能量焦點被「生存壓力」所牽制。\n"
+            "財帛氣場化忌臨身，常見現象為：\n"
+            "• 財務規劃失衡，支出結構凌駕收入；\n"
+            "• 無論努力多少，總覺得錢難留、人事牽絆多；\n"
+            "• 易為現實所迫而失去長期方向，整體運勢呈「應付現實」的姿態。\n"
+            " \n"
+            "👉 命理建議：此時宜收斂外務、減少非必要開銷，\n"
+            "將重點回歸內在穩定與價值重構。"
+        ),
+        "流年意義": (
+            "流年財忌入命，多主「短期財務緊縮與心理焦慮並行」。\n"
+            "• 經常性支出增加，壓迫到生活基本面；\n"
+            "• 錢花得快、來得慢，行動上被動受限；\n"
+            "• 內在出現「越努力越緊」的能量拉扯。\n"
+            " \n"
+            "此年是財氣壓力直接作用於心身的時期。\n"
+            "若未能及時調整思維，容易陷入「為錢而活」的循環，\n"
+            "失去方向感與內在動力。"
+        ),
+    },
+    "兄": {  # 兄弟宮
+        "說明": (
+            "• 兄弟宮為「財帛宮之田宅」，象徵財氣的基礎與庫存能量，也就是命主的「財庫」與「資源穩定度」。\n"
+            "此宮反映一個人對金錢安全感、財務累積方式，以及資產守護的能力。\n"
+            "    \n"
+            "•  當財忌臨於兄弟宮時，代表：\n"
+            "財庫受壓、資源難聚，既存的財務基礎容易鬆動、消耗、或被外力動用。\n"
+            "   \n"
+            "•  這是一種「財根不穩」的象徵，金錢不是不來，而是來得有壓力、留得不安穩。"
+        ),
+        "大運意義": (
+            "財忌入兄弟之大運，主「財庫持續減損、積蓄難守」。\n"
+            "常見現象包括：• 長期支出超過儲蓄，存款逐年下滑；\n"
+            "• 資產被牽動或挪用（家人、合作、投資分攤等）；\n"
+            "• 對錢缺乏歸屬感，越想守越留不住。\n"
+            "   \n"
+            "此運的深層課題在於——財庫與心庫同頻。\n"
+            "當內心缺乏安全感或信任感，潛意識會透過外在事件「洩財」來平衡焦慮。\n"
+            "   \n"
+            "👉 命理建議：此大運不僅要理財，更要「理心」。\n"
+            "建立穩定的收支習慣、簡化財務結構、減少複雜合作。\n"
+            "若能練習「讓錢有家、讓心有根」，財氣自然回穩。"
+        ),
+        "流年意義": (
+            "流年財忌入兄弟，多主「短期財庫破口」「無形耗財」。\n"
+            "• 常見突發支出（家人借用、投資回收不及、資產變現困難）；\n"
+            "• 或財務調度緊繃、現金流周轉壓力大；\n"
+            "• 也可能因信任錯誤（朋友、手足）導致錢外流。\n"
+            "   \n"
+            "👉 命理建議：此年宜檢查財務安全結構，避免共帳、合資、或借貸行為。\n"
+            "重新劃分財務邊界，將資金集中管理、設定留存比例。\n"
+            "心能安於當下，財才會安於你手。"
+        ),
+    },
+    "子": {  # 子女宮
+        "說明": (
+            "• 子女宮為「財帛宮之父母」，主掌生財之源與財氣的制度上游。\n"
+            "當財忌臨此，象徵「財的生源出現堵塞」，\n"
+            "即——金錢的上游動力受限，無論是事業架構、上級主管、或制度合約，\n"
+            "皆可能成為「破財觸發點」。"
+        ),
+        "大運意義": (
+            "財忌入子女宮之大運，多主「上層權責與規章壓力」形成長期能量消耗。\n"
+            "常見現象：\n"
+            "• 合約、制度、主管指令使事業穩定性下降；\n"
+            "• 被上級、公司政策或合作條件綁住資金流；\n"
+            "• 投入多而回報遲緩，或成果被上層攫取。\n"
+            " \n"
+            "👉 命理建議：此運宜審慎處理合約文件、職場條件與權責界線；\n"
+            "看似微小條款，往往是財氣流失的根。"
+        ),
+        "流年意義": (
+            "流年財忌入子女宮，為「上級導致財務受損」之象。\n"
+            "• 易因公司錯誤決策、主管指令、制度改動而連帶破財；\n"
+            "• 或上游資源斷流、款項延遲、報酬削減等現象頻生；\n"
+            "• 若命盤原局財氣偏弱，則此年更易陷入「為他人承擔成本」。\n"
+            " \n"
+            "👉 命理建議：當年宜謹慎與上層互動，凡涉及簽署、保證、合約、授權之事，\n"
+            "須保留紀錄、清楚界線。"
+        ),
+    },
+    "財": {  # 財帛宮
+        "說明": (
+            " 財帛宮為「財帛之命」，是金錢能量的本體核心，\n"
+            "象徵財氣的運作方式、理財思維與對金錢的主觀態度。\n"
+            "當財忌臨於此宮，意即：\n"
+            "金錢的核心能量出現自我消耗傾向，錢雖來得快，但流失更快，\n"
+            "命主對金錢的意識與行動之間產生矛盾。\n"
+            "這是典型的「財自損格」——不是外界奪財，而是自身行為與心念讓財氣難留。"
+        ),
+        "大運意義": "大財忌入財帛宮，十年間財運多波折，需建立長期理財計畫。",
+        "流年意義": "流財忌入財帛宮，當年收入波動或破財，慎防衝動消費。",
+    },
+    "對宮空宮": {
+        "說明": (
+            "• 空宮 自化忌在福德\n"
+            "此象為「財氣化於享受」，主金錢與感受糾纏、財隨欲走。\n"
+            "錢的用途偏向滿足慾望與形象需求，屬「情緒性耗財格」。"
+        ),
+        "大運意義": (
+            "• 財化忌於福德，象徵「花錢換感覺」，命主易以消費維持自我價值或社交地位；\n"
+            "愛享受、重顯擺，花錢時滿足，事後空虛；\n"
+            "財氣表面繁榮，實際入不敷出，財庫虛浮。\n"
+            " \n"
+            "👉 命理建議：此運宜修「享受的節制」，學會分辨「真實滿足」與「外在表演」。\n"
+            "當心回歸簡靜，財庫自然回穩。"
+        ),
+        "流年意義": (
+            "• 此年慾望性消費暴增，尤其與外觀、娛樂、品味、身分象徵相關；\n"
+            "易出現「花完才知不該花」的情境。\n"
+            " \n"
+            "👉 命理建議：檢視消費動機，若源於焦慮、比較或虛榮，即為破財信號。"
+        ),
+    },
+    "自化忌": {
+        "說明": (
+            "非空宮 自化忌，此象為「財氣自亂」，\n"
+            "主內部理財意識錯亂與能量渙散。\n"
+            "不是外力奪財，而是命主「不在意錢、理財無序」，\n"
+            "屬於「潛意識漏財格」。"
+        ),
+        "大運意義": (
+            "對錢的態度散漫、理財觀念混亂；\n"
+            "收入穩定但財務缺乏系統與秩序；\n"
+            "易犯錯誤投資、錯估風險，\n"
+            "或因懶於管理而錯失累積機會；\n"
+            "心態上覺得「錢反正會再來」，\n"
+            "結果資產長期原地踏步。\n"
+            "\n"
+            "👉命理建議：\n"
+            "此運是命要你「重建財意識」的時期。\n"
+            "財不是累積問題，而是紀律問題。\n"
+            "若能養成每月檢視、固定儲蓄、簡化開銷習慣，忌氣可化為對秩序的學習力。"
+        ),
+        "流年意義": (
+            "此流年為「財念渙散、無覺之耗」之象。\n"
+            "表面看似平靜、並無大筆開銷，但月終結算時，\n"
+            "卻發現帳面始終清空，錢總不知花到哪去了。\n"
+            "\n"
+            "• 這並非單純的破財，而是「對財的意識關閉」——\n"
+            "人處在一種「沒在花、但也沒在守」的能量狀態，\n"
+            "行為上鬆散、情緒上模糊，財氣於無形間流失。\n"
+            "\n"
+            "👉 命理建議：此年要「喚醒金錢意識」，\n"
+            "每天記錄收支，讓錢回到你的覺察中。\n"
+            "不要問「錢去哪了」，要問「我在忽略什麼」。\n"
+            "每日追蹤收支，覺察每一筆花費背後的情緒動機。\n"
+            "不要問「錢去哪了」，而要問：「我是否對財失去主導權？」。\n"
+            "當心重新安住，財氣自然歸位。"
+        ),
+    },
+    "疾": {  # 疾厄宮
+        "說明": (
+            "疾厄宮為財帛之兄弟，主「財氣互動場域」——\n"
+            "即你與金錢之間的能量交換是否順暢，\n"
+            "以及環境、人際是否成為財運的助力或耗損。\n"
+            "當財忌臨此，意味財氣流動的環境開始產生摩擦，\n"
+            "人事關係、合作氛圍、生活習慣，\n"
+            "都可能成為財氣耗散的根。"
+        ),
+        "大運意義": (
+            "財忌入疾厄之大運，為「錢生煩惱、人帶阻力」之象。\n"
+            "常見現象：\n"
+            "• 財運與人際能量糾纏，為了維持關係而花錢、為他人情所困；\n"
+            "• 財務相關的人事互動頻生不愉快，錢越多事越多；\n"
+            "• 或職場環境、人際磁場帶來壓力，使財氣變得沉重難流。\n"
+            "\n"
+            "👉 命理建議：此運宜檢視財氣的外部連結：\n"
+            "哪些人、哪些場合、哪些合作讓你心生壓力？\n"
+            "切斷不健康的財務互動，即是化忌為順的起點。"
+        ),
+        "流年意義": (
+            "流年財忌入疾厄，多主「財氣在互動中受損」。\n"
+            "• 容易因人情往來、誤會、合作、環境突變而破財；\n"
+            "或在職場、家庭、社交圈中被情緒性花費綁架；\n"
+            "最常見的是：為了排解不舒服的氛圍而花錢——\n"
+            "像是「買東西解壓」、「請客化解尷尬」、「花錢逃避壓力」。\n"
+            "\n"
+            "👉 命理建議：這一年要特別警覺「花錢換舒服」的模式。\n"
+            "金錢流出的每一筆，其實都在映照一種人際壓力或心理疲累。\n"
+            "先理清內在的能量界線，財氣自然回穩。"
+        ),
+    },
+    "遷": {  # 遷移宮
+        "說明": (
+            "• 遷移宮為「財帛宮之夫妻」，\n"
+            "象徵財氣的外在互動層與對外呈現的能量場。\n"
+            "這個位置主「財的外我」——\n"
+            "即金錢與外界的交換關係、合作契約、社會連結與環境磁場。\n"
+            "當財忌臨於此宮，便意味著：\n"
+            "外部世界對你財氣的干擾增強，\n"
+            "金錢不再由內心掌控，而被外境推著走。"
+        ),
+        "大運意義": (
+            "財忌入遷移之大運，多主「外部環境強勢、被動應對財務」。常見：\n"
+            "• 因環境變遷、社會局勢、產業結構或公司政策而被迫支出；\n"
+            "• 人際互動中易為「面子、情理、責任」而破財；\n"
+            "• 外部事件頻生，使財務無法自主（房市、投資、合作條件突變）。\n"
+            "此運象徵：財氣受外界推動，自己難定方向。\n"
+            "若命盤內宮弱，更顯「外強內虛」——忙碌奔波而財流失。\n"
+            "\n"
+            "👉 命理建議：宜「守內不逐外」，減少跟風與冒進；以靜制動、以定應變。"
+        ),
+        "流年意義": (
+            "流年財忌入遷移，為「外動破財」之象。\n"
+            "• 因出差、旅行、遷動、外地往來而生開銷或損失；\n"
+            "• 因外國客戶、遠方合作、他人邀約導致突發支出；\n"
+            "• 常與「移動、變化、外求」相關。\n"
+            "若再忌沖福德或田宅，防「遠行意外支出／外地災耗」。\n"
+            "\n"
+            "👉 命理建議：不宜冒進遠行投資，不可輕信外地合作；必要時留後路與緩衝金。"
+        ),
+    },
+    "僕": {  # 交友宮
+        "說明": (
+            "•  交友宮為「財帛宮之子女」，象徵財氣的延伸與外化成果——\n"
+            "金錢能否在合作、團隊、人脈中「順利孳生」。\n"
+            "此宮掌管合夥、共事、社交與團隊互信，是財能外放之處。\n"
+            "當財忌臨於此宮，意味：財的延伸受阻，人際成為破口。\n"
+            "原本該「生財」的人事關係，反而讓財氣陷入糾纏。"
+        ),
+        "大運意義": (
+            "財忌入交友之大運，多主「合夥關係拖累、共識難維持」。常見：\n"
+            "• 團隊意見不合、分潤不均；\n"
+            "• 朋友間金錢糾紛，為情義埋單；\n"
+            "• 組織結構不穩，導致財務壓力與責任模糊。\n"
+            "\n"
+            "深層意涵是「信任錯位」：一人出力、眾人分利，財氣外洩難收。\n"
+            "\n"
+            "👉 命理建議：宜獨立作業、減少共擔風險；金錢合作一律白紙黑字；別把熟人當安全。"
+        ),
+        "流年意義": (
+            "流年財忌入交友，多主「友誼試煉、團隊陷阱」。\n"
+            "• 團體或朋友圈易有財務糾紛；\n"
+            "• 合作提案／投資邀約看似有利，實則暗藏風險；\n"
+            "• 同輩壓力、群體比較，誘發衝動消費與錯誤判斷。\n"
+            "此年常見「共好變共耗」。\n"
+            "\n"
+            "👉 命理建議：謹慎合夥、團購、群體投資與朋友借貸；堅守界線、獨立決策，方能看清人心。"
+        ),
+    },
+    "官": {  # 事業宮
+        "說明": (
+            "• 官祿宮為財帛之財帛，是財能「再生」與「放大」的核心位置。\n"
+            "象徵如何運用資源創造更多財富——屬「資本運作／投資槓桿／以錢生錢」的舞台。\n"
+            "當財忌臨於此宮：以財生財的機制不順，操作易出變數，\n"
+            "投資／創業／再投入都容易遭遇隱形風險與外力干擾。"
+        ),
+        "大運意義": (
+            "財忌入官祿之大運：以財生財不順，操作結果倒吃回頭。\n"
+            "• 決策失誤、槓桿過度、週轉困難；\n"
+            "• 臨門一腳遇變數；\n"
+            "• 太急／太貪／太冒進而損失。\n"
+            "\n"
+            "深層意涵：財氣需穩定輸入，而非過度放大；冒進易被市場反噬。\n"
+            "👉 命理建議：保守理財、穩定營運，不宜高風險投機；守成勝於開創，蓄勢優於冒進。"
+        ),
+        "流年意義": (
+            "流年財忌入官祿：財動遇阻、行動突變。\n"
+            "• 年內若企圖加碼投資、擴張，容易遭遇意外事件；\n"
+            "• 市場／合作／技術／制度變化致中斷；\n"
+            "• 看似好機會，一投反成破口。\n"
+            "\n"
+            "本質：外在變化快於內在準備；宇宙要學的是節奏與穩度。\n"
+            "👉 命理建議：避開槓桿與高風險；行動前確保風險可控與現金流充足。"
+        ),
+    },
+    "田": {  # 田宅宮
+        "說明": (
+            "• 田宅宮為「財帛宮之疾厄」，主財氣的穩定度與留存能力。\n"
+            "象徵「財的體質」——是否能聚、能守。\n"
+            "當財忌臨田宅：財的基礎阻滯，存不住、留不穩，財入即洩如水入沙。\n"
+            "不是不會賺，而是難以積財，形成「錢過手不聚」。"
+        ),
+        "大運意義": (
+            "財忌入田宅之大運：財根受阻、守財困難。\n"
+            "• 存錢計畫屢中斷；\n"
+            "• 意外支出、家庭開銷、投資錯誤頻繁消耗財庫；\n"
+            "• 想建立安全感，卻前有牽制、後有壓力。\n"
+            "\n"
+            "深層意涵：修「守」的功課；問題不是賺，而是讓財安住。\n"
+            "👉 命理建議：練習「財務安定心」，長期儲蓄、分散配置、減少風險衝動；慢養財。"
+        ),
+        "流年意義": (
+            "流年財忌入田宅：短期財庫空虛、難守之年。\n"
+            "• 收入穩定但年終結餘為零；\n"
+            "• 居家／環境事件導致財庫流出；\n"
+            "• 無明破財：沒多花，存款仍減少。\n"
+            "\n"
+            "本質：財氣未穩、內心未定；焦慮與匱乏讓財難聚。\n"
+            "👉 命理建議：修「靜財心」；固定儲蓄、節制開銷、調整居家磁場，讓財氣安住。"
+        ),
+    },
+    "福": {  # 福德宮
+        "說明": (
+            "• 福德宮為「財帛宮之遷移」，掌管財氣的流動、轉換與能量循環。\n"
+            "財帛宮是擁有，福德宮是流向（資產轉移／週轉／交換／自由度）。\n"
+            "當財忌臨此：流動受阻、轉換不暢，像被看不見的力卡住，外動難成。"
+        ),
+        "大運意義": (
+            "財忌入福德之大運：財氣轉移受限、流通不順。\n"
+            "• 換房／投資／調度遇障礙；\n"
+            "• 調整架構時，延誤／手續／人事卡關；\n"
+            "• 心態對流向矛盾（想自由又怕失控），內在拉扯化為外阻。\n"
+            "\n"
+            "👉 命理建議：順流不強求，先處理控制慾與不安，再談資產流通；願讓錢自由走動，財自然回流。"
+        ),
+        "流年意義": (
+            "流年財忌入福德：錢在流動時受阻。\n"
+            "• 匯款延遲、投資卡關、借貸不順、週轉不靈；\n"
+            "• 流程面技術性問題（凍結、延宕、審核停滯）；\n"
+            "• 常見「錢該到了，卻卡在半路」。\n"
+            "\n"
+            "這是財能減速帶，要學穩定心與信任感。\n"
+            "👉 命理建議：不急擴張或轉資產；預留時間、備案與緩衝金；以平常心面對延滯，年底守得財根。"
+        ),
+    },
+    "父": {  # 父母宮
+        "說明": (
+            "• 父母宮為「財帛宮之交友」，象徵財氣的人際對應層——\n"
+            "掌管金錢與權威／規範／契約之關係，也反映上對下、制度對個體的壓力來源。\n"
+            "當財忌臨此：財被權力、關係或制度束縛；錢不由己，因名義或責任被迫流出。"
+        ),
+        "大運意義": (
+            "財忌入父母之大運：錢被壓迫、權力勒索。\n"
+            "• 上級／政府／公司／長輩以名義控你財；\n"
+            "• 被迫承擔不屬於你的開銷（贍養／代墊／責任費）；\n"
+            "• 合約綁架：簽了就付、違約就賠、求助無門。\n"
+            "\n"
+            "本質：金錢不是問題，界線才是根本；界線不清，人情與權威會侵蝕財氣。\n"
+            "👉 命理建議：一切以書面與規範自保，不可口頭承諾；學會理性拒絕，靠界線守財。"
+        ),
+        "流年意義": (
+            "流年財忌入父母：強迫性破財、法律壓力。\n"
+            "• 合約條款／法律糾紛／罰款／稅務或誤判的支出；\n"
+            "• 家人／長輩／上司要求支出難拒；\n"
+            "• 常見「親子金錢壓力」或「合同失衡」。\n"
+            "\n"
+            "此破多為制度性收割——被迫在不公平結構下付代價。\n"
+            "👉 命理建議：逐條檢查文件與合約；避免模糊條款或替他人擔保；涉稅／保險／貸款／監護務必先諮詢。"
+        ),
+    },
+}
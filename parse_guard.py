@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+解析護欄：輸入大小上限與每請求 CPU 預算
+
+上游頁面、命盤原文（命盤庫 / 共用快取 / 上游）都可能異常或被竄改。解析層的正規式已改成
+線性時間（佔有量詞、有界長度、parse_chart 改手寫掃描；bench_pathological.py 量最壞情況），
+這裡再補兩道保險：
+  - 大小上限：超過直接拒絕，不進正規式
+  - CPU 預算：以本執行緒 CPU 時間（time.thread_time，不含等上游）計，解析迴圈每一步檢查
+
+環境變數（0 = 不限）：
+  PARSE_MAX_PAGE_BYTES   命盤結果頁（預設 2 MiB）
+  PARSE_MAX_CELL_CHARS   單一宮位格的純文字（預設 4000 字）
+  PARSE_MAX_RAW_CHARS    命盤原文（預設 64K 字；正常約 1K）
+  PARSE_CPU_BUDGET       每請求解析可用的 CPU 秒數（預設 2）
+"""
+import contextlib
+import os
+import threading
+import time
+
+MAX_PAGE_BYTES = int(os.environ.get("PARSE_MAX_PAGE_BYTES", 2 * 1024 * 1024))
+MAX_CELL_CHARS = int(os.environ.get("PARSE_MAX_CELL_CHARS", 4000))
+MAX_RAW_CHARS = int(os.environ.get("PARSE_MAX_RAW_CHARS", 64 * 1024))
+CPU_BUDGET = float(os.environ.get("PARSE_CPU_BUDGET", 2.0))
+
+class ParseLimitError(RuntimeError):
+    """輸入超過大小上限，或解析用掉的 CPU 超過預算。"""
+
+def check_size(what: str, size: int, limit: int):
+    if limit and size > limit:
+        raise ParseLimitError(f"{what}過大（{size} > {limit}），拒絕解析")
+
+# ======================= CPU 預算 =======================
+_local = threading.local()
+
+@contextlib.contextmanager
+def cpu_budget(seconds: float = None):
+    """
+    範圍內（同一執行緒）解析用掉的 CPU 超過 seconds 秒，下一次 check_budget 就丟 ParseLimitError。
+    可巢狀：內層只會更嚴，不會放寬外層。
+    """
+    seconds = CPU_BUDGET if seconds is None else seconds
+    prev = getattr(_local, "deadline", None)
+    deadline = time.thread_time() + seconds if seconds > 0 else None
+    if prev is not None and (deadline is None or prev < deadline):
+        deadline = prev
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = prev
+
+def check_budget():
+    """沒有進行中的預算時不做事（離線批次、基準腳本）。"""
+    deadline = getattr(_local, "deadline", None)
+    if deadline is not None and time.thread_time() > deadline:
+        raise ParseLimitError("解析超過 CPU 預算，已中止")
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+建置時把 static/ 底下的檔案預先壓成 .gz（及 .br，若有 brotli），
+執行時由 http_cache.serve_static 直接送出，不必每次壓縮。
+
+用法：python precompress_static.py [static 目錄]
+"""
+import gzip
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_BYTES = 256
+
+def precompress(static_dir: str):
+    for name in sorted(os.listdir(static_dir)):
+        path = os.path.join(static_dir, name)
+        if name.endswith((".gz", ".br")) or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            raw = f.read()
+        if len(raw) < MIN_BYTES:
+            continue
+        outputs = [(".gz", gzip.compress(raw, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            outputs.append((".br", brotli.compress(raw, quality=11)))
+        for ext, packed in outputs:
+            if len(packed) < len(raw):      # 壓不小就不留，直接送原檔
+                with open(path + ext, "wb") as f:
+                    f.write(packed)
+                print(f"{name}{ext}: {len(raw)} -> {len(packed)} bytes")
+
+if __name__ == "__main__":
+    precompress(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
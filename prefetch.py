@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+命盤預抓（暖機）：離峰時段以固定速率把熱門出生資料先抓進本地命盤庫。
+
+鍵來源：
+  --range 1985-01-01:1995-12-31 [--hours 0-23] [--genders m,f]   逐日逐時列舉
+  --access-log chart_keys.log --top 5000                         取存取紀錄前 N 名
+
+已在命盤庫者直接略過，所以中斷後重跑即可續抓。
+
+用法：
+  python prefetch.py --db charts.sqlite --range 1985-01-01:1995-12-31 --rate 0.5 --window 01:00-06:00
+"""
+import argparse
+import collections
+import datetime as dt
+import sys
+import time
+
+import chart_input
+import chart_store
+
+# ======================= 鍵來源 =======================
+def parse_date_range(spec: str) -> tuple:
+    """--range YYYY-MM-DD:YYYY-MM-DD → (起, 迄)；格式或年份不合法丟 chart_input.InputError。"""
+    a, sep, b = spec.partition(":")
+    try:
+        day, end = dt.date.fromisoformat(a), dt.date.fromisoformat(b)
+    except ValueError:
+        raise chart_input.InputError("range", f"格式為 YYYY-MM-DD:YYYY-MM-DD（收到 {spec!r}）") from None
+    chart_input.year_range(day.year, end.year)
+    if day > end:
+        raise chart_input.InputError("range", f"起始日晚於結束日（收到 {spec!r}）")
+    return day, end
+
+def keys_from_range(day: dt.date, end: dt.date, hours, genders):
+    while day <= end:
+        for h in hours:
+            for g in genders:
+                yield day.year, day.month, day.day, h, g
+        day += dt.timedelta(days=1)
+
+def keys_from_access_log(path: str, top: int):
+    """存取紀錄（app 的 CHART_KEY_LOG）：每行 ts\\tyear\\tmonth\\tday\\thour\\tgender\\t..."""
+    cnt = collections.Counter()
+    with open(path, encoding="utf-8") as f:
+        for ln in f:
+            parts = ln.rstrip("\n").split("\t")
+            if len(parts) < 6:
+                continue
+            try:
+                cnt[chart_store.birth_key(*parts[1:6])] += 1
+            except ValueError:
+                continue
+    return [k for k, _ in cnt.most_common(top)]
+
+def parse_hours(spec: str) -> list:
+    """--hours：0-23 或 0,6,12；每個值都經 chart_input 驗證。"""
+    out = []
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        out.extend(range(chart_input.hour(lo), chart_input.hour(hi or lo) + 1))
+    return list(dict.fromkeys(out))
+
+def parse_genders(spec: str) -> list:
+    return list(dict.fromkeys(chart_input.normalize_gender(g) for g in spec.split(",")))
+
+# ======================= 時段與節流 =======================
+def parse_window(spec: str):
+    a, b = spec.split("-")
+    return dt.time.fromisoformat(a), dt.time.fromisoformat(b)
+
+def in_window(now: dt.datetime, window) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    t = now.time()
+    return start <= t < end if start <= end else (t >= start or t < end)   # 可跨午夜
+
+def wait_for_window(window, log):
+    while not in_window(dt.datetime.now(), window):
+        log("[預抓] 非離峰時段，暫停 60 秒")
+        time.sleep(60)
+
+# ======================= 主流程 =======================
+def prefetch(keys, store, fetch, rate: float, window=None, retries: int = 2, progress_every: int = 20, log=print):
+    """
+    依序抓取不在 store 內的鍵；rate = 每秒最多幾張（0 = 不限速）。
+    回傳統計 dict。
+    """
+    stats = {"seen": 0, "skipped": 0, "fetched": 0, "failed": 0}
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_at = time.monotonic()
+    t0 = time.monotonic()
+
+    for key in keys:
+        stats["seen"] += 1
+        if key in store:
+            stats["skipped"] += 1
+            continue
+
+        wait_for_window(window, log)
+        for attempt in range(retries + 1):
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_at = time.monotonic() + interval * (2 ** attempt)   # 失敗後退避
+            try:
+                store.put(*key, fetch(*key))
+                stats["fetched"] += 1
+                break
+            except Exception as e:
+                if attempt == retries:
+                    stats["failed"] += 1
+                    log(f"[預抓] 失敗 {key}：{e}")
+
+        done = stats["fetched"] + stats["failed"]
+        if progress_every and done and done % progress_every == 0:
+            el = time.monotonic() - t0
+            log(f"[預抓] 已看 {stats['seen']}，抓取 {stats['fetched']}，略過 {stats['skipped']}，"
+                f"失敗 {stats['failed']}，{stats['fetched'] / el:.2f} 張/秒")
+    stats["seconds"] = round(time.monotonic() - t0, 1)
+    return stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="離峰預抓命盤進本地命盤庫")
+    ap.add_argument("--db", help="命盤庫路徑（預設讀 CHART_STORE_PATH）")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--range", help="出生日期區間 YYYY-MM-DD:YYYY-MM-DD")
+    src.add_argument("--access-log", help="CHART_KEY_LOG 產生的存取紀錄")
+    ap.add_argument("--top", type=int, default=1000, help="取存取紀錄前 N 名")
+    ap.add_argument("--hours", default="0-23", help="時辰，例如 0-23 或 0,6,12")
+    ap.add_argument("--genders", default="m,f")
+    ap.add_argument("--rate", type=float, default=0.5, help="每秒最多抓幾張（0=不限）")
+    ap.add_argument("--window", help="只在此時段內抓取，例如 01:00-06:00（可跨午夜）")
+    ap.add_argument("--retries", type=int, default=2)
+    args = ap.parse_args(argv)
+
+    try:                                       # 參數先驗證完，才開命盤庫、連上游
+        if args.range:
+            keys = keys_from_range(*parse_date_range(args.range), parse_hours(args.hours), parse_genders(args.genders))
+    except chart_input.InputError as e:
+        raise SystemExit(f"參數錯誤：{e}")
+
+    store = chart_store.ChartStore(args.db) if args.db else chart_store.open_default_store()
+    if store is None:
+        raise SystemExit("請指定 --db 或設定 CHART_STORE_PATH")
+
+    if not args.range:
+        keys = keys_from_access_log(args.access_log, args.top)
+
+    from app import fetch_chart
+    stats = prefetch(keys, store, fetch_chart, args.rate,
+                     window=parse_window(args.window) if args.window else None,
+                     retries=args.retries, log=lambda m: print(m, file=sys.stderr))
+    print(stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+單一請求的效能剖析（預設關閉）
+
+啟用：PROFILE_ENABLED=1
+觸發：請求帶 header「X-Profile: cprofile|sample」或查詢參數 _profile=cprofile|sample，
+      或依 PROFILE_SAMPLE_RATE（0~1）隨機抽樣（用 cProfile）
+保存：PROFILE_DIR（預設 profiles/），只保留最新 PROFILE_KEEP 份
+查看：GET /_profiles                 列表（JSON）
+      GET /_profiles/<name>          下載；.prof 可給 snakeviz / flameprof，
+                                     .collapsed 可直接給 flamegraph.pl / speedscope
+      GET /_profiles/<name>?format=text   .prof 的 pstats 文字摘要
+若設定 PROFILE_TOKEN，觸發與查看都需帶 X-Profile-Token（或 ?token=）。
+"""
+import collections
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+from flask import abort, g, jsonify, request, send_from_directory
+
+ENABLED = os.environ.get("PROFILE_ENABLED", "0") == "1"
+PROFILE_DIR = os.path.abspath(os.environ.get("PROFILE_DIR", "profiles"))
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+TOKEN = os.environ.get("PROFILE_TOKEN", "")
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+MODES = ("cprofile", "sample")
+
+# ======================= 取樣剖析器 =======================
+class StackSampler:
+    """背景執行緒定時抓目標執行緒的呼叫堆疊，累計成 collapsed stack 次數。"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                where = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])   # flask/app.py 與本專案 app.py 分得開
+                stack.append(f"{where}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common())
+
+# ======================= 觸發與保存 =======================
+def _authorized() -> bool:
+    return not TOKEN or TOKEN in (request.headers.get("X-Profile-Token"), request.args.get("token"))
+
+def _requested_mode() -> str:
+    mode = (request.headers.get("X-Profile") or request.args.get("_profile") or "").lower()
+    if mode in ("1", "true", "yes"):
+        mode = "cprofile"
+    if mode in MODES and _authorized():
+        return mode
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return "cprofile"
+    return ""
+
+def _start():
+    if request.path.startswith("/_profiles"):
+        return
+    mode = _requested_mode()
+    if not mode:
+        return
+    g.profile_mode = mode
+    g.profile_t0 = time.perf_counter()
+    if mode == "cprofile":
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+    else:
+        g.profiler = StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+        g.profiler.start()
+
+def _stop():
+    prof = g.pop("profiler", None)
+    if prof is None:
+        return None
+    if isinstance(prof, cProfile.Profile):
+        prof.disable()
+    else:
+        prof.stop()
+    return prof
+
+def _finish(resp):
+    prof = _stop()
+    if prof is None:
+        return resp
+    ms = int((time.perf_counter() - g.profile_t0) * 1000)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{request.method}-{slug}-{ms}ms"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if isinstance(prof, cProfile.Profile):
+        name += ".prof"
+        prof.dump_stats(os.path.join(PROFILE_DIR, name))
+    else:
+        name += ".collapsed"
+        with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+            f.write(prof.collapsed())
+    _enforce_retention()
+    resp.headers["X-Profile-Id"] = name
+    return resp
+
+def _teardown(exc):
+    _stop()           # 例外中斷時不保存，只確保剖析器關閉
+
+def _profile_files():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    files = [f for f in os.listdir(PROFILE_DIR) if f.endswith((".prof", ".collapsed"))]
+    return sorted(files, key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f)), reverse=True)
+
+def _enforce_retention():
+    for f in _profile_files()[KEEP:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, f))
+        except FileNotFoundError:
+            pass
+
+# ======================= 端點 =======================
+def list_profiles():
+    if not _authorized():
+        abort(403)
+    out = []
+    for f in _profile_files():
+        st = os.stat(os.path.join(PROFILE_DIR, f))
+        out.append({"name": f, "bytes": st.st_size, "created": int(st.st_mtime),
+                    "mode": "cprofile" if f.endswith(".prof") else "sample"})
+    return jsonify(out)
+
+def get_profile(name: str):
+    if not _authorized():
+        abort(403)
+    if name not in _profile_files():
+        abort(404)
+    if name.endswith(".prof") and request.args.get("format") == "text":
+        buf = io.StringIO()
+        pstats.Stats(os.path.join(PROFILE_DIR, name), stream=buf).sort_stats("cumulative").print_stats(40)
+        return buf.getvalue(), 200, {"Content-Type": "text/plain; charset=utf-8"}
+    return send_from_directory(PROFILE_DIR, name, as_attachment=True)
+
+def init_app(app):
+    """掛上剖析 hook 與 /_profiles 端點；PROFILE_ENABLED 未開時什麼都不做。"""
+    if not ENABLED:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_teardown)
+    app.add_url_rule("/_profiles", "list_profiles", list_profiles)
+    app.add_url_rule("/_profiles/<name>", "get_profile", get_profile)
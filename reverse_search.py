@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+反查：指定某一流年的財忌落點，列出符合的出生時刻
+
+條件（至少一項）：大限 / 流年財忌落宮、忌星、狀態（自化忌 / 對宮空宮），結果與
+summarize_cai_ji_targets 逐盤計算一致。命盤來源為本地命盤庫（不打上游）；
+若命盤索引（chart_index）已涵蓋該流年，直接以索引回答。
+
+掃描命盤庫時：
+  - 天干剪枝：流年財宮固定在「流年地支往前數四宮」的地支，該宮天干由生年天干依五虎遁決定，
+    所以流年忌星只取決於生年天干——指定流年忌星時，整年整年地略過不可能的出生年
+    （1、2 月出生可能仍屬前一農曆年，邊界兩年都保留，最後仍逐盤核對）
+  - 地支等價類：同一時辰（兩個小時）出生的命盤相同，原文相同者只解析、計算一次
+  - 每批命盤解析後以 mingpan_batch 向量化計算；workers > 0 時解析分給多個行程
+  - 結果以產生器逐批送出，找到就能先顯示
+
+用法：
+  python reverse_search.py charts.db --cyear 2027 --liu 田 [--from 1950 --to 2010] [--gender m] [--workers 4]
+  輸出 NDJSON：每行一個符合的出生資料，最後一行為統計（"done": true）
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chart_input
+import mingpan_logic as mp
+
+BATCH = int(os.environ.get("REVERSE_BATCH", 2048))
+_CPUS = os.cpu_count() or 1
+DEFAULT_WORKERS = _CPUS if _CPUS > 1 else 0          # 單核時開子行程只會更慢
+SCOPES = (("大限", "da"), ("流年", "liu"))
+STATUS_NAMES = ("自化忌", "對宮空宮")
+LUNAR_NEW_YEAR_LATEST = (2, 20)      # 農曆新年最晚落在國曆 2/20；此前出生可能屬前一農曆年
+
+# ======================= 條件 =======================
+def parse_target(src) -> dict:
+    """
+    src（dict 或 request.args）→ 條件：
+      cyear（必填）、da / liu（落宮，可寫全名）、da_star / liu_star、da_status / liu_status
+    不合法時丟 chart_input.InputError。
+    """
+    target = {"cyear": chart_input.cyear(src.get("cyear", ""))}
+    for _, pre in SCOPES:
+        pal = (src.get(pre) or "").strip()
+        if pal:
+            pal = mp.palace_to_abbr(pal) or pal
+            if pal not in mp.PALACE_ORDER:
+                raise chart_input.InputError(pre, f"不是宮名（收到 {src.get(pre)!r}）")
+            target[pre] = pal
+        star = (src.get(f"{pre}_star") or "").strip()
+        if star:
+            if star not in {h["忌"] for h in mp.YEAR_HUA.values()}:
+                raise chart_input.InputError(f"{pre}_star", f"不是任何天干的化忌星（收到 {star!r}）")
+            target[f"{pre}_star"] = star
+        status = (src.get(f"{pre}_status") or "").strip()
+        if status:
+            if status not in STATUS_NAMES:
+                raise chart_input.InputError(f"{pre}_status", f"須為 {'/'.join(STATUS_NAMES)}")
+            target[f"{pre}_status"] = status
+    if len(target) == 1:
+        raise chart_input.InputError("target", "至少指定一項財忌條件")
+    return target
+
+# ======================= 天干剪枝 =======================
+def liu_cai_stem(year_stem: str, cyear: int) -> str:
+    """生年天干 + 流年 → 流年財宮的天干（五虎遁：寅宮起干，逐宮順推）。"""
+    yin_stem = (mp.STEMS.index(year_stem) % 5 * 2 + 2) % 10
+    cai_branch = (mp.ZODIAC.index(mp.zodiac_of_year(cyear)) - 4) % 12
+    return mp.STEMS[(yin_stem + (cai_branch - 2) % 12) % 10]
+
+def allowed_year_stems(target: dict) -> set:
+    """流年忌星可能出現的生年天干；未指定流年忌星時不剪枝。"""
+    star = target.get("liu_star")
+    if not star:
+        return set(mp.STEMS)
+    return {s for s in mp.STEMS if mp.YEAR_HUA[liu_cai_stem(s, target["cyear"])]["忌"] == star}
+
+def candidate_years(year_from: int, year_to: int, stems: set) -> tuple:
+    """(要讀的國曆年, 只有年初（農曆新年前）才可能符合的年)。"""
+    full, early = set(), set()
+    for y in range(year_from, year_to + 1):
+        if mp.year_stem_of_year(y) in stems:
+            full.add(y)
+        elif mp.year_stem_of_year(y - 1) in stems:
+            early.add(y)
+    return full, early
+
+# ======================= 向量化比對 =======================
+def _encode_batch(raws: list) -> list:
+    import mingpan_batch
+    mp.DEBUG = False
+    return [mingpan_batch.encode_chart(raw) for raw in raws]
+
+def _match(batch_mod, rows: list, target: dict):
+    """rows 為已編碼命盤；回傳 (符合的列序, cai_ji_batch 結果)。"""
+    np = batch_mod.np
+    res = batch_mod.cai_ji_batch(batch_mod.stack_rows(rows), target["cyear"])
+    mask = np.ones(len(rows), dtype=bool)
+    for _, pre in SCOPES:
+        if pre in target:
+            mask &= res[f"{pre}_palace"] == mp.PALACE_ORDER.index(target[pre])
+        if f"{pre}_star" in target:
+            mask &= res[f"{pre}_star"] == batch_mod.STAR_ID[target[f"{pre}_star"]]
+        if f"{pre}_status" in target:
+            code = next(k for k, v in batch_mod.STATUS_TEXT.items() if v == target[f"{pre}_status"])
+            mask &= res[f"{pre}_status"] == code
+    return np.flatnonzero(mask), res
+
+def _outcome(batch_mod, res: dict, i: int) -> dict:
+    out = {}
+    for scope, pre in SCOPES:
+        star, pal = int(res[f"{pre}_star"][i]), int(res[f"{pre}_palace"][i])
+        out[scope] = {
+            "star": batch_mod.STAR_LIST[star] if star >= 0 else "",
+            "palace": mp.PALACE_ORDER[pal] if pal >= 0 else "",
+            "status": batch_mod.STATUS_TEXT[int(res[f"{pre}_status"][i])],
+        }
+    return out
+
+def _key_dict(key: tuple) -> dict:
+    return dict(zip(("year", "month", "day", "hour", "gender"), key))
+
+# ======================= 掃描 =======================
+def _batches(store, target: dict, year_from: int, year_to: int, gender, stats: dict, batch: int):
+    """依天干剪枝讀命盤庫，原文相同者併成一組；產生 [(原文, [key, ...]), ...]。"""
+    full, early = candidate_years(year_from, year_to, allowed_year_stems(target))
+    stats["years_pruned"] = (year_to - year_from + 1) - len(full) - len(early)
+    groups = {}
+    for key, raw, _ in store.iter_latest(years=full | early, gender=gender):
+        if key[0] in early and key[1:3] > LUNAR_NEW_YEAR_LATEST:
+            stats["pruned"] += 1
+            continue
+        stats["scanned"] += 1
+        keys = groups.get(raw)
+        if keys is None:
+            groups[raw] = [key]
+            if len(groups) >= batch:
+                yield list(groups.items())
+                groups = {}
+        else:
+            keys.append(key)
+    if groups:
+        yield list(groups.items())
+
+def search_store(store, target: dict, year_from: int, year_to: int, gender=None,
+                 workers: int = 0, batch: int = BATCH):
+    """
+    掃描命盤庫，逐筆產生符合的 {year, month, day, hour, gender, 大限, 流年}；
+    最後產生一筆統計 {"done": True, ...}。
+    """
+    import mingpan_batch
+    t0 = time.perf_counter()
+    stats = {"scanned": 0, "unique": 0, "pruned": 0, "skipped": 0, "matched": 0}
+    pool = ProcessPoolExecutor(workers) if workers > 0 else None
+    try:
+        groups_iter = _batches(store, target, year_from, year_to, gender, stats, batch)
+        if pool is None:
+            encoded = ((g, _encode_batch([raw for raw, _ in g])) for g in groups_iter)
+        else:
+            encoded = _pool_encode(pool, groups_iter, workers)
+        for groups, rows in encoded:
+            stats["unique"] += len(groups)
+            keep = [(keys, enc) for (_, keys), enc in zip(groups, rows) if enc is not None]
+            stats["skipped"] += len(groups) - len(keep)
+            if not keep:
+                continue
+            hits, res = _match(mingpan_batch, [enc for _, enc in keep], target)
+            for i in hits:
+                outcome = _outcome(mingpan_batch, res, i)
+                for key in keep[i][0]:
+                    stats["matched"] += 1
+                    yield dict(_key_dict(key), **outcome)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    yield dict(stats, done=True, source="store")
+
+def _pool_encode(pool, groups_iter, workers: int):
+    """解析分給子行程；最多同時送出 2 × workers 批，依原順序取回。"""
+    pending = []
+    for groups in groups_iter:
+        pending.append((groups, pool.submit(_encode_batch, [raw for raw, _ in groups])))
+        if len(pending) >= 2 * workers:
+            groups, fut = pending.pop(0)
+            yield groups, fut.result()
+    for groups, fut in pending:
+        yield groups, fut.result()
+
+# ======================= 索引 =======================
+def index_query(target: dict, year_from: int, year_to: int, gender=None):
+    """條件轉成 chart_index 查詢字串。"""
+    y = target["cyear"]
+    parts = [f"byear:{year_from}..{year_to}"]
+    if gender:
+        parts.append(f"gender:{gender}")
+    for scope, pre in SCOPES:
+        if pre in target:
+            parts.append(f"caiji:{y}:{scope}={target[pre]}")
+        if f"{pre}_star" in target:
+            parts.append(f"caiji:{y}:{scope}:star={target[f'{pre}_star']}")
+        if f"{pre}_status" in target:
+            parts.append(f"caiji:{y}:{scope}:status={target[f'{pre}_status']}")
+    return " AND ".join(parts)
+
+def search_index(index, target: dict, year_from: int, year_to: int, gender=None, limit: int = None):
+    """索引已涵蓋該流年時直接回答（只有出生資料，不附落點細節）。"""
+    t0 = time.perf_counter()
+    index = index.current()                # 整個串流用同一版索引（重建時不混用新舊檔）
+    bm = index.query(index_query(target, year_from, year_to, gender))
+    n = 0
+    for key in index.keys_of(bm, limit):
+        n += 1
+        yield _key_dict(key)
+    yield {"done": True, "source": "index", "matched": index.count(bm), "returned": n,
+           "elapsed_s": round(time.perf_counter() - t0, 3)}
+
+def index_covers(index, cyear: int) -> bool:
+    return index is not None and cyear in index.header.get("cyears", ())
+
+def search(target: dict, year_from: int, year_to: int, gender=None, store=None, index=None,
+           workers: int = 0, limit: int = None):
+    """有涵蓋該流年的索引就查索引，否則掃描命盤庫；limit 為最多回傳幾筆符合者。"""
+    if index_covers(index, target["cyear"]):
+        yield from search_index(index, target, year_from, year_to, gender, limit)
+        return
+    if store is None:
+        raise RuntimeError("沒有命盤庫可供反查（CHART_STORE_PATH）")
+    n = 0
+    gen = search_store(store, target, year_from, year_to, gender, workers)
+    try:
+        for rec in gen:
+            if not rec.get("done"):
+                if limit is not None and n >= limit:
+                    yield {"done": True, "source": "store", "truncated": True, "returned": n}
+                    return
+                n += 1
+            yield rec
+    finally:
+        gen.close()
+
+# ======================= 命令列 =======================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="反查：指定流年的財忌落點 → 符合的出生時刻")
+    ap.add_argument("db", help="命盤庫（chart_store）")
+    ap.add_argument("--cyear", required=True)
+    for _, pre in SCOPES:
+        ap.add_argument(f"--{pre}", help="落宮")
+        ap.add_argument(f"--{pre}-star", dest=f"{pre}_star", help="忌星")
+        ap.add_argument(f"--{pre}-status", dest=f"{pre}_status", choices=STATUS_NAMES)
+    ap.add_argument("--from", dest="year_from", default="1950")
+    ap.add_argument("--to", dest="year_to", default="2010")
+    ap.add_argument("--gender", choices=("m", "f"))
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="解析用的子行程數（0 = 不開）")
+    ap.add_argument("--index", help="命盤索引（涵蓋該流年時直接查索引）")
+    ap.add_argument("--limit", type=int)
+    args = ap.parse_args(argv)
+
+    import chart_index
+    import chart_store
+    mp.DEBUG = False
+    try:
+        target = parse_target(vars(args))
+        year_from, year_to = chart_input.year_range(args.year_from, args.year_to)
+    except chart_input.InputError as e:
+        raise SystemExit(f"參數錯誤：{e}")
+    index = chart_index.ChartIndex(args.index) if args.index else None
+    for rec in search(target, year_from, year_to, args.gender, chart_store.ChartStore(args.db),
+                      index, args.workers, args.limit):
+        print(json.dumps(rec, ensure_ascii=False), flush=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
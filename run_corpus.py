@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+離線批次產生破財雷達報告（多進程）
+
+輸入為 NDJSON，每行一筆：
+  {"raw": "<fetch_chart 原文>", "cyear": 2026}                   # 已有原文
+  {"year":1990,"month":2,"day":1,"hour":0,"gender":"m","cyear":2026}  # 出生資料（需連上游）
+
+用法：
+  python run_corpus.py charts.ndjson -o reports.ndjson --workers 8
+  python run_corpus.py charts.ndjson -o reports_dir --format parquet --resume
+
+輸出依輸入順序寫出；每寫完一個分塊就更新 checkpoint（<輸出>.ckpt），
+--resume 時略過已完成的行並從上次位置續寫。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import chart_input
+import mingpan_logic as mp
+
+# ======================= 子進程 =======================
+def _init_worker():
+    mp.DEBUG = False
+
+def _report_one(rec: dict, default_cyear: int) -> dict:
+    cyear = int(rec.get("cyear") or default_cyear)
+    raw = rec.get("raw")
+    if raw is None:
+        key = chart_input.canonical_key(rec["year"], rec["month"], rec["day"], rec["hour"], rec.get("gender", "m"))
+        from app import fetch_chart   # 只有出生資料時才需要上游；不合法的紀錄在此之前就被擋下
+        raw = fetch_chart(*key)
+    with mp.capture_debug():
+        report = mp.run_report(raw, cyear=cyear)
+    return {"cyear": cyear, "report": report}
+
+def _run_chunk(items, default_cyear: int):
+    """items = [(行號, 原始行)]；回傳 (pid, cpu 秒, 牆鐘秒, 結果列)。"""
+    t0, c0 = time.perf_counter(), time.process_time()
+    out = []
+    for lineno, line in items:
+        row = {"line": lineno}
+        try:
+            rec = json.loads(line)
+            for k in ("id", "year", "month", "day", "hour", "gender"):
+                if k in rec:
+                    row[k] = rec[k]
+            row.update(_report_one(rec, default_cyear))
+            row["error"] = ""
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        out.append(row)
+    return os.getpid(), time.process_time() - c0, time.perf_counter() - t0, out
+
+# ======================= 輸出 =======================
+class NdjsonSink:
+    def __init__(self, path: str, resume_bytes: int):
+        self.f = open(path, "a+b" if resume_bytes else "wb")
+        if resume_bytes:
+            self.f.truncate(resume_bytes)   # 丟掉 checkpoint 之後的殘行
+            self.f.seek(resume_bytes)
+
+    def write(self, rows):
+        for r in rows:
+            self.f.write(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.f.flush()
+
+    def position(self) -> int:
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+class ParquetSink:
+    """每個分塊一個 part 檔；position 為已寫出的 part 數。"""
+    COLUMNS = ["line", "id", "year", "month", "day", "hour", "gender", "cyear", "report", "error"]
+
+    def __init__(self, path: str, resume_parts: int):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("--format parquet 需要安裝 pyarrow")
+        self.pa, self.pq, self.dir = pa, pq, path
+        os.makedirs(path, exist_ok=True)
+        self.parts = resume_parts
+
+    def write(self, rows):
+        cols = {k: [r.get(k) for r in rows] for k in self.COLUMNS}
+        for k in ("id", "gender"):
+            cols[k] = [None if v is None else str(v) for v in cols[k]]
+        table = self.pa.table(cols)
+        tmp = os.path.join(self.dir, f".part-{self.parts:06d}.tmp")
+        self.pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, os.path.join(self.dir, f"part-{self.parts:06d}.parquet"))
+        self.parts += 1
+
+    def position(self) -> int:
+        return self.parts
+
+    def close(self):
+        pass
+
+# ======================= checkpoint =======================
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"done_lines": 0, "position": 0}
+
+def save_checkpoint(path: str, done_lines: int, position: int):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"done_lines": done_lines, "position": position}, f)
+    os.replace(tmp, path)
+
+# ======================= 主流程 =======================
+def iter_chunks(path: str, skip: int, size: int):
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f):
+            if lineno < skip or not line.strip():
+                continue
+            chunk.append((lineno, line))
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def run(args) -> dict:
+    ckpt_path = args.checkpoint or (args.out.rstrip("/\\") + ".ckpt")
+    ckpt = load_checkpoint(ckpt_path) if args.resume else {"done_lines": 0, "position": 0}
+    sink = (ParquetSink if args.format == "parquet" else NdjsonSink)(args.out, ckpt["position"])
+
+    per_worker = {}                 # pid -> [筆數, cpu 秒, 牆鐘秒]
+    done_lines = ckpt["done_lines"]
+    total = 0
+    t_start = time.perf_counter()
+    last_report = t_start
+    window = max(1, args.workers) * 2     # 同時在途的分塊上限（控制記憶體）
+
+    chunks = iter_chunks(args.input, done_lines, args.chunk_size)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        pending = {}                # seq -> future
+        ready = {}                  # seq -> (最後行號, 結果)
+        next_seq = submit_seq = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) + len(ready) < window:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                fut = pool.submit(_run_chunk, chunk, args.cyear)
+                fut.last_line = chunk[-1][0]
+                pending[submit_seq] = fut
+                submit_seq += 1
+            if not pending and not ready:
+                break
+
+            finished, _ = wait(list(pending.values()), return_when=FIRST_COMPLETED) if pending else (set(), None)
+            for seq in [s for s, f in pending.items() if f in finished]:
+                fut = pending.pop(seq)
+                pid, cpu, wall, rows = fut.result()
+                w = per_worker.setdefault(pid, [0, 0.0, 0.0])
+                w[0] += len(rows); w[1] += cpu; w[2] += wall
+                ready[seq] = (fut.last_line, rows)
+
+            # 依序寫出，保證 checkpoint 之前的輸出連續完整
+            while next_seq in ready:
+                last_line, rows = ready.pop(next_seq)
+                sink.write(rows)
+                total += len(rows)
+                done_lines = last_line + 1
+                save_checkpoint(ckpt_path, done_lines, sink.position())
+                next_seq += 1
+
+            now = time.perf_counter()
+            if args.progress and now - last_report >= args.progress:
+                last_report = now
+                print(f"[進度] {total} 筆，{total / (now - t_start):.1f} 筆/秒", file=sys.stderr)
+    sink.close()
+
+    elapsed = time.perf_counter() - t_start
+    stats = {
+        "rows": total,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(total / elapsed, 1) if elapsed else 0.0,
+        "workers": {
+            str(pid): {"rows": n, "cpu_sec": round(cpu, 3), "rows_per_sec": round(n / wall, 1) if wall else 0.0}
+            for pid, (n, cpu, wall) in per_worker.items()
+        },
+    }
+    return stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="多進程批次產生破財雷達報告")
+    ap.add_argument("input", help="NDJSON：每行含 raw 或出生資料")
+    ap.add_argument("-o", "--out", required=True, help="輸出檔（ndjson）或目錄（parquet）")
+    ap.add_argument("--format", choices=["ndjson", "parquet"], default="ndjson")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk-size", type=int, default=200)
+    ap.add_argument("--cyear", type=int, default=mp.CYEAR, help="輸入未指定 cyear 時使用")
+    ap.add_argument("--checkpoint", help="checkpoint 路徑（預設 <out>.ckpt）")
+    ap.add_argument("--resume", action="store_true", help="從 checkpoint 續跑")
+    ap.add_argument("--progress", type=float, default=5.0, help="進度輸出間隔秒數（0=關閉）")
+    args = ap.parse_args(argv)
+
+    stats = run(args)
+    print(json.dumps(stats, ensure_ascii=False, indent=2), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
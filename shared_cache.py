@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+跨 worker 共用快取：命盤原文、上游表單結構、渲染好的報告
+
+後端（CACHE_BACKEND）：
+  memory  單一進程內 LRU（預設；只有 1 個 worker 時就夠）
+  file    本機目錄，一鍵一檔（CACHE_DIR，預設 /dev/shm/ziwei-cache，等於共享記憶體）；
+          同一台機器的所有 worker 共用，寫入用 rename 保證原子性
+  redis   Redis 協定（CACHE_URL=redis://host:6379/0），內建極簡 RESP 客戶端，不需 redis 套件；
+          本機測試可用 `python shared_cache.py serve-resp --port 6380` 起一個替身
+
+防雪崩：get_or_compute 先在進程內合併同鍵請求（single-flight），
+再以後端的 add（SET NX）搶鎖，搶不到的 worker 等鎖主算完直接讀結果，上游只會被打一次。
+後端出錯一律當作未命中，不影響請求。
+"""
+import argparse
+import collections
+import hashlib
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+
+# 鎖的存活時間要長過一次最慢的計算（抓命盤：GET 20 秒 + POST 25 秒逾時），否則鎖主還在算鎖就失效
+LOCK_TTL = float(os.environ.get("CACHE_LOCK_TTL", 60))       # 鎖主當掉時，鎖多久後自動失效；等別人算完也最多等這麼久
+LOCK_WAIT = float(os.environ.get("CACHE_LOCK_WAIT", 65))     # 進程內跟隨者等鎖主（鎖主可能先等別的 worker 再自己算）
+POLL_INTERVAL = 0.05
+
+# ======================= 後端 =======================
+class MemoryBackend:
+    """進程內 LRU；值為 bytes。"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._data = collections.OrderedDict()        # key -> (expire_at | 0, value)
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] and item[0] < time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._live(key)
+            if item is None:
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value: bytes, ttl: float = 0):
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else 0, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key: str, value: bytes, ttl: float = 0) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (time.time() + ttl if ttl else 0, value)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+class FileBackend:
+    """
+    一鍵一檔：檔頭 8 bytes 為到期時間（float，0 = 不過期），其後為值。
+    放在 /dev/shm 時等於共享記憶體；多進程同時寫同一鍵以最後 rename 的為準。
+    """
+    _HEADER = struct.Struct(">d")
+
+    def __init__(self, directory: str, max_entries: int = 50000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._sets = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest())
+
+    def _read(self, path: str):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < self._HEADER.size:
+            return None
+        (expire_at,) = self._HEADER.unpack_from(data)
+        if expire_at and expire_at < time.time():
+            self._remove(path)
+            return None
+        return data[self._HEADER.size:]
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str):
+        return self._read(self._path(key))
+
+    def set(self, key: str, value: bytes, ttl: float = 0):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._HEADER.pack(time.time() + ttl if ttl else 0) + value)
+        os.replace(tmp, path)
+        self._sets += 1
+        if self._sets % 256 == 0:
+            self._trim()
+
+    def add(self, key: str, value: bytes, ttl: float = 0) -> bool:
+        path = self._path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                if self._read(path) is not None:       # 未過期：別人持有
+                    return False
+                continue                               # 已過期並被刪掉：再搶一次
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._HEADER.pack(time.time() + ttl if ttl else 0) + value)
+            return True
+        return False
+
+    def delete(self, key: str):
+        self._remove(self._path(key))
+
+    def _trim(self):
+        """超過上限時刪掉最舊的一成。"""
+        try:
+            names = [n for n in os.listdir(self.directory) if not n.endswith(".tmp")]
+        except FileNotFoundError:
+            return
+        if len(names) <= self.max_entries:
+            return
+        paths = [os.path.join(self.directory, n) for n in names]
+        paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for p in paths[:len(paths) - self.max_entries + self.max_entries // 10]:
+            self._remove(p)
+
+class RedisBackend:
+    """極簡 RESP 客戶端：GET / SET [PX] [NX] / DEL；每執行緒一條連線，fork 後自動重連。"""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        u = urlparse(url)
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or 6379
+        self.db = int((u.path or "/0").lstrip("/") or 0)
+        self.password = u.password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    # ---- 連線與協定 ----
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.rfile = sock.makefile("rb")
+        self._local.pid = os.getpid()
+        if self.password:
+            self._roundtrip("AUTH", self.password)
+        if self.db:
+            self._roundtrip("SELECT", str(self.db))
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+        return b"".join(out)
+
+    def _read_reply(self):
+        f = self._local.rfile
+        line = f.readline()
+        if not line:
+            raise ConnectionError("Redis 連線中斷")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis 錯誤：{rest.decode(errors='replace')}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = f.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read_reply() for _ in range(n)]
+        raise RuntimeError(f"無法解析的 Redis 回應：{line!r}")
+
+    def _roundtrip(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def command(self, *args):
+        for attempt in range(2):
+            if getattr(self._local, "sock", None) is None or self._local.pid != os.getpid():
+                self._connect()
+            try:
+                return self._roundtrip(*args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    # ---- 介面 ----
+    def get(self, key: str):
+        return self.command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float = 0):
+        if ttl:
+            self.command("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self.command("SET", key, value)
+
+    def add(self, key: str, value: bytes, ttl: float = 0) -> bool:
+        args = ["SET", key, value, "NX"] + (["PX", int(ttl * 1000)] if ttl else [])
+        return self.command(*args) == "OK"
+
+    def delete(self, key: str):
+        self.command("DEL", key)
+
+# ======================= 快取（命名空間 + 防雪崩） =======================
+class _Flight:
+    """進程內同一鍵正在進行的計算：鎖主完成後設定 value 或 error。"""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SharedCache:
+    def __init__(self, backend, prefix: str = "ziwei:"):
+        self.backend = backend
+        self.prefix = prefix
+        self.stats = collections.defaultdict(collections.Counter)   # ns -> hit/miss/computed/waited/errors
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def _key(self, ns: str, key: str) -> str:
+        return f"{self.prefix}{ns}:{key}"
+
+    def _read(self, ns: str, key: str):
+        try:
+            return self.backend.get(self._key(ns, key))
+        except (OSError, RuntimeError, ConnectionError):
+            self.stats[ns]["errors"] += 1
+            return None
+
+    def get(self, ns: str, key: str):
+        v = self._read(ns, key)
+        self.stats[ns]["hit" if v is not None else "miss"] += 1
+        return v
+
+    def set(self, ns: str, key: str, value: bytes, ttl: float = 0):
+        try:
+            self.backend.set(self._key(ns, key), value, ttl)
+        except (OSError, RuntimeError, ConnectionError):
+            self.stats[ns]["errors"] += 1
+
+    def delete(self, ns: str, key: str):
+        try:
+            self.backend.delete(self._key(ns, key))
+        except (OSError, RuntimeError, ConnectionError):
+            self.stats[ns]["errors"] += 1
+
+    def _try_lock(self, full: str) -> bool:
+        try:
+            return self.backend.add("lock:" + full, str(os.getpid()).encode(), LOCK_TTL)
+        except (OSError, RuntimeError, ConnectionError):
+            return True           # 後端不可用：自己算
+
+    def _wait_for(self, ns: str, key: str, full: str, deadline: float):
+        """
+        等別的 worker 算完：值出現就回傳。鎖不見了卻還沒有值（鎖主失敗或鎖過期）、
+        或過了 deadline 都回 None，由呼叫端重新搶鎖，不必空等到逾時。
+        """
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            v = self._read(ns, key)
+            if v is not None:
+                return v
+            try:
+                if self.backend.get("lock:" + full) is None:
+                    return None
+            except (OSError, RuntimeError, ConnectionError):
+                return None
+        return None
+
+    def get_or_compute(self, ns: str, key: str, compute, ttl: float = 0) -> bytes:
+        """
+        compute() 回傳 bytes。同一鍵：進程內只有一個執行緒在算，
+        跨進程只有搶到鎖的 worker 在算，其他人等結果。
+        進程內的跟隨者拿鎖主的結果；鎖主失敗時跟隨者丟出同一個例外，不會各自再打一次上游。
+        """
+        v = self.get(ns, key)
+        if v is not None:
+            return v
+        full = self._key(ns, key)
+        with self._flights_lock:
+            flight = self._flights.get(full)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full] = _Flight()
+        if not leader:
+            if not flight.done.wait(LOCK_WAIT):
+                raise RuntimeError(f"等候同一筆資料（{ns}）計算逾時")
+            if flight.error is not None:
+                raise flight.error
+            self.stats[ns]["waited"] += 1
+            return flight.value
+        locked = False
+        try:
+            deadline = time.monotonic() + LOCK_TTL
+            while not locked:
+                locked = self._try_lock(full)
+                if locked:
+                    break
+                v = self._wait_for(ns, key, full, deadline)
+                if v is not None:
+                    self.stats[ns]["waited"] += 1
+                    flight.value = v
+                    return v
+                if time.monotonic() >= deadline:       # 等滿 LOCK_TTL 仍沒結果：不搶鎖，自己算
+                    break
+            flight.value = self._compute(ns, key, compute, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            if locked:                  # 只刪自己搶到的鎖；等候逾時後自己算的不能刪掉別人的鎖
+                try:
+                    self.backend.delete("lock:" + full)
+                except (OSError, RuntimeError, ConnectionError):
+                    pass
+            with self._flights_lock:
+                self._flights.pop(full, None)
+            flight.done.set()
+
+    def _compute(self, ns: str, key: str, compute, ttl: float) -> bytes:
+        v = compute()
+        self.stats[ns]["computed"] += 1
+        self.set(ns, key, v, ttl)
+        return v
+
+    def snapshot(self) -> dict:
+        out = {"backend": type(self.backend).__name__, "pid": os.getpid()}
+        for ns, c in self.stats.items():
+            looked = c["hit"] + c["miss"]
+            # waited：未命中但等到別人算好的結果，同樣沒有打上游
+            out[ns] = dict(c, hit_rate=round((c["hit"] + c["waited"]) / looked, 4) if looked else None)
+        return out
+
+def default_cache_dir() -> str:
+    return "/dev/shm/ziwei-cache" if os.path.isdir("/dev/shm") else os.path.join(os.getcwd(), ".cache", "ziwei")
+
+def open_default_cache() -> SharedCache:
+    kind = os.environ.get("CACHE_BACKEND", "memory").lower()
+    if kind == "file":
+        backend = FileBackend(os.environ.get("CACHE_DIR") or default_cache_dir(),
+                              int(os.environ.get("CACHE_MAX_ENTRIES", 50000)))
+    elif kind == "redis":
+        backend = RedisBackend(os.environ.get("CACHE_URL", "redis://127.0.0.1:6379/0"))
+    elif kind == "memory":
+        backend = MemoryBackend(int(os.environ.get("CACHE_MAX_ENTRIES", 4096)))
+    else:
+        raise RuntimeError(f"未知的 CACHE_BACKEND：{kind}（memory / file / redis）")
+    return SharedCache(backend, os.environ.get("CACHE_PREFIX", "ziwei:"))
+
+# ======================= 本機 RESP 替身（測試用） =======================
+class _RespStore:
+    def __init__(self):
+        self.data = {}                 # key -> (expire_at | 0, value)
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item and item[0] and item[0] < time.time():
+            del self.data[key]
+            return None
+        return item
+
+    def execute(self, args):
+        cmd = args[0].upper()
+        with self.lock:
+            if cmd == b"PING":
+                return "+PONG"
+            if cmd in (b"SELECT", b"AUTH"):
+                return "+OK"
+            if cmd == b"GET":
+                item = self._live(args[1])
+                return item[1] if item else None
+            if cmd == b"SET":
+                key, value, opts = args[1], args[2], [a.upper() for a in args[3:]]
+                expire_at = 0
+                if b"PX" in opts:
+                    expire_at = time.time() + int(args[3 + opts.index(b"PX") + 1]) / 1000
+                if b"EX" in opts:
+                    expire_at = time.time() + int(args[3 + opts.index(b"EX") + 1])
+                if b"NX" in opts and self._live(key) is not None:
+                    return None
+                self.data[key] = (expire_at, value)
+                return "+OK"
+            if cmd == b"DEL":
+                return sum(1 for k in args[1:] if self.data.pop(k, None) is not None)
+            if cmd == b"DBSIZE":
+                return len(self.data)
+            if cmd == b"FLUSHDB":
+                self.data.clear()
+                return "+OK"
+        return RuntimeError(f"ERR unknown command '{cmd.decode(errors='replace')}'")
+
+def _resp_encode(v) -> bytes:
+    if v is None:
+        return b"$-1\r\n"
+    if isinstance(v, RuntimeError):
+        return b"-" + str(v).encode() + b"\r\n"
+    if isinstance(v, str):
+        return v.encode() + b"\r\n"
+    if isinstance(v, int):
+        return b":%d\r\n" % v
+    return b"$%d\r\n%s\r\n" % (len(v), v)
+
+def serve_resp(host: str = "127.0.0.1", port: int = 6380):
+    store = _RespStore()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                if not line.startswith(b"*"):
+                    self.wfile.write(b"-ERR protocol error\r\n")
+                    return
+                args = []
+                for _ in range(int(line[1:-2])):
+                    n = int(self.rfile.readline()[1:-2])
+                    args.append(self.rfile.read(n + 2)[:-2])
+                self.wfile.write(_resp_encode(store.execute(args)))
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    print(f"[RESP 替身] redis://{host}:{port}/0", flush=True)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="共用快取工具")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve-resp", help="起一個本機 Redis 協定替身（測試 CACHE_BACKEND=redis 用）")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=6380)
+    args = ap.parse_args()
+    if args.cmd == "serve-resp":
+        serve_resp(args.host, args.port)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+星曜目錄與單趟辨識器
+
+STAR_CATALOG 收錄命盤上會出現的全部星曜（主星、六吉、六煞、祿馬、雜曜、長生十二神、
+博士 / 歲前 / 將前十二星），匯入時建成一棵字元 trie（含別名）並編譯成單一正規式。
+scan_star_line 由左到右掃一次星曜行：每個位置在 trie 上取最長的星名，
+再吃掉緊跟的亮度（廟旺得地利平不陷）與四化（祿權科忌，可帶「化」字），
+不認得的片段原樣保留為 unknown，不會默默丟掉。
+
+上游格式如「太陽旺,權,,,火星」：單獨一格的四化標記會併到前一顆星。
+"""
+import collections
+import re
+
+STAR_CATALOG = {
+    "main": ("紫微", "天機", "太陽", "武曲", "天同", "廉貞", "天府", "太陰", "貪狼", "巨門",
+             "天相", "天梁", "七殺", "破軍"),
+    "aux": ("文昌", "文曲", "左輔", "右弼", "天魁", "天鉞"),
+    "sha": ("擎羊", "陀羅", "火星", "鈴星", "地空", "地劫"),
+    "lu_ma": ("祿存", "天馬"),
+    "minor": ("天刑", "天姚", "紅鸞", "天喜", "咸池", "天哭", "天虛", "龍池", "鳳閣", "台輔", "封誥",
+              "三台", "八座", "恩光", "天貴", "天官", "天福", "天才", "天壽", "孤辰", "寡宿", "蜚廉",
+              "破碎", "華蓋", "天月", "陰煞", "天巫", "解神", "天空", "旬空", "空亡", "截路", "天傷",
+              "天使", "天廚", "天德", "月德", "年解", "龍德", "月馬"),
+    "changsheng": ("長生", "沐浴", "冠帶", "臨官", "帝旺", "衰", "病", "死", "墓", "絕", "胎", "養"),
+    "boshi": ("博士", "力士", "青龍", "小耗", "將軍", "奏書", "飛廉", "喜神", "病符", "大耗", "伏兵", "官府"),
+    "suiqian": ("歲建", "晦氣", "喪門", "貫索", "官符", "白虎", "弔客"),
+    "jiangqian": ("將星", "攀鞍", "歲驛", "息神", "劫煞", "災煞", "天煞", "指背", "月煞", "亡神"),
+}
+# 異體 / 別稱 → 目錄中的標準名
+STAR_ALIASES = {"陀螺": "陀羅", "天殤": "天傷", "截空": "截路", "天越": "天鉞", "左辅": "左輔", "右弻": "右弼"}
+
+BRIGHTNESS = "廟旺得地利平不陷"
+HUA = "祿權科忌"
+SEPARATORS = ",，、 \t\r\n　"
+
+STAR_CATEGORY = {}
+for _cat, _names in STAR_CATALOG.items():
+    for _n in _names:
+        STAR_CATEGORY.setdefault(_n, _cat)        # 同名跨組（小耗、病符…）以先列者為準
+
+# ======================= trie → 正規式 =======================
+# trie 依共同字首展開成巢狀分組（如 天(?:機|府|相|…)），整行交給 re 的 C 引擎一次 finditer，
+# 每個位置只沿 trie 走一條路，不會對上百個星名逐一比對。
+_END = ""            # 節點上的終止標記
+
+def _build_trie() -> dict:
+    root = {}
+    for text in STAR_LOOKUP:
+        node = root
+        for ch in text:
+            node = node.setdefault(ch, {})
+        node[_END] = True
+    return root
+
+def _trie_pattern(node: dict) -> str:
+    alts = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != _END]
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    return f"(?:{body})?" if _END in node else body      # 可在此結束：貪婪地先試較長的星名
+
+STAR_LOOKUP = {n: n for n in STAR_CATEGORY}             # 出現的寫法 → 標準名
+STAR_LOOKUP.update(STAR_ALIASES)
+_STAR = _trie_pattern(_build_trie())
+_SEP = re.escape(SEPARATORS)
+# 尾綴字若剛好是某顆星的首字（「地」→地空/地劫、「祿」→祿存），只對這幾顆星做前瞻排除
+_GUARD = "|".join(re.escape(t) for t in sorted(STAR_LOOKUP, key=len, reverse=True) if t[0] in BRIGHTNESS + HUA)
+_GUARD = f"(?!{_GUARD})" if _GUARD else ""
+_HEADS = re.escape("".join(sorted({t[0] for t in STAR_LOOKUP})))
+_TOKEN_RE = re.compile(
+    rf"(?P<star>{_STAR})"
+    rf"(?P<bright>{_GUARD}[{BRIGHTNESS}])?"
+    rf"(?P<hua>(?:{_GUARD}化?[{HUA}])*)"
+    rf"|(?P<lone>化?[{HUA}]{{1,4}})(?=[{_SEP}]|$)"          # 單獨一格的四化標記（有界：連串「祿祿祿…」不會每格重掃）
+    rf"|(?P<sep>[{_SEP}]+)"
+    rf"|(?P<unk>[^{_SEP}{_HEADS}]+|[^{_SEP}])"              # 不認得的片段：整段吃，遇到可能的星名首字再試
+)
+
+# ======================= 掃描 =======================
+_CELL_END = re.compile(rf"[{_SEP}]")
+_STAR_MEMO = collections.OrderedDict()     # 「武曲平」這類星曜片段 → 解析結果（LRU）
+_STAR_MEMO_MAX = 4096                        # 四化尾綴可任意串接，片段種類沒有上限，只留最近用過的
+def scan_star_line(line: str) -> list:
+    """
+    星曜行 → [{'name','category','brightness','hua','raw','token'}]，依出現順序。
+    brightness 為單字（無則空字串），hua 為字串（可能多個，如「祿權」）。
+    token：星名在一格（分隔符之間）的開頭時為整格原文，否則空字串（mingpan_logic 的白名單以整格比對）。
+    """
+    out, n = [], len(line)
+    for m in _TOKEN_RE.finditer(line):
+        kind = m.lastgroup
+        if kind == "sep":
+            continue
+        if kind == "hua" or kind == "bright":       # 具名群組中最後結束的是尾綴：仍屬星曜
+            kind = "star"
+        if kind == "star":
+            raw = m.group()
+            tpl = _STAR_MEMO.get(raw)
+            if tpl is None:
+                name = STAR_LOOKUP[m.group("star")]
+                tpl = _STAR_MEMO[raw] = {"name": name, "category": STAR_CATEGORY[name],
+                                         "brightness": m.group("bright") or "",
+                                         "hua": m.group("hua").replace("化", ""), "raw": raw}
+                if len(_STAR_MEMO) > _STAR_MEMO_MAX:
+                    _STAR_MEMO.popitem(last=False)
+            else:
+                try:
+                    _STAR_MEMO.move_to_end(raw)
+                except KeyError:                         # 別的執行緒剛好把它擠出去：不影響這次結果
+                    pass
+            st = tpl.copy()
+            a, b = m.span()
+            if a and line[a - 1] not in SEPARATORS:
+                st["token"] = ""
+            elif b == n or line[b] in SEPARATORS:        # 常見情形：星曜片段本身就是一整格
+                st["token"] = raw
+            else:
+                e = _CELL_END.search(line, b)
+                st["token"] = line[a:e.start() if e else n]
+            out.append(st)
+        elif kind == "lone" and out and out[-1]["category"] != "unknown":
+            out[-1]["hua"] += m.group().replace("化", "")
+            out[-1]["raw"] += "," + m.group()
+        elif out and out[-1]["category"] == "unknown" and out[-1]["end"] == m.start():
+            out[-1]["end"] = m.end()                     # 連續的不認得字元併成一段（最後才切字串）
+        else:
+            out.append({"name": "", "category": "unknown", "brightness": "", "hua": "", "raw": "", "token": "",
+                        "start": m.start(), "end": m.end()})
+    for st in out:
+        if "start" in st:
+            st["name"] = st["raw"] = line[st.pop("start"):st.pop("end")]
+    return out
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+上游健康探測：背景執行緒定期抓表單頁（FORM_URL）並解析，結果與延遲歷史留在記憶體
+
+/readyz 只讀這裡的快取結果，健康檢查本身不連上游、不渲染模板；
+上游改版或掛掉時，探測會先發現（連續失敗即轉為未就緒），不必等使用者撞到。
+
+每個進程各自一條探測執行緒：gunicorn preload 時 master 先匯入 app，fork 後執行緒不會跟過去，
+所以由 ensure_started 依 pid 判斷、在 worker 內第一次用到時才啟動。
+
+預設不探測：離線腳本、測試與 flask 開發伺服器匯入 app 時不會在背景連上游；
+gunicorn.conf.py 會把 PROBE_ENABLED 預設成 1，正式服務才啟用（未啟用時 /readyz 一律就緒）。
+
+環境變數：
+  PROBE_ENABLED=0             1 = 啟用（gunicorn.conf.py 未設定時補成 1）
+  PROBE_INTERVAL=60           成功時的探測間隔（秒）
+  PROBE_FAIL_INTERVAL=15      失敗後縮短間隔，儘快確認恢復
+  PROBE_HISTORY=60            保留最近幾次的結果與延遲
+  PROBE_FAILURES_UNREADY=3    連續失敗幾次才判定未就緒（單次抖動不切流量）
+  PROBE_STALE_AFTER=600       最後一次成功超過幾秒也視為未就緒
+"""
+import collections
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("PROBE_ENABLED", "0") == "1"
+INTERVAL = float(os.environ.get("PROBE_INTERVAL", 60))
+FAIL_INTERVAL = float(os.environ.get("PROBE_FAIL_INTERVAL", 15))
+HISTORY = int(os.environ.get("PROBE_HISTORY", 60))
+FAILURES_UNREADY = int(os.environ.get("PROBE_FAILURES_UNREADY", 3))
+STALE_AFTER = float(os.environ.get("PROBE_STALE_AFTER", 600))
+
+def _percentile(sorted_ms: list, q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))]
+
+class UpstreamProber:
+    def __init__(self, probe, enabled: bool = ENABLED, interval: float = INTERVAL,
+                 fail_interval: float = FAIL_INTERVAL, history: int = HISTORY):
+        """probe()：成功時回傳一個小 dict（附在狀態裡），失敗丟例外。"""
+        self.probe = probe
+        self.enabled = enabled
+        self.interval = interval
+        self.fail_interval = fail_interval
+        self.lock = threading.Lock()
+        self.history = collections.deque(maxlen=history)
+        self.checks = 0
+        self.consecutive_failures = 0
+        self.last_ok_at = None
+        self.last_error = ""
+        self.detail = {}
+        self._pid = None
+        self._stop = threading.Event()
+
+    # ======================= 執行緒 =======================
+    def ensure_started(self):
+        """本進程還沒有探測執行緒就啟動一條；每請求都可以呼叫（只比對 pid）。"""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            threading.Thread(target=self._run, name="upstream-probe", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            ok = self.probe_once()
+            self._stop.wait(self.interval if ok else self.fail_interval)
+
+    def probe_once(self) -> bool:
+        t0 = time.perf_counter()
+        try:
+            detail, error = self.probe() or {}, ""
+        except Exception as e:               # 任何失敗都只記錄，不讓探測執行緒死掉
+            detail, error = None, f"{type(e).__name__}: {e}"[:300]
+        ms = (time.perf_counter() - t0) * 1000
+        now = time.time()
+        with self.lock:
+            self.checks += 1
+            self.history.append({"at": int(now), "ok": not error, "ms": round(ms, 1), "error": error})
+            if error:
+                self.consecutive_failures += 1
+                self.last_error = error
+            else:
+                self.consecutive_failures = 0
+                self.last_ok_at = now
+                self.detail = detail
+        return not error
+
+    # ======================= 狀態 =======================
+    def readiness(self) -> tuple:
+        """(是否就緒, 原因)；未啟用探測時一律就緒。"""
+        if not self.enabled:
+            return True, "探測未啟用"
+        with self.lock:
+            if self.checks == 0:
+                return False, "尚未完成第一次探測"
+            if self.consecutive_failures >= FAILURES_UNREADY or self.last_ok_at is None:
+                return False, f"上游表單連續 {self.consecutive_failures} 次探測失敗：{self.last_error}"
+            if time.time() - self.last_ok_at > STALE_AFTER:
+                return False, f"超過 {STALE_AFTER:.0f} 秒沒有成功的探測"
+            return True, "ok"
+
+    def snapshot(self) -> dict:
+        ready, reason = self.readiness()
+        with self.lock:
+            ok_ms = sorted(h["ms"] for h in self.history if h["ok"])
+            return {
+                "ready": ready, "reason": reason, "enabled": self.enabled,
+                "checks": self.checks, "consecutive_failures": self.consecutive_failures,
+                "last_ok_at": int(self.last_ok_at) if self.last_ok_at else None,
+                "last_error": self.last_error,
+                "latency_ms": {"last": self.history[-1]["ms"] if self.history else 0.0, "p50": _percentile(ok_ms, 0.5),
+                               "p95": _percentile(ok_ms, 0.95), "max": ok_ms[-1] if ok_ms else 0.0},
+                "detail": self.detail,
+                "history": list(self.history),
+            }
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+上游錄製 / 回放
+
+UPSTREAM_MODE=record  每次對上游的 GET/POST 照常送出，並把回應寫進 UPSTREAM_ARCHIVE
+UPSTREAM_MODE=replay  不連網，直接從 UPSTREAM_ARCHIVE 回放（找不到就報錯）
+UPSTREAM_REPLAY_TIMING=original|none   回放時是否照原本耗時 sleep（預設 none）
+
+檔案格式：gzip 壓縮的 NDJSON，每筆回應一個 gzip member 接在檔尾
+（gzip.open 可直接讀整個檔案，錄製時只需 append，不必重寫）。
+鍵 = method + url + 排序後的表單內容，同一鍵多筆以最後一筆為準。
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+MODE = os.environ.get("UPSTREAM_MODE", "off").lower()
+ARCHIVE = os.environ.get("UPSTREAM_ARCHIVE", "upstream_archive.ndjson.gz")
+REPLAY_TIMING = os.environ.get("UPSTREAM_REPLAY_TIMING", "none").lower()
+
+_write_lock = threading.Lock()
+
+def request_key(method: str, url: str, data=None) -> str:
+    items = sorted((data or {}).items())
+    raw = "\n".join([method.upper(), url, urlencode(items)])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+# ======================= 錄製 =======================
+def append_record(path: str, rec: dict):
+    line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+    with _write_lock, open(path, "ab") as f:
+        f.write(gzip.compress(line, mtime=0))
+
+def iter_records(path: str):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for ln in f:
+            if ln.strip():
+                yield json.loads(ln)
+
+def _recording_session_class():
+    import requests
+
+    class RecordingSession(requests.Session):
+        def __init__(self, archive: str):
+            super().__init__()
+            self.archive = archive
+
+        def request(self, method, url, data=None, **kw):
+            t0 = time.perf_counter()
+            resp = super().request(method, url, data=data, **kw)
+            body = resp.content          # 錄製時一律整包讀完
+            append_record(self.archive, {
+                "key": request_key(method, url, data),
+                "method": method.upper(), "url": url, "data": data or {},
+                "status": resp.status_code,
+                "headers": {"Content-Type": resp.headers.get("Content-Type", "")},
+                "elapsed": round(time.perf_counter() - t0, 4),
+                "recorded_at": int(time.time()),
+                "body_b64": base64.b64encode(body).decode("ascii"),
+            })
+            return resp
+
+    return RecordingSession
+
+# ======================= 回放 =======================
+_archives = {}                  # path -> {key: record}
+_load_lock = threading.Lock()
+
+def load_archive(path: str) -> dict:
+    with _load_lock:
+        if path not in _archives:
+            _archives[path] = {r["key"]: r for r in iter_records(path)} if os.path.exists(path) else {}
+        return _archives[path]
+
+class ReplayResponse:
+    """requests.Response 的最小替身（fetch_chart 用到的部分）。"""
+
+    def __init__(self, rec: dict):
+        self.status_code = rec["status"]
+        self.headers = dict(rec.get("headers") or {})
+        self.url = rec["url"]
+        self.content = base64.b64decode(rec["body_b64"])
+        self.elapsed_recorded = rec.get("elapsed", 0.0)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def iter_content(self, chunk_size=65536):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"上游回應 {self.status_code}：{self.url}")
+
+    def close(self):
+        pass
+
+class ReplaySession:
+    def __init__(self, archive: str, timing: str = "none"):
+        self.records = load_archive(archive)
+        self.archive = archive
+        self.timing = timing
+        self.headers = {}
+
+    def request(self, method, url, data=None, **kw):
+        rec = self.records.get(request_key(method, url, data))
+        if rec is None:
+            raise RuntimeError(f"回放檔 {self.archive} 中沒有這筆請求：{method.upper()} {url} {data or ''}")
+        resp = ReplayResponse(rec)
+        if self.timing == "original":
+            time.sleep(resp.elapsed_recorded)
+        return resp
+
+    def get(self, url, **kw):
+        return self.request("GET", url, **kw)
+
+    def post(self, url, data=None, **kw):
+        return self.request("POST", url, data=data, **kw)
+
+    def close(self):
+        pass
+
+# ======================= 入口 =======================
+def new_session():
+    """fetch_chart 用的 session：依 UPSTREAM_MODE 回傳一般 / 錄製 / 回放版本。"""
+    if MODE == "replay":
+        return ReplaySession(ARCHIVE, REPLAY_TIMING)
+    if MODE == "record":
+        return _recording_session_class()(ARCHIVE)
+    import requests
+    return requests.Session()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+本機上游樁：模擬 fate.windada.com 的表單頁與命盤結果頁，給壓測 / 開發用（不打真的上游）。
+
+GET 回表單頁、POST 回命盤頁；內容來自 response_debug.html（預設）或 upstream_replay 錄下的回應檔。
+每個回應先 sleep「延遲 ± 抖動」秒，模擬上游網路與處理時間。
+
+用法：
+  python upstream_stub.py --port 8765 --delay 0.3 --jitter 0.1 [--archive upstream_archive.ndjson.gz]
+  app 端：UPSTREAM_FORM_URL=http://127.0.0.1:8765/cgi-bin/fate
+"""
+import argparse
+import base64
+import os
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_pages(archive: str = "") -> dict:
+    """回傳 {"GET": bytes, "POST": bytes}。"""
+    if archive:
+        import upstream_replay
+        pages = {}
+        for rec in upstream_replay.iter_records(archive):
+            pages[rec["method"]] = base64.b64decode(rec["body_b64"])
+        if "GET" not in pages or "POST" not in pages:
+            raise SystemExit(f"{archive} 需同時含 GET 表單頁與 POST 命盤頁")
+        return pages
+    # response_debug.html 是以 latin-1 誤讀後存檔的 UTF-8，還原成原始位元組
+    with open(os.path.join(HERE, "response_debug.html"), encoding="utf-8") as f:
+        page = f.read().encode("latin-1", errors="ignore").decode("utf-8", errors="ignore").encode("utf-8")
+    return {"GET": page, "POST": page}
+
+def make_handler(pages: dict, delay: float, jitter: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body: bytes):
+            time.sleep(max(0.0, delay + random.uniform(-jitter, jitter)))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send(pages["GET"])
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._send(pages["POST"])
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+def serve(port: int, delay: float = 0.3, jitter: float = 0.0, archive: str = "", host: str = "127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), make_handler(load_pages(archive), delay, jitter))
+    server.daemon_threads = True
+    print(f"[上游樁] http://{host}:{port}/cgi-bin/fate  延遲 {delay}±{jitter} 秒", flush=True)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="本機模擬上游（壓測用）")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=0.3, help="每個回應的平均延遲（秒）")
+    ap.add_argument("--jitter", type=float, default=0.0, help="延遲的均勻抖動範圍（秒）")
+    ap.add_argument("--archive", default="", help="改用 upstream_replay 錄下的回應")
+    args = ap.parse_args()
+    serve(args.port, args.delay, args.jitter, args.archive, args.host)